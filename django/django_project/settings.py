@@ -7,6 +7,7 @@ Generated by 'django-admin startproject' using Django 4.2.11.
 # icosa app instead, and able to be overridden by the project settings.
 
 import os
+import tempfile
 from datetime import timedelta
 from pathlib import Path
 
@@ -145,6 +146,17 @@ STAFF_ONLY_ACCESS = os.environ.get("DJANGO_STAFF_ONLY_ACCESS")
 
 APPEND_SLASH = False
 DATA_UPLOAD_MAX_MEMORY_SIZE = 1073741824  # 1000MB
+# Where chunks of resumable API uploads are assembled. Must be on a disk shared
+# with the huey consumer.
+UPLOAD_SESSION_ROOT = os.environ.get(
+    "DJANGO_UPLOAD_SESSION_ROOT",
+    os.path.join(tempfile.gettempdir(), "icosa_upload_sessions"),
+)
+# glTF 1 files are converted to GLB by gltf-pipeline. This caps how many Node
+# processes each Django or huey process runs at once, and how long each may
+# take.
+GLTF_CONVERSION_WORKERS = int(os.environ.get("DJANGO_GLTF_CONVERSION_WORKERS", 2))
+GLTF_CONVERSION_TIMEOUT_SECONDS = int(os.environ.get("DJANGO_GLTF_CONVERSION_TIMEOUT_SECONDS", 120))
 INSTALLED_APPS = [
     "dal",
     "dal_select2",
@@ -496,7 +508,7 @@ HONEYPOT_FIELD_NAME = os.environ.get("DJANGO_HONEYPOT_FIELD_NAME", "asset_ref")
 # Huey settings
 
 HUEY = {
-    "huey_class": "huey.SqliteHuey",  # Huey implementation to use.
+    "huey_class": "icosa.queues.IcosaSqliteHuey",  # Huey implementation to use.
     "results": True,  # Store return values of tasks.
     "store_none": False,  # If a task returns None, do not save to results.
     "immediate": False,
@@ -514,12 +526,40 @@ HUEY = {
     },
 }
 
+# Further queues, each run by `manage.py run_huey_queue <name>` so that work on
+# one doesn't hold up the others. Tasks are routed to them in icosa/tasks.py;
+# see icosa/queues.py. Keys are passed to huey's consumer as in
+# HUEY["consumer"]. Use the process worker type for CPU-bound work.
+
+HUEY_QUEUES = {
+    "uploads": {
+        "workers": int(os.environ.get("DJANGO_HUEY_UPLOADS_WORKERS", 2)),
+        "worker_type": "thread",
+    },
+    "media": {
+        "workers": int(os.environ.get("DJANGO_HUEY_MEDIA_WORKERS", 2)),
+        "worker_type": "process",
+    },
+    "bulk": {
+        "workers": 1,
+        "worker_type": "thread",
+    },
+}
+
 # Note: Huey has its own setting to disable the task queue, but this still
 # calls the same code in userland. ENABLE_TASK_QUEUE is useful for excluding
 # huey from the code path entirely.
 
 ENABLE_TASK_QUEUE = os.environ.get("DJANGO_ENABLE_TASK_QUEUE", False)
 
+# When enabled, the per-user parts of pages (like buttons, nav etc.) are
+# rendered as ESI includes, to be filled in by Varnish, so that the rest of the
+# page can be cached for all users. varnish.vcl strips cookies from requests
+# for these pages, so this must be enabled whenever Django is served through
+# Varnish, and disabled otherwise.
+
+ESI_ENABLED = bool(os.environ.get("DJANGO_ESI_ENABLED", False))
+
 # Maintenance Mode settings
 
 MAINTENANCE_MODE = os.environ.get("DJANGO_MAINTENANCE_MODE", False)
@@ -4,6 +4,7 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path
 from icosa import urls as icosa_urls
+from icosa.admin import task_queues_view
 
 handler403 = icosa_urls.handler403
 handler404 = icosa_urls.handler404
@@ -12,6 +13,7 @@ handler500 = icosa_urls.handler500
 
 urlpatterns = [
     path("", include("icosa.urls")),
+    path("admin/task-queues/", admin.site.admin_view(task_queues_view), name="admin_task_queues"),
     path("admin/", admin.site.urls),
 ] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
 
@@ -19,4 +19,7 @@ fi
 
 echo "Running in $DEPLOYMENT_ENV mode"
 python manage.py run_huey &
+for queue in uploads media bulk; do
+    python manage.py run_huey_queue $queue &
+done
 uvicorn --host=0.0.0.0 --port=8000 django_project.asgi:application --lifespan off
@@ -1,14 +1,18 @@
 import secrets
+from datetime import timedelta
 
 from django.contrib import admin
 from django.contrib.auth import get_user_model
 from django.contrib.auth.admin import UserAdmin as OriginalUserAdmin
+from django.db import transaction
 from django.db.models import Count
 from django.template.response import TemplateResponse
-from django.urls import reverse
+from django.urls import path, reverse
+from django.utils import timezone
 from django.utils.safestring import mark_safe
 from import_export.admin import ExportMixin
 
+from icosa.helpers.tracing import percentile
 from icosa.models import (
     Asset,
     AssetCollection,
@@ -27,8 +31,10 @@ from icosa.models import (
     Oauth2Token,
     Resource,
     Tag,
+    UploadTraceLog,
     UserLike,
 )
+from icosa.queues import TASK_TIMING_SAMPLES, get_queue_stats
 
 User = get_user_model()
 
@@ -53,6 +59,7 @@ class ResourceAdmin(ExportMixin, admin.ModelAdmin):
     raw_id_fields = [
         "asset",
         "format",
+        "blob",
     ]
 
 
@@ -113,6 +120,11 @@ class FormatRoleLabelAdmin(admin.ModelAdmin):
         "label",
     )
 
+    def delete_queryset(self, request, queryset):
+        # Bulk deletes bypass FormatRoleLabel.delete.
+        super().delete_queryset(request, queryset)
+        transaction.on_commit(FormatRoleLabel.bump_version)
+
 
 @admin.register(Asset)
 class AssetAdmin(ExportMixin, admin.ModelAdmin):
@@ -429,6 +441,109 @@ class BulkSaveLogAdmin(admin.ModelAdmin):
     list_filter = ("finish_status",)
 
 
+def task_queues_view(request):
+    """Depth and recent timings of each task queue. Mounted on the admin
+    site in the project's urls and linked from the admin index."""
+    context = {
+        **admin.site.each_context(request),
+        "title": "Task queues",
+        "queues": get_queue_stats(),
+        "sample_count": TASK_TIMING_SAMPLES,
+    }
+    return TemplateResponse(request, "admin/task_queues.html", context)
+
+
+# How many of the most recent uploads the report covers at most.
+UPLOAD_TRACE_REPORT_LIMIT = 10000
+UPLOAD_TRACE_REPORT_PERCENTILES = [0.5, 0.9, 0.99]
+
+
+@admin.register(UploadTraceLog)
+class UploadTraceLogAdmin(admin.ModelAdmin):
+    change_list_template = "admin/upload_trace_log_change_list.html"
+    list_display = (
+        "create_time",
+        "asset",
+        "source",
+        "succeeded",
+        "total_seconds",
+        "total_bytes",
+        "file_count",
+    )
+    list_filter = ("source", "succeeded", "create_time")
+    raw_id_fields = ("asset",)
+    readonly_fields = (
+        "create_time",
+        "asset",
+        "source",
+        "succeeded",
+        "total_seconds",
+        "total_bytes",
+        "file_count",
+        "stages",
+    )
+
+    def get_urls(self):
+        urls = [
+            path(
+                "report/",
+                self.admin_site.admin_view(self.report_view),
+                name="icosa_uploadtracelog_report",
+            ),
+        ]
+        return urls + super().get_urls()
+
+    def report_view(self, request):
+        try:
+            days = int(request.GET.get("days", 7))
+        except ValueError:
+            days = 7
+        traces = UploadTraceLog.objects.filter(
+            create_time__gte=timezone.now() - timedelta(days=days),
+            succeeded=True,
+        ).order_by("-create_time")[:UPLOAD_TRACE_REPORT_LIMIT]
+
+        totals = []
+        stage_seconds = {}
+        stage_bytes = {}
+        for total_seconds, stages in traces.values_list("total_seconds", "stages"):
+            totals.append(total_seconds)
+            for name, stage in stages.items():
+                stage_seconds.setdefault(name, []).append(stage["s"])
+                stage_bytes.setdefault(name, []).append(stage["b"])
+
+        all_seconds = sum(totals)
+        rows = [
+            {
+                "name": "total",
+                "count": len(totals),
+                "percentiles": [percentile(totals, x) for x in UPLOAD_TRACE_REPORT_PERCENTILES],
+                "share": 1 if all_seconds else None,
+                "mean_bytes": None,
+            }
+        ]
+        for name, seconds in sorted(stage_seconds.items(), key=lambda x: -sum(x[1])):
+            rows.append(
+                {
+                    "name": name,
+                    "count": len(seconds),
+                    "percentiles": [percentile(seconds, x) for x in UPLOAD_TRACE_REPORT_PERCENTILES],
+                    "share": sum(seconds) / all_seconds if all_seconds else None,
+                    "mean_bytes": sum(stage_bytes[name]) / len(seconds),
+                }
+            )
+
+        context = {
+            **self.admin_site.each_context(request),
+            "title": "Upload timings",
+            "days": days,
+            "percentile_labels": [f"p{round(x * 100)}" for x in UPLOAD_TRACE_REPORT_PERCENTILES],
+            "rows": rows,
+            "limit": UPLOAD_TRACE_REPORT_LIMIT,
+        }
+        return TemplateResponse(request, "admin/upload_trace_report.html", context)
+
+
 @admin.register(HiddenMediaFileLog)
 class HiddenMediaFileLogAdmin(ExportMixin, admin.ModelAdmin):
     list_display = (
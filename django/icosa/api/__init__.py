@@ -22,9 +22,17 @@ POLY_CATEGORY_MAP = {
 DEFAULT_PAGE_SIZE = 20
 DEFAULT_PAGE_TOKEN = 1
 MAX_PAGE_SIZE = 100
+# How many assets to embed per collection in collection lists, unless the
+# request asks for a different number with `assetsLimit`.
+DEFAULT_COLLECTION_ASSETS_LIMIT = 20
 
 DEFAULT_CACHE_SECONDS = 10
 
+# Resumable uploads are sent in chunks of at most this many bytes, and may not
+# be larger in total than a single request upload.
+UPLOAD_CHUNK_MAX_BYTES = 32 * 1024 * 1024
+UPLOAD_SESSION_MAX_BYTES = settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+
 NOT_FOUND = HttpError(404, "Asset not found.")
 
 
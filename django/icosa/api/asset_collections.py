@@ -3,6 +3,8 @@ from typing import List
 from icosa.api import (
     COMMON_ROUTER_SETTINGS,
     DEFAULT_CACHE_SECONDS,
+    DEFAULT_COLLECTION_ASSETS_LIMIT,
+    MAX_PAGE_SIZE,
     NOT_FOUND,
     AssetCollectionPagination,
 )
@@ -13,10 +15,11 @@ from icosa.models import (
     AssetCollection,
 )
 from icosa.views.decorators import cache_per_user
-from ninja import Router
+from ninja import Query, Router
 from ninja.decorators import decorate_view
 from ninja.pagination import paginate
 
+from .filters import FiltersCollectionAssets, prefetch_collection_assets
 from .schema import AssetCollectionSchema
 
 router = Router()
@@ -37,10 +40,18 @@ router = Router()
 )
 @decorate_view(cache_per_user(DEFAULT_CACHE_SECONDS))
 @paginate(AssetCollectionPagination)
-def collection_list(request):
+def collection_list(
+    request,
+    filters: Query[FiltersCollectionAssets],
+):
     collections = AssetCollection.objects.filter(visibility=PUBLIC).exclude(
         moderation_state__in=MOD_HIDDEN
     )
+    collections = prefetch_collection_assets(
+        collections,
+        include_assets=filters.includeAssets is not False,
+        assets_limit=filters.get_assets_limit(DEFAULT_COLLECTION_ASSETS_LIMIT, MAX_PAGE_SIZE),
+    )
     _ = request
     return collections
 
@@ -51,13 +62,21 @@ def collection_list(request):
     **COMMON_ROUTER_SETTINGS,
 )
 @decorate_view(cache_per_user(DEFAULT_CACHE_SECONDS))
-def collection_show(request, asset_collection_url):
+def collection_show(
+    request,
+    asset_collection_url,
+    filters: Query[FiltersCollectionAssets],
+):
+    collections = AssetCollection.objects.filter(visibility__in=[PUBLIC, UNLISTED]).exclude(
+        moderation_state__in=MOD_HIDDEN
+    )
+    collections = prefetch_collection_assets(
+        collections,
+        include_assets=filters.includeAssets is not False,
+        assets_limit=filters.get_assets_limit(None, None),
+    )
     try:
-        collection = (
-            AssetCollection.objects.filter(visibility__in=[PUBLIC, UNLISTED])
-            .exclude(moderation_state__in=MOD_HIDDEN)
-            .get(url=asset_collection_url)
-        )
+        collection = collections.get(url=asset_collection_url)
     except AssetCollection.DoesNotExist:
         raise NOT_FOUND
     _ = request
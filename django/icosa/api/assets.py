@@ -3,6 +3,7 @@ from typing import List
 
 from constance import config
 from django.db.models import Q
+from django.views.decorators.cache import never_cache
 from ninja import Query, Router
 from ninja.decorators import decorate_view
 from ninja.pagination import paginate
@@ -14,6 +15,8 @@ from icosa.api import (
     AssetPagination,
     get_asset_by_url,
 )
+from icosa.helpers.upload_progress import get_upload_progress_for_user
+from icosa.jwt.authentication import JWTAuth
 from icosa.model_mixins import MOD_HIDDEN
 from icosa.models import (
     ALL_RIGHTS_RESERVED,
@@ -32,6 +35,7 @@ from .filters import (
 from .schema import (
     AssetSchema,
     AssetStateSchema,
+    UploadProgressSchema,
 )
 
 router = Router()
@@ -78,6 +82,27 @@ def asset_upload_state(
     return asset
 
 
+@router.get(
+    "/{str:asset_url}/upload_progress",
+    response={200: UploadProgressSchema},
+    auth=JWTAuth(),
+    **COMMON_ROUTER_SETTINGS,
+)
+@decorate_view(never_cache)
+def asset_upload_progress(
+    request,
+    asset_url: str,
+):
+    """The stage and percentage reached by the asset's most recent upload,
+    and why it failed if it did. Only the user who uploaded can see this.
+    Served from the cache rather than the asset, so that it can be polled
+    often. Not found once the upload is a day old; use upload_state then."""
+    progress = get_upload_progress_for_user(asset_url, request.user)
+    if progress is None:
+        raise NOT_FOUND
+    return progress
+
+
 @router.get(
     "",
     response=List[AssetSchema],
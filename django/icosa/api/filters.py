@@ -1,7 +1,7 @@
 from enum import Enum, auto
 from typing import List, Optional
 
-from django.db.models import F, Q
+from django.db.models import F, Prefetch, Q, Value
 from django.db.models.query import QuerySet
 from ninja import Field, FilterSchema, Schema
 from ninja.errors import HttpError
@@ -10,7 +10,7 @@ from pydantic.json_schema import SkipJsonSchema
 
 from icosa.api.exceptions import FilterException
 from icosa.model_mixins import MOD_HIDDEN
-from icosa.models import Asset
+from icosa.models import PUBLIC, Asset, AssetCollectionAsset, Format
 
 
 class FilterCategory(Enum):
@@ -328,6 +328,45 @@ class FiltersOrder(Schema):
     order_by: SkipJsonSchema[Optional[FilterOrder]] = Field(default=None)  # For backwards compatibility
 
 
+class FiltersCollectionAssets(Schema):
+    includeAssets: Optional[bool] = Field(default=None)
+    assetsLimit: Optional[int] = Field(default=None, ge=0)
+
+    def get_assets_limit(self, default: Optional[int], maximum: Optional[int]) -> Optional[int]:
+        limit = default if self.assetsLimit is None else self.assetsLimit
+        if limit is not None and maximum is not None:
+            limit = min(limit, maximum)
+        return limit
+
+
+def prefetch_collection_assets(
+    collections: QuerySet,
+    include_assets: bool = True,
+    assets_limit: Optional[int] = None,
+) -> QuerySet:
+    """Fetch the assets AssetCollectionSchema embeds for all of `collections`
+    up front, rather than per collection and per asset. With `assets_limit`,
+    only the first assets of each collection are fetched, using a window
+    function over the collection's items."""
+    if not include_assets:
+        return collections.annotate(include_assets=Value(False))
+    items = (
+        AssetCollectionAsset.objects.filter(asset__visibility=PUBLIC)
+        .exclude(asset__moderation_state__in=MOD_HIDDEN)
+        .select_related("asset", "asset__owner")
+        .prefetch_related(
+            "asset__resource_set",
+            Prefetch("asset__format_set", queryset=Format.objects.select_related("root_resource")),
+            "asset__format_set__resource_set",
+            "asset__tags",
+        )
+        .order_by("order", "pk")
+    )
+    if assets_limit is not None:
+        items = items[:assets_limit]
+    return collections.prefetch_related(Prefetch("collected_assets", queryset=items, to_attr="api_collected_assets"))
+
+
 def sort_assets(key: FilterOrder, assets: QuerySet[Asset]) -> QuerySet[Asset]:
     (sort_key, sort_direction) = ORDER_FIELD_MAP.get(key.value)
 
@@ -48,6 +48,27 @@ def calc_dimensions(maxwidth, maxheight):
     return (frame_width, frame_height)
 
 
+def get_thumbnail_data(asset, maxwidth, maxheight):
+    variant = asset.get_thumbnail_variant(maxwidth, maxheight)
+    if variant is None:
+        # Derivatives have not been made for this asset yet.
+        # TODO Must obey maxwidth and maxheight
+        return {
+            "thumbnail_url": asset.get_thumbnail_url(),
+            "thumbnail_width": "256",
+            "thumbnail_height": "256",
+        }
+    if (maxwidth and variant["width"] > maxwidth) or (maxheight and variant["height"] > maxheight):
+        # Even our smallest thumbnail is too big. The spec would rather we
+        # left it out.
+        return {}
+    return {
+        "thumbnail_url": variant["url"],
+        "thumbnail_width": f"{variant['width']}",
+        "thumbnail_height": f"{variant['height']}",
+    }
+
+
 @router.get("", response=OembedOut)
 def oembed(
     request,
@@ -91,9 +112,7 @@ def oembed(
         "author_url": f"{host}{asset.owner.django_user.get_absolute_url()}" if asset.owner.django_user else "",
         "provider_name": "Icosa",  # TODO make configurable
         "provider_url": host,
-        "thumbnail_url": asset.thumbnail,  # TODO resize to maxwidth / maxheight
-        "thumbnail_width": "256",  # TODO Must obey maxwidth (?)
-        "thumbnail_height": "256",  # TODO Must obey maxheight (?)
+        **get_thumbnail_data(asset, maxwidth, maxheight),
         "html": embed_code.strip(),
         "width": f"{frame_width}",
         "height": f"{frame_height}",
@@ -3,6 +3,7 @@ from enum import Enum
 from typing import List, Literal, Optional
 
 from django.urls import reverse_lazy
+from icosa.api import UPLOAD_CHUNK_MAX_BYTES
 from icosa.helpers.file import VALID_FORMAT_STRINGS
 from icosa.model_mixins import MOD_HIDDEN
 from icosa.models import PUBLIC, Asset, AssetCollection
@@ -78,10 +79,18 @@ class AssetResource(Schema):
         return obj.url
 
 
+class ThumbnailVariant(Schema):
+    url: str
+    width: int
+    height: int
+    contentType: str
+
+
 class Thumbnail(Schema):
     relativePath: Optional[str] = None
     contentType: Optional[str] = None
     url: Optional[str] = None
+    variants: List[ThumbnailVariant] = []
 
 
 class FormatComplexity(Schema):
@@ -181,6 +190,8 @@ class AssetSchema(ModelSchema):
 
     @staticmethod
     def resolve_formats(obj, context):
+        if "format_set" in getattr(obj, "_prefetched_objects_cache", {}):
+            return [f for f in obj.format_set.all() if f.format_type in VALID_FORMAT_STRINGS]
         return [f for f in obj.format_set.filter(format_type__in=VALID_FORMAT_STRINGS)]
 
     @staticmethod
@@ -191,10 +202,22 @@ class AssetSchema(ModelSchema):
     def resolve_thumbnail(obj):
         data = {}
         if obj.thumbnail:
+            # Derivatives are made from the preview image when there is one,
+            # so only list them when they are copies of this thumbnail.
             data = {
                 "relativePath": obj.thumbnail.name.split("/")[-1],
                 "contentType": obj.thumbnail_contenttype,
                 "url": obj.thumbnail.url,
+                "variants": [
+                    {
+                        "url": x["url"],
+                        "width": x["width"],
+                        "height": x["height"],
+                        "contentType": x["content_type"],
+                    }
+                    for content_type in ["image/webp", "image/jpeg"]
+                    for x in obj.get_thumbnail_variants(content_type, source_name=obj.thumbnail.name)
+                ],
             }
         return data
 
@@ -261,6 +284,34 @@ class UploadJobSchemaOut(Schema):
     assetId: str
 
 
+class UploadSessionPostSchema(Schema):
+    filename: str
+    size: int = Field(..., gt=0)
+    sha256: Optional[str] = Field(None, pattern="^[0-9a-fA-F]{64}$")
+
+
+class UploadSessionSchema(Schema):
+    uploadId: str = Field(..., alias="url")
+    filename: str
+    size: int
+    receivedBytes: int = Field(..., alias="received_bytes")
+    chunkSize: int
+    state: str
+
+    @staticmethod
+    def resolve_chunkSize(obj):
+        return UPLOAD_CHUNK_MAX_BYTES
+
+
+class UploadProgressSchema(Schema):
+    state: str
+    stage: str
+    percent: int
+    error: Optional[str] = None
+    errorType: Optional[str] = Field(None, alias="error_type")
+    updateTime: datetime = Field(..., alias="update_time")
+
+
 class OembedOut(Schema):
     type: Literal["rich"]
     version: Literal["1.0"]
@@ -312,8 +363,15 @@ class AssetCollectionSchema(ModelSchema):
     def resolve_assets(obj, context):
         # NOTE: obj.assets are the raw assets without any of the collection's
         # metadata (e.g. time added, order in the collection).
-        assets = obj.assets.filter(visibility__in=[PUBLIC]).exclude(
-            moderation_state__in=MOD_HIDDEN
+        if not getattr(obj, "include_assets", True):
+            return None
+        if hasattr(obj, "api_collected_assets"):
+            # Prefetched by filters.prefetch_collection_assets.
+            return [item.asset for item in obj.api_collected_assets]
+        assets = (
+            obj.assets.filter(visibility__in=[PUBLIC])
+            .exclude(moderation_state__in=MOD_HIDDEN)
+            .order_by("assetcollectionasset__order")
         )
         return assets
 
@@ -369,5 +427,11 @@ class AssetCollectionPutSchema(Schema):
     asset_url: Optional[List[str]] = None
 
 
+class AssetCollectionMoveAssetSchema(Schema):
+    asset_url: str
+    before_asset_url: Optional[str] = None
+    after_asset_url: Optional[str] = None
+
+
 class Error(Schema):
     message: str
@@ -1,9 +1,12 @@
+import os
+import re
 import secrets
 from typing import (
     List,
     Optional,
 )
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.db import transaction
 from django.db.models import Q
@@ -11,9 +14,14 @@ from django.shortcuts import (
     aget_object_or_404,
     get_object_or_404,
 )
+from django.utils import timezone
 from django.views.decorators.cache import never_cache
 from icosa.api import (
     COMMON_ROUTER_SETTINGS,
+    DEFAULT_COLLECTION_ASSETS_LIMIT,
+    MAX_PAGE_SIZE,
+    UPLOAD_CHUNK_MAX_BYTES,
+    UPLOAD_SESSION_MAX_BYTES,
     AssetCollectionPagination,
     AssetPagination,
     acheck_user_owns_asset,
@@ -27,7 +35,14 @@ from icosa.helpers.file import (
     validate_mime,
 )
 from icosa.helpers.snowflake import generate_snowflake
-from icosa.helpers.upload import upload_api_asset
+from icosa.helpers.upload import (
+    upload_api_asset,
+    upload_session_asset,
+)
+from icosa.helpers.upload_progress import (
+    UPLOAD_STAGE_QUEUED,
+    set_upload_progress,
+)
 from icosa.jwt.authentication import (
     JWTAuth,
     JWTAuthAsync,
@@ -36,12 +51,19 @@ from icosa.models import (
     PRIVATE,
     PUBLIC,
     UNLISTED,
+    UPLOAD_SESSION_FINALIZED,
+    UPLOAD_SESSION_OPEN,
     VALID_THUMBNAIL_MIME_TYPES,
     Asset,
     AssetCollection,
     AssetOwner,
+    UploadChecksumError,
+    UploadSession,
+)
+from icosa.tasks import (
+    queue_upload_api_asset,
+    queue_upload_session_asset,
 )
-from icosa.tasks import queue_upload_api_asset
 from ninja import (
     File,
     Form,
@@ -55,11 +77,14 @@ from ninja.pagination import paginate
 
 from .filters import (
     FiltersAsset,
+    FiltersCollectionAssets,
     FiltersOrder,
     FiltersUserAsset,
     filter_and_sort_assets,
+    prefetch_collection_assets,
 )
 from .schema import (
+    AssetCollectionMoveAssetSchema,
     AssetCollectionPatchSchema,
     AssetCollectionPostSchema,
     AssetCollectionPutSchema,
@@ -74,10 +99,35 @@ from .schema import (
     ImageSchema,
     PatchUserSchema,
     UploadJobSchemaOut,
+    UploadSessionPostSchema,
+    UploadSessionSchema,
 )
 
 router = Router()
 
+CONTENT_RANGE_REGEX = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
+CHUNK_SHA256_REGEX = re.compile(r"^[0-9a-fA-F]{64}$")
+
+
+async def acreate_untitled_asset(user) -> Asset:
+    owner, _ = await AssetOwner.objects.aget_or_create(
+        django_user=user,
+        email=user.email,
+        defaults={
+            "url": secrets.token_urlsafe(8),
+            "displayname": user.displayname,
+        },
+    )
+    job_snowflake = generate_snowflake()
+    asset_token = secrets.token_urlsafe(8)
+    asset = await Asset.objects.acreate(
+        id=job_snowflake,
+        url=asset_token,
+        owner=owner,
+        name="Untitled Asset",
+    )
+    return asset
+
 
 @router.get(
     "/me",
@@ -155,24 +205,10 @@ async def create_a_new_asset(
     files: Optional[List[UploadedFile]] = File(None),
 ):
     user = request.user
-    owner, _ = await AssetOwner.objects.aget_or_create(
-        django_user=user,
-        email=user.email,
-        defaults={
-            "url": secrets.token_urlsafe(8),
-            "displayname": user.displayname,
-        },
-    )
-    job_snowflake = generate_snowflake()
-    asset_token = secrets.token_urlsafe(8)
-    asset = await Asset.objects.acreate(
-        id=job_snowflake,
-        url=asset_token,
-        owner=owner,
-        name="Untitled Asset",
-    )
+    asset = await acreate_untitled_asset(user)
     if files is not None:
         try:
+            set_upload_progress(asset.url, UPLOAD_STAGE_QUEUED, user_id=user.pk)
             if getattr(settings, "ENABLE_TASK_QUEUE", True) is True:
                 await queue_upload_api_asset(
                     user,
@@ -192,6 +228,158 @@ async def create_a_new_asset(
     return get_publish_url(request, asset, 201)
 
 
+# Resumable uploads: create a session, PUT the file in chunks, each with a
+# Content-Range header and the chunk's sha256 in X-Chunk-SHA256, then
+# finalize. After a dropped connection, GET the session to find out how many
+# bytes were received and carry on from there.
+
+
+@router.post(
+    "/me/uploads",
+    auth=JWTAuth(),
+    response={201: UploadSessionSchema},
+)
+@decorate_view(never_cache)
+def create_upload_session(
+    request,
+    data: UploadSessionPostSchema,
+):
+    if data.size > UPLOAD_SESSION_MAX_BYTES:
+        raise HttpError(413, f"Uploads may be at most {UPLOAD_SESSION_MAX_BYTES} bytes.")
+    filename = os.path.basename(data.filename.replace("\\", "/"))
+    if not filename:
+        raise HttpError(422, "Include a filename.")
+    upload_session = UploadSession.objects.create(
+        user=request.user,
+        filename=filename,
+        size=data.size,
+        sha256=(data.sha256 or "").lower(),
+    )
+    return 201, upload_session
+
+
+@router.get(
+    "/me/uploads/{str:upload_id}",
+    auth=JWTAuth(),
+    response=UploadSessionSchema,
+)
+@decorate_view(never_cache)
+def show_upload_session(
+    request,
+    upload_id: str,
+):
+    return get_object_or_404(UploadSession, url=upload_id, user=request.user)
+
+
+@router.put(
+    "/me/uploads/{str:upload_id}",
+    auth=JWTAuth(),
+    response={200: UploadSessionSchema, 409: UploadSessionSchema},
+)
+@decorate_view(never_cache)
+def upload_chunk(
+    request,
+    upload_id: str,
+):
+    match = CONTENT_RANGE_REGEX.match(request.headers.get("Content-Range", ""))
+    if match is None:
+        raise HttpError(400, "Include a Content-Range header of the form `bytes start-end/size`.")
+    start, end, size = (int(x) for x in match.groups())
+    checksum = request.headers.get("X-Chunk-SHA256", "")
+    if CHUNK_SHA256_REGEX.match(checksum) is None:
+        raise HttpError(400, "Include the chunk's sha256 hex digest in an X-Chunk-SHA256 header.")
+    length = end - start + 1
+    if length < 1 or length > UPLOAD_CHUNK_MAX_BYTES:
+        raise HttpError(413, f"Chunks must be between 1 and {UPLOAD_CHUNK_MAX_BYTES} bytes.")
+
+    with transaction.atomic():
+        upload_session = get_object_or_404(
+            UploadSession.objects.select_for_update(),
+            url=upload_id,
+            user=request.user,
+        )
+        if upload_session.state != UPLOAD_SESSION_OPEN:
+            raise HttpError(409, "This upload has already been finalized.")
+        if size != upload_session.size or end >= upload_session.size:
+            raise HttpError(400, "Content-Range does not match the size of the upload.")
+        if start != upload_session.received_bytes:
+            # The client should carry on from received_bytes.
+            return 409, upload_session
+        try:
+            upload_session.write_chunk(request, length, checksum)
+        except UploadChecksumError as e:
+            raise HttpError(400, f"{e}")
+    return 200, upload_session
+
+
+@router.post(
+    "/me/uploads/{str:upload_id}/finalize",
+    auth=JWTAuthAsync(),
+    response={201: UploadJobSchemaOut},
+)
+@decorate_view(never_cache)
+async def finalize_upload_session(
+    request,
+    upload_id: str,
+    data: Form[AssetMetaData],
+):
+    user = request.user
+    upload_session = await aget_object_or_404(UploadSession, url=upload_id, user=user)
+    if upload_session.state != UPLOAD_SESSION_OPEN:
+        raise HttpError(409, "This upload has already been finalized.")
+    if not upload_session.is_complete:
+        raise HttpError(
+            409,
+            f"This upload is incomplete: received {upload_session.received_bytes} of {upload_session.size} bytes.",
+        )
+    if not await sync_to_async(upload_session.verify_checksum)():
+        raise HttpError(400, "The uploaded file does not match its checksum.")
+    # Only one finalize request gets to create the asset.
+    finalized = await UploadSession.objects.filter(
+        pk=upload_session.pk,
+        state=UPLOAD_SESSION_OPEN,
+    ).aupdate(state=UPLOAD_SESSION_FINALIZED)
+    if not finalized:
+        raise HttpError(409, "This upload has already been finalized.")
+
+    asset = await acreate_untitled_asset(user)
+    upload_session.asset = asset
+    upload_session.state = UPLOAD_SESSION_FINALIZED
+    await upload_session.asave(update_fields=["asset", "state", "update_time"])
+    set_upload_progress(asset.url, UPLOAD_STAGE_QUEUED, user_id=user.pk)
+    if getattr(settings, "ENABLE_TASK_QUEUE", True) is True:
+        await queue_upload_session_asset(
+            current_user=user,
+            asset=asset,
+            data=data,
+            upload_session=upload_session,
+        )
+    else:
+        await upload_session_asset(
+            asset,
+            data,
+            upload_session,
+        )
+
+    return get_publish_url(request, asset, 201)
+
+
+@router.delete(
+    "/me/uploads/{str:upload_id}",
+    auth=JWTAuth(),
+    response={204: None},
+)
+def delete_upload_session(
+    request,
+    upload_id: str,
+):
+    upload_session = get_object_or_404(UploadSession, url=upload_id, user=request.user)
+    if upload_session.state != UPLOAD_SESSION_OPEN:
+        raise HttpError(409, "This upload has already been finalized.")
+    upload_session.delete()
+    return 204, None
+
+
 @router.get(
     "/me/assets/{str:asset_url}",
     auth=JWTAuth(),
@@ -285,6 +473,18 @@ def list_my_likedassets(
     return assets
 
 
+def get_collectable_assets(asset_urls):
+    """Returns the assets for `asset_urls` which can be added to a collection,
+    in the order given, and the urls which were rejected. Looks up all the
+    assets in one query."""
+    if asset_urls is None:
+        return [], []
+    assets_by_url = {asset.url: asset for asset in Asset.objects.filter(url__in=asset_urls, visibility=PUBLIC)}
+    assets = [assets_by_url[url] for url in asset_urls if url in assets_by_url]
+    rejected_asset_urls = [url for url in asset_urls if url not in assets_by_url]
+    return assets, rejected_asset_urls
+
+
 @router.get(
     "/me/collections",
     auth=JWTAuth(),
@@ -295,9 +495,15 @@ def list_my_likedassets(
 @paginate(AssetCollectionPagination)
 def get_my_collections(
     request,
+    filters: Query[FiltersCollectionAssets],
 ):
     user = request.user
     collections = AssetCollection.objects.filter(owner__django_user=user)
+    collections = prefetch_collection_assets(
+        collections,
+        include_assets=filters.includeAssets is not False,
+        assets_limit=filters.get_assets_limit(DEFAULT_COLLECTION_ASSETS_LIMIT, MAX_PAGE_SIZE),
+    )
     return collections
 
 
@@ -318,26 +524,18 @@ def create_a_collection(
         return 400, {"message": "User has no asset owner."}
     visibility = data.visibility if data.visibility is not None else AssetVisibility.PRIVATE.value
 
-    assets = Asset.objects.none()
-    rejected_asset_urls = []
-    if data.asset_url is not None:
-        urls = []
-        for url in data.asset_url:
-            if Asset.objects.filter(url=url, visibility=PUBLIC).exists():
-                urls.append(url)
-            else:
-                rejected_asset_urls.append(url)
-        assets = Asset.objects.filter(url__in=urls)
+    assets, rejected_asset_urls = get_collectable_assets(data.asset_url)
 
-    collection = AssetCollection.objects.create(
-        name=data.name,
-        description=data.description,
-        visibility=visibility,
-        owner=owner,
-    )
-    for asset in assets:
-        collection.assets.add(asset)
+    with transaction.atomic():
+        collection = AssetCollection.objects.create(
+            name=data.name,
+            description=data.description,
+            visibility=visibility,
+            owner=owner,
+        )
+        collection.add_assets(assets)
 
+    collection = prefetch_collection_assets(AssetCollection.objects.filter(pk=collection.pk)).get()
     return 201, {"collection": collection, "rejectedAssetUrls": rejected_asset_urls if rejected_asset_urls else None}
 
 
@@ -351,11 +549,15 @@ def create_a_collection(
 def show_a_collection(
     request,
     asset_collection_url: str,
+    filters: Query[FiltersCollectionAssets],
 ):
     user = request.user
-    asset_collection = get_object_or_404(
-        AssetCollection, url=asset_collection_url, owner__django_user=user
+    collections = prefetch_collection_assets(
+        AssetCollection.objects.filter(owner__django_user=user),
+        include_assets=filters.includeAssets is not False,
+        assets_limit=filters.get_assets_limit(None, None),
     )
+    asset_collection = get_object_or_404(collections, url=asset_collection_url)
     return asset_collection
 
 
@@ -378,21 +580,13 @@ def update_a_collection(
     filtered_data = data.dict(exclude_unset=True)
     for attr, value in filtered_data.items():
         setattr(collection, attr, value)
-    collection.save()
-
-    assets = Asset.objects.none()
-    rejected_asset_urls = []
-    if data.asset_url is not None:
-        urls = []
-        for url in data.asset_url:
-            if Asset.objects.filter(url=url, visibility=PUBLIC).exists():
-                urls.append(url)
-            else:
-                rejected_asset_urls.append(url)
-        assets = Asset.objects.filter(url__in=urls)
-    for asset in assets:
-        collection.assets.add(asset)
 
+    assets, rejected_asset_urls = get_collectable_assets(data.asset_url)
+    with transaction.atomic():
+        collection.save()
+        collection.add_assets(assets)
+
+    collection = prefetch_collection_assets(AssetCollection.objects.filter(pk=collection.pk)).get()
     return 200, {"collection": collection, "rejectedAssetUrls": rejected_asset_urls if rejected_asset_urls else None}
 
 
@@ -412,26 +606,74 @@ def overwrite_assets_for_a_collection(
     collection = get_object_or_404(
         AssetCollection, url=asset_collection_url, owner__django_user=user
     )
-    for asset in collection.assets.all():
-        collection.assets.remove(asset)
-
-    assets = Asset.objects.none()
-    rejected_asset_urls = []
-    if data.asset_url is not None:
-        urls = []
-        for url in data.asset_url:
-            if Asset.objects.filter(url=url, visibility=PUBLIC).exists():
-                urls.append(url)
-            else:
-                rejected_asset_urls.append(url)
-        assets = Asset.objects.filter(url__in=urls)
-    for asset in assets:
-        collection.assets.add(asset)
-
-    collection.save()
+    assets, rejected_asset_urls = get_collectable_assets(data.asset_url)
+    with transaction.atomic():
+        collection.replace_assets(assets)
+        collection.save()
+    collection = prefetch_collection_assets(AssetCollection.objects.filter(pk=collection.pk)).get()
     return 200, {"collection": collection, "rejectedAssetUrls": rejected_asset_urls if rejected_asset_urls else None}
 
 
+@router.post(
+    "/me/collections/{str:asset_collection_url}/remove_assets",
+    auth=JWTAuth(),
+    response={200: AssetCollectionSchema, 400: Error},
+    **COMMON_ROUTER_SETTINGS,
+)
+@decorate_view(never_cache)
+def remove_assets_from_a_collection(
+    request,
+    asset_collection_url: str,
+    data: AssetCollectionPutSchema,
+):
+    user = request.user
+    collection = get_object_or_404(
+        AssetCollection, url=asset_collection_url, owner__django_user=user
+    )
+    with transaction.atomic():
+        collection.remove_assets(Asset.objects.filter(url__in=data.asset_url or []))
+        collection.save()
+    return 200, prefetch_collection_assets(AssetCollection.objects.filter(pk=collection.pk)).get()
+
+
+@router.post(
+    "/me/collections/{str:asset_collection_url}/move_asset",
+    auth=JWTAuth(),
+    response={200: AssetCollectionSchema, 400: Error},
+    **COMMON_ROUTER_SETTINGS,
+)
+@decorate_view(never_cache)
+def move_an_asset_in_a_collection(
+    request,
+    asset_collection_url: str,
+    data: AssetCollectionMoveAssetSchema,
+):
+    user = request.user
+    collection = get_object_or_404(
+        AssetCollection, url=asset_collection_url, owner__django_user=user
+    )
+    if (data.before_asset_url is None) == (data.after_asset_url is None):
+        return 400, {"message": "Provide one of before_asset_url or after_asset_url."}
+    target_url = data.before_asset_url or data.after_asset_url
+    items = {
+        item.asset.url: item
+        for item in collection.collected_assets.filter(
+            asset__url__in=[data.asset_url, target_url]
+        ).select_related("asset")
+    }
+    item = items.get(data.asset_url)
+    target = items.get(target_url)
+    if item is None or target is None:
+        return 400, {"message": "Asset is not in this collection."}
+    with transaction.atomic():
+        if data.before_asset_url is not None:
+            item.move_before(target)
+        else:
+            item.move_after(target)
+        AssetCollection.objects.filter(pk=collection.pk).update(update_time=timezone.now())
+    return 200, prefetch_collection_assets(AssetCollection.objects.filter(pk=collection.pk)).get()
+
+
 @router.delete(
     "/me/collections/{str:asset_collection_url}",
     auth=JWTAuth(),
@@ -12,11 +12,36 @@ def settings_processor(request):
     }
 
 
+class LikedAssetIds:
+    """Like status for the current user's assets, resolved on first use.
+
+    Supports `asset_id in liked_asset_ids`. Only the ids asked about are
+    looked up, so pages without like buttons make no queries. Call `prime()`
+    with all the ids on a page first to look them up in one query.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self._liked = set()
+        self._resolved = set()
+
+    def prime(self, asset_ids):
+        if self.user is None or self.user.is_anonymous:
+            return
+        unresolved = {asset_id for asset_id in asset_ids if asset_id not in self._resolved}
+        if not unresolved:
+            return
+        self._liked.update(
+            self.user.likedassets.filter(asset_id__in=unresolved).values_list("asset_id", flat=True)
+        )
+        self._resolved.update(unresolved)
+
+    def __contains__(self, asset_id):
+        self.prime([asset_id])
+        return asset_id in self._liked
+
+
 def user_asset_likes_processor(request):
-    user = request.user
-    liked_asset_ids = []
-    if user is not None and not user.is_anonymous:
-        liked_asset_ids = list(user.likedassets.all().values_list("asset", flat=True))
     return {
-        "user_liked_asset_ids": liked_asset_ids,
+        "user_liked_asset_ids": LikedAssetIds(request.user),
     }
@@ -1,8 +1,11 @@
 import base64
+import hashlib
 import io
 import os
 import re
+import tempfile
 import time
+import zipfile
 from collections.abc import Buffer
 from dataclasses import dataclass
 from typing import List, Optional
@@ -10,6 +13,7 @@ from typing import List, Optional
 import ijson
 import magic
 from django.core.files.uploadedfile import InMemoryUploadedFile
+from icosa.api.exceptions import ZipException
 from icosa.helpers.logger import icosa_log
 from icosa.models import (
     ASSET_STATE_UPLOADING,
@@ -77,6 +81,10 @@ CONTENT_TYPE_MAP = {
 
 MAX_UNZIP_BYTES = 1073741824  # 1024MB
 MAX_UNZIP_SECONDS = 120
+# Extracted zip members are held in memory up to this size, then moved to a
+# temporary file on disk.
+UNZIP_SPOOL_MAX_BYTES = 1048576  # 1MB
+UNZIP_CHUNK_BYTES = 65536  # 64KB
 
 
 def get_content_type(filename):
@@ -84,6 +92,48 @@ def get_content_type(filename):
     return CONTENT_TYPE_MAP.get(extension, None)
 
 
+def extract_zip_member(zip_file: zipfile.ZipFile, member: zipfile.ZipInfo, max_bytes: int) -> UploadedFile:
+    """Extract `member` a chunk at a time into a SpooledTemporaryFile, so that
+    large members end up on disk rather than in memory. Raises ZipException if
+    the member turns out to be larger than `max_bytes`, whatever its header
+    says. The file's sha256 is worked out on the way and kept on the returned
+    file; see get_file_sha256."""
+    spooled_file = tempfile.SpooledTemporaryFile(max_size=UNZIP_SPOOL_MAX_BYTES)
+    extracted_bytes = 0
+    digest = hashlib.sha256()
+    with zip_file.open(member) as extracted_file:
+        while chunk := extracted_file.read(UNZIP_CHUNK_BYTES):
+            extracted_bytes += len(chunk)
+            if extracted_bytes > max_bytes:
+                spooled_file.close()
+                raise ZipException(f"Uncompressed zip will be larger than {MAX_UNZIP_BYTES}")
+            digest.update(chunk)
+            spooled_file.write(chunk)
+    spooled_file.seek(0)
+    uploaded_file = UploadedFile(
+        name=member.filename,
+        file=spooled_file,
+        size=extracted_bytes,
+    )
+    uploaded_file.sha256 = digest.hexdigest()
+    return uploaded_file
+
+
+def get_file_sha256(file: UploadedFile) -> str:
+    """The sha256 hex digest of `file`'s contents. Files extracted from zips
+    already know theirs; anything else is read through once."""
+    sha256 = getattr(file, "sha256", None)
+    if sha256 is None:
+        digest = hashlib.sha256()
+        file.seek(0)
+        for chunk in file.chunks(chunk_size=UNZIP_CHUNK_BYTES):
+            digest.update(chunk)
+        file.seek(0)
+        sha256 = digest.hexdigest()
+        file.sha256 = sha256
+    return sha256
+
+
 def upload_file_gcs(source_file, destination_blob_name):
     # stub to make the server run
     return True
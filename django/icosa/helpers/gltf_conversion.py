@@ -0,0 +1,172 @@
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.core.files import File
+from icosa.helpers.logger import icosa_log
+from icosa.models.helpers import get_cloud_media_root
+
+GLTF_CONVERTER_EXE = "/node_modules/gltf-pipeline/bin/gltf-pipeline.js"
+# Part of every cache key. Change this when the converter or its arguments
+# change so that old outputs are not reused.
+GLTF_CONVERTER_VERSION = "gltf-pipeline --keepUnusedElements --binary"
+
+SHADER_URL = "https://vr.google.com/shaders/w/"
+
+CONVERTED_GLB_ROLE = "CONVERTED_GLB_FORMAT"
+
+CONVERSION_STAGE_CACHED = "cached"
+CONVERSION_STAGE_QUEUED = "queued"
+CONVERSION_STAGE_CONVERTING = "converting"
+CONVERSION_STAGE_DONE = "done"
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class GltfConversionError(Exception):
+    pass
+
+
+def get_conversion_executor() -> ThreadPoolExecutor:
+    """The pool which all conversions in this process go through. Each
+    thread waits on one Node process, so its size caps how many run at
+    once."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "GLTF_CONVERSION_WORKERS", 2),
+                thread_name_prefix="gltf-conversion",
+            )
+        return _executor
+
+
+def get_converter_missing_reason() -> Optional[str]:
+    """Why the converter can't run here, or None if it can. Node and
+    gltf-pipeline are commented out of the Dockerfile, so images built from
+    it can't convert."""
+    if shutil.which("node") is None:
+        return "node is not installed."
+    if not os.path.exists(GLTF_CONVERTER_EXE):
+        return f"gltf-pipeline is not installed at {GLTF_CONVERTER_EXE}."
+    return None
+
+
+def get_conversion_storage():
+    from icosa.models import Resource
+
+    return Resource._meta.get_field("file").storage
+
+
+def rewrite_shader_urls(gltf_path: str):
+    """Point shader uris, which the converter would otherwise try to fetch,
+    at our local dummy shaders."""
+    data = Path(gltf_path).read_text()
+    shader_dummy_path = os.path.join(settings.STATIC_ROOT, "shader_dummy")
+    Path(gltf_path).write_text(data.replace(SHADER_URL, shader_dummy_path))
+
+
+def get_conversion_key(gltf_path: str) -> str:
+    """Hash the converter version, the glTF file and every file next to it,
+    which is everything the conversion can read."""
+    digest = hashlib.sha256(GLTF_CONVERTER_VERSION.encode())
+    root = Path(gltf_path).parent
+    gltf_name = Path(gltf_path).name
+    paths = sorted([x for x in root.rglob("*") if x.is_file()], key=lambda x: x.relative_to(root).as_posix())
+    for path in paths:
+        relative_path = path.relative_to(root).as_posix()
+        # The file being converted is always hashed under the same name so
+        # that renaming it doesn't defeat the cache.
+        digest.update(b"\0" + (b"" if relative_path == gltf_name else relative_path.encode()) + b"\0")
+        with open(path, "rb") as f:
+            while chunk := f.read(HASH_CHUNK_SIZE):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_conversion_cache_name(key: str) -> str:
+    return f"{get_cloud_media_root()}conversions/glb/{key[:2]}/{key}.glb"
+
+
+def run_converter(gltf_path: str, out_path: str, timeout: int):
+    try:
+        subprocess.run(
+            [
+                "node",
+                GLTF_CONVERTER_EXE,
+                "-i",
+                gltf_path,
+                "-o",
+                out_path,
+                "--keepUnusedElements",
+                "--binary",
+            ],
+            capture_output=True,
+            check=True,
+            timeout=timeout,
+        )
+    except subprocess.TimeoutExpired:
+        raise GltfConversionError(f"Conversion of {gltf_path} took longer than {timeout} seconds.")
+    except subprocess.CalledProcessError as e:
+        stderr = e.stderr.decode(errors="replace").strip()[-500:]
+        raise GltfConversionError(f"Conversion of {gltf_path} failed: {stderr}")
+    except OSError as e:
+        raise GltfConversionError(f"Could not run the converter: {e}")
+    if not os.path.exists(out_path):
+        raise GltfConversionError(f"Conversion of {gltf_path} produced no output.")
+
+
+def convert_gltf_to_glb(
+    gltf_path: str,
+    progress: Optional[Callable[[str], None]] = None,
+) -> str:
+    """Convert the glTF 1 file at `gltf_path`, whose resources must be in
+    the same directory, to GLB. Returns the storage name of the GLB.
+
+    Outputs are cached in storage by a hash of their inputs, so converting
+    the same files twice only runs the converter once. Conversions go
+    through a pool of GLTF_CONVERSION_WORKERS threads and are killed after
+    GLTF_CONVERSION_TIMEOUT_SECONDS. `progress` is called with each
+    CONVERSION_STAGE_* the conversion reaches. Raises GltfConversionError."""
+
+    def report(stage):
+        icosa_log(f"glTF conversion of {gltf_path}: {stage}")  # Logging
+        if progress is not None:
+            progress(stage)
+
+    start = time.time()  # Logging
+    rewrite_shader_urls(gltf_path)
+    cache_name = get_conversion_cache_name(get_conversion_key(gltf_path))
+    storage = get_conversion_storage()
+    if storage.exists(cache_name):
+        report(CONVERSION_STAGE_CACHED)
+        return cache_name
+
+    timeout = getattr(settings, "GLTF_CONVERSION_TIMEOUT_SECONDS", 120)
+    with tempfile.TemporaryDirectory() as out_dir:
+        out_path = os.path.join(out_dir, "model.glb")
+
+        def convert():
+            report(CONVERSION_STAGE_CONVERTING)
+            run_converter(gltf_path, out_path, timeout)
+
+        report(CONVERSION_STAGE_QUEUED)
+        get_conversion_executor().submit(convert).result()
+        with open(out_path, "rb") as f:
+            stored_name = storage.save(cache_name, File(f, name="model.glb"))
+
+    end = time.time()  # Logging
+    icosa_log(f"Converted {gltf_path} to {stored_name} in {end - start} seconds.")  # Logging
+    report(CONVERSION_STAGE_DONE)
+    return stored_name
@@ -0,0 +1,526 @@
+import base64
+import io
+import json
+import logging
+import os
+import struct
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import BinaryIO, Dict, List, Optional
+from urllib.parse import unquote
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from PIL import Image
+
+# Files are scanned in blocks of about this size, so that large meshes are
+# never held in memory as a whole.
+MESH_STATS_BLOCK_BYTES = 4 * 1024 * 1024
+
+MESH_STATS_EXTENSIONS = ["glb", "gltf", "obj", "ply", "stl"]
+IMAGE_EXTENSIONS = ["jpeg", "jpg", "png", "webp"]
+
+GLB_MAGIC = b"glTF"
+GLB_CHUNK_JSON = 0x4E4F534A
+
+GLTF_MODE_TRIANGLES = 4
+GLTF_MODE_TRIANGLE_STRIP = 5
+GLTF_MODE_TRIANGLE_FAN = 6
+
+STL_HEADER_BYTES = 80
+STL_TRIANGLE_DTYPE = np.dtype(
+    [
+        ("normal", "<f4", (3,)),
+        ("vertices", "<f4", (3, 3)),
+        ("attributes", "<u2"),
+    ]
+)
+
+PLY_TYPES = {
+    "char": "i1",
+    "int8": "i1",
+    "uchar": "u1",
+    "uint8": "u1",
+    "short": "i2",
+    "int16": "i2",
+    "ushort": "u2",
+    "uint16": "u2",
+    "int": "i4",
+    "int32": "i4",
+    "uint": "u4",
+    "uint32": "u4",
+    "float": "f4",
+    "float32": "f4",
+    "double": "f8",
+    "float64": "f8",
+}
+
+logger = logging.getLogger("django")
+
+WHITESPACE = np.array([ord(" "), ord("\t"), ord("\r"), ord("\n")], dtype=np.uint8)
+
+
+class MeshStatsError(Exception):
+    pass
+
+
+@dataclass
+class MeshStats:
+    triangle_count: int = 0
+    vertex_count: int = 0
+    bounds_min: Optional[List[float]] = None
+    bounds_max: Optional[List[float]] = None
+    texture_bytes: int = 0
+
+    def add_bounds(self, bounds_min, bounds_max):
+        bounds_min = [float(x) for x in bounds_min[:3]]
+        bounds_max = [float(x) for x in bounds_max[:3]]
+        # NaN and inf can't be stored as JSON, and say nothing useful about
+        # the mesh's extent.
+        if not np.isfinite(bounds_min + bounds_max).all():
+            return
+        if self.bounds_min is None:
+            self.bounds_min, self.bounds_max = bounds_min, bounds_max
+        else:
+            self.bounds_min = [min(a, b) for a, b in zip(self.bounds_min, bounds_min)]
+            self.bounds_max = [max(a, b) for a, b in zip(self.bounds_max, bounds_max)]
+
+    def add_points(self, points: np.ndarray):
+        """Grow the bounds to fit `points`, an (n, 3) array. Points with a
+        non-finite coordinate are ignored."""
+        points = points[np.isfinite(points).all(axis=1)]
+        if len(points):
+            self.add_bounds(points.min(axis=0), points.max(axis=0))
+
+    @property
+    def bounding_box(self) -> Optional[Dict[str, List[float]]]:
+        if self.bounds_min is None:
+            return None
+        return {"min": self.bounds_min, "max": self.bounds_max}
+
+
+@dataclass
+class FormatFiles:
+    """The storage names of a format's files. This is plain data so that it
+    can be sent to worker processes."""
+
+    format_id: int
+    root_file_name: str
+    # Sub resources' storage names, keyed by their path relative to the root.
+    sub_file_names: Dict[str, str] = field(default_factory=dict)
+
+
+def get_image_bytes(file: BinaryIO) -> int:
+    """The memory an image takes once decoded, as 8 bit RGBA. Only the
+    image's header is read."""
+    try:
+        with Image.open(file) as image:
+            width, height = image.size
+    except Exception:
+        return 0
+    return width * height * 4
+
+
+def get_primitive_triangle_count(mode: int, count: int) -> int:
+    if mode == GLTF_MODE_TRIANGLES:
+        return count // 3
+    if mode in [GLTF_MODE_TRIANGLE_STRIP, GLTF_MODE_TRIANGLE_FAN]:
+        return max(count - 2, 0)
+    # Points and lines.
+    return 0
+
+
+def get_gltf_item(collection, key):
+    # glTF 2 refers to items by index into lists; glTF 1 by key into dicts.
+    if isinstance(collection, dict):
+        return collection[key]
+    return collection[int(key)]
+
+
+def get_gltf_values(collection):
+    if isinstance(collection, dict):
+        return list(collection.items())
+    return list(enumerate(collection))
+
+
+def read_gltf_json_stats(gltf: dict) -> MeshStats:
+    """Counts and bounds from a glTF document's accessors, without reading
+    any buffers. Meshes used by more than one node are counted once per use.
+    Bounds are taken from the POSITION accessors, so are in mesh space."""
+    stats = MeshStats()
+    accessors = gltf.get("accessors", [])
+    mesh_uses = Counter()
+    for _, node in get_gltf_values(gltf.get("nodes", [])):
+        if "mesh" in node:
+            mesh_uses[str(node["mesh"])] += 1
+        for mesh_key in node.get("meshes", []):
+            mesh_uses[str(mesh_key)] += 1
+
+    for mesh_key, mesh in get_gltf_values(gltf.get("meshes", [])):
+        uses = mesh_uses.get(str(mesh_key), 0) or 1
+        for primitive in mesh.get("primitives", []):
+            position_key = primitive.get("attributes", {}).get("POSITION")
+            if position_key is None:
+                continue
+            position = get_gltf_item(accessors, position_key)
+            vertex_count = position.get("count", 0)
+            if primitive.get("indices") is not None:
+                index_count = get_gltf_item(accessors, primitive["indices"]).get("count", 0)
+            else:
+                index_count = vertex_count
+            mode = primitive.get("mode", GLTF_MODE_TRIANGLES)
+            stats.triangle_count += get_primitive_triangle_count(mode, index_count) * uses
+            stats.vertex_count += vertex_count * uses
+            if len(position.get("min", [])) >= 3 and len(position.get("max", [])) >= 3:
+                stats.add_bounds(position["min"], position["max"])
+    return stats
+
+
+def read_gltf_image_bytes(gltf: dict, read_buffer_view, open_sub_file) -> int:
+    texture_bytes = 0
+    for _, image in get_gltf_values(gltf.get("images", [])):
+        uri = image.get("uri")
+        if image.get("bufferView") is not None:
+            data = read_buffer_view(image["bufferView"])
+            if data is not None:
+                texture_bytes += get_image_bytes(io.BytesIO(data))
+        elif uri and uri.startswith("data:"):
+            try:
+                data = base64.b64decode(uri.split(",", 1)[1])
+            except (IndexError, ValueError):
+                continue
+            texture_bytes += get_image_bytes(io.BytesIO(data))
+        elif uri:
+            sub_file = open_sub_file(unquote(uri))
+            if sub_file is not None:
+                with sub_file:
+                    texture_bytes += get_image_bytes(sub_file)
+    return texture_bytes
+
+
+def read_glb_stats(file: BinaryIO, open_sub_file) -> MeshStats:
+    magic, version, _ = struct.unpack("<4sII", file.read(12))
+    if magic != GLB_MAGIC:
+        raise MeshStatsError("Not a GLB file.")
+    if version == 1:
+        # KHR_binary_glTF: the JSON content follows a 20 byte header.
+        content_length, _ = struct.unpack("<II", file.read(8))
+        gltf = json.loads(file.read(content_length))
+        return read_gltf_json_stats(gltf)
+
+    json_length, json_type = struct.unpack("<II", file.read(8))
+    if json_type != GLB_CHUNK_JSON:
+        raise MeshStatsError("GLB is missing its JSON chunk.")
+    gltf = json.loads(file.read(json_length))
+    bin_start = 20 + json_length + 8
+
+    def read_buffer_view(buffer_view_key):
+        buffer_view = get_gltf_item(gltf.get("bufferViews", []), buffer_view_key)
+        if buffer_view.get("buffer", 0) != 0:
+            return None
+        file.seek(bin_start + buffer_view.get("byteOffset", 0))
+        return file.read(buffer_view["byteLength"])
+
+    stats = read_gltf_json_stats(gltf)
+    stats.texture_bytes = read_gltf_image_bytes(gltf, read_buffer_view, open_sub_file)
+    return stats
+
+
+def read_gltf_stats(file: BinaryIO, open_sub_file) -> MeshStats:
+    gltf = json.load(file)
+    stats = read_gltf_json_stats(gltf)
+    stats.texture_bytes = read_gltf_image_bytes(gltf, lambda key: None, open_sub_file)
+    return stats
+
+
+def iter_line_blocks(file: BinaryIO):
+    """Yield the file as uint8 arrays of whole lines, each ending in a
+    newline."""
+    remainder = b""
+    while True:
+        data = file.read(MESH_STATS_BLOCK_BYTES)
+        if not data:
+            break
+        data = remainder + data
+        end = data.rfind(b"\n") + 1
+        if end == 0:
+            remainder = data
+            continue
+        remainder = data[end:]
+        yield np.frombuffer(data[:end], dtype=np.uint8)
+    if remainder.strip():
+        yield np.frombuffer(remainder + b"\n", dtype=np.uint8)
+
+
+class LineBlock:
+    """Vectorised views of a block of text lines: where each line's first
+    token starts, and how many tokens each line has."""
+
+    def __init__(self, block: np.ndarray):
+        # Pad so that looking a few bytes past the end of a line is safe.
+        self.block = np.concatenate([block, np.full(16, ord("\n"), dtype=np.uint8)])
+        is_space = np.isin(self.block, WHITESPACE)
+        is_newline = self.block == ord("\n")
+        self.line_count = int(np.count_nonzero(is_newline[: len(block)]))
+        line_of_byte = np.cumsum(is_newline, dtype=np.int32) - is_newline
+        token_starts = np.flatnonzero(~is_space & np.concatenate([[True], is_space[:-1]]))
+        token_starts = token_starts[token_starts < len(block)]
+        token_lines = line_of_byte[token_starts]
+        self.token_counts = np.bincount(token_lines, minlength=self.line_count)
+        lines_with_tokens, first_token_index = np.unique(token_lines, return_index=True)
+        self.first_token = np.full(self.line_count, len(block), dtype=np.int64)
+        self.first_token[lines_with_tokens] = token_starts[first_token_index]
+        self.line_of_byte = line_of_byte
+        self.is_space = is_space
+
+    def keyword_lines(self, keyword: bytes) -> np.ndarray:
+        """A mask of the lines whose first token is `keyword`."""
+        mask = self.token_counts > 0
+        for offset, char in enumerate(keyword):
+            mask &= self.block[self.first_token + offset] == char
+        return mask & self.is_space[self.first_token + len(keyword)]
+
+    def keyword_values(self, keyword: bytes, mask: np.ndarray, columns: int) -> Optional[np.ndarray]:
+        """The first `columns` numbers after `keyword` on each line in
+        `mask`, as an (n, columns) array, or None if they can't be parsed."""
+        if not mask.any():
+            return np.empty((0, columns))
+        text = self.block.copy()
+        for offset in range(len(keyword)):
+            text[self.first_token[mask] + offset] = ord(" ")
+        selected_bytes = mask[np.minimum(self.line_of_byte, self.line_count - 1)]
+        selected_bytes[-16:] = False
+        try:
+            values = np.fromstring(text[selected_bytes].tobytes(), dtype=np.float64, sep=" ")
+        except ValueError:
+            return None
+        value_counts = self.token_counts[mask] - 1
+        if values.size != value_counts.sum() or value_counts.min() < columns:
+            return None
+        offsets = np.concatenate([[0], np.cumsum(value_counts)[:-1]])
+        return values[offsets[:, None] + np.arange(columns)]
+
+
+def read_obj_stats(file: BinaryIO) -> MeshStats:
+    stats = MeshStats()
+    for block in iter_line_blocks(file):
+        lines = LineBlock(block)
+        faces = lines.keyword_lines(b"f")
+        # A face with n vertices is drawn as n - 2 triangles.
+        stats.triangle_count += int(np.maximum(lines.token_counts[faces] - 3, 0).sum())
+        vertices = lines.keyword_lines(b"v")
+        stats.vertex_count += int(vertices.sum())
+        points = lines.keyword_values(b"v", vertices, 3)
+        if points is not None:
+            stats.add_points(points)
+    return stats
+
+
+def read_stl_stats(file: BinaryIO, file_size: int) -> MeshStats:
+    header = file.read(STL_HEADER_BYTES + 4)
+    if len(header) < STL_HEADER_BYTES + 4:
+        raise MeshStatsError("STL file is too short.")
+    (triangle_count,) = struct.unpack("<I", header[STL_HEADER_BYTES:])
+    if STL_HEADER_BYTES + 4 + triangle_count * STL_TRIANGLE_DTYPE.itemsize == file_size:
+        stats = MeshStats(triangle_count=triangle_count, vertex_count=triangle_count * 3)
+        per_block = MESH_STATS_BLOCK_BYTES // STL_TRIANGLE_DTYPE.itemsize
+        while data := file.read(per_block * STL_TRIANGLE_DTYPE.itemsize):
+            triangles = np.frombuffer(data, dtype=STL_TRIANGLE_DTYPE)
+            stats.add_points(triangles["vertices"].reshape(-1, 3))
+        return stats
+
+    if not header.lstrip().startswith(b"solid"):
+        raise MeshStatsError("STL file size does not match its triangle count.")
+    # An ASCII STL.
+    file.seek(0)
+    stats = MeshStats()
+    for block in iter_line_blocks(file):
+        lines = LineBlock(block)
+        stats.triangle_count += int(lines.keyword_lines(b"facet").sum())
+        vertices = lines.keyword_lines(b"vertex")
+        stats.vertex_count += int(vertices.sum())
+        points = lines.keyword_values(b"vertex", vertices, 3)
+        if points is not None:
+            stats.add_points(points)
+    return stats
+
+
+def read_ply_header(file: BinaryIO):
+    if file.readline().strip() != b"ply":
+        raise MeshStatsError("Not a PLY file.")
+    ply_format = None
+    elements = []
+    while line := file.readline():
+        words = line.decode("ascii", errors="replace").split()
+        if not words:
+            continue
+        if words[0] == "end_header":
+            return ply_format, elements
+        if words[0] == "format":
+            ply_format = words[1]
+        elif words[0] == "element":
+            elements.append({"name": words[1], "count": int(words[2]), "properties": []})
+        elif words[0] == "property" and elements:
+            elements[-1]["properties"].append(words[1:])
+    raise MeshStatsError("PLY header is not terminated.")
+
+
+def read_ply_stats(file: BinaryIO) -> MeshStats:
+    """Counts come from the header. Faces are assumed to be triangles, as
+    counting their vertices would mean walking every variable length face
+    record. Bounds are read for binary files with fixed size vertices."""
+    ply_format, elements = read_ply_header(file)
+    stats = MeshStats()
+    for element in elements:
+        if element["name"] == "vertex":
+            stats.vertex_count = element["count"]
+        elif element["name"] == "face":
+            stats.triangle_count = element["count"]
+
+    if ply_format not in ["binary_little_endian", "binary_big_endian"]:
+        return stats
+    if not elements or elements[0]["name"] != "vertex":
+        return stats
+    vertex_element = elements[0]
+    byte_order = "<" if ply_format == "binary_little_endian" else ">"
+    dtype_fields = []
+    for prop in vertex_element["properties"]:
+        if prop[0] == "list" or prop[0] not in PLY_TYPES:
+            return stats
+        dtype_fields.append((prop[1], f"{byte_order}{PLY_TYPES[prop[0]]}"))
+    vertex_dtype = np.dtype(dtype_fields)
+    if not {"x", "y", "z"} <= set(vertex_dtype.names):
+        return stats
+
+    remaining = vertex_element["count"]
+    per_block = max(MESH_STATS_BLOCK_BYTES // vertex_dtype.itemsize, 1)
+    while remaining > 0:
+        data = file.read(min(per_block, remaining) * vertex_dtype.itemsize)
+        vertices = np.frombuffer(data[: len(data) - len(data) % vertex_dtype.itemsize], dtype=vertex_dtype)
+        if not len(vertices):
+            break
+        stats.add_points(np.column_stack([vertices["x"], vertices["y"], vertices["z"]]).astype(np.float64))
+        remaining -= len(vertices)
+    return stats
+
+
+def get_format_files(format) -> Optional[FormatFiles]:
+    """The files to analyse for `format`, or None if its root resource is not
+    a stored file of a type we can read."""
+    root_resource = format.root_resource
+    if root_resource is None or not root_resource.file:
+        return None
+    extension = os.path.splitext(root_resource.file.name)[1].lower().lstrip(".")
+    if extension not in MESH_STATS_EXTENSIONS:
+        return None
+    sub_file_names = {}
+    for resource in format.resource_set.all():
+        if resource.file and resource.relative_path:
+            sub_file_names[resource.relative_path] = resource.file.name
+    return FormatFiles(
+        format_id=format.pk,
+        root_file_name=root_resource.file.name,
+        sub_file_names=sub_file_names,
+    )
+
+
+def analyze_format_files(format_files: FormatFiles, storage=None) -> MeshStats:
+    """Read the stats for a format from storage. This does not touch the
+    database, so can run in a worker process."""
+    if storage is None:
+        from icosa.models import Resource
+
+        storage = Resource._meta.get_field("file").storage
+
+    def open_sub_file(relative_path):
+        file_name = format_files.sub_file_names.get(relative_path)
+        if file_name is None:
+            return None
+        return storage.open(file_name, "rb")
+
+    extension = os.path.splitext(format_files.root_file_name)[1].lower().lstrip(".")
+    with storage.open(format_files.root_file_name, "rb") as file:
+        if extension == "glb":
+            stats = read_glb_stats(file, open_sub_file)
+        elif extension == "gltf":
+            stats = read_gltf_stats(file, open_sub_file)
+        elif extension == "obj":
+            stats = read_obj_stats(file)
+        elif extension == "stl":
+            stats = read_stl_stats(file, storage.size(format_files.root_file_name))
+        elif extension == "ply":
+            stats = read_ply_stats(file)
+        else:
+            raise MeshStatsError(f"Can't read .{extension} files.")
+
+    if extension not in ["glb", "gltf"]:
+        # Other formats don't say which images they use, so count all of the
+        # format's images.
+        for relative_path, file_name in format_files.sub_file_names.items():
+            if os.path.splitext(relative_path)[1].lower().lstrip(".") in IMAGE_EXTENSIONS:
+                with storage.open(file_name, "rb") as image_file:
+                    stats.texture_bytes += get_image_bytes(image_file)
+    return stats
+
+
+def save_format_stats(results: Dict[int, MeshStats]):
+    """Write stats to their formats, keyed by format id, and update the
+    triangle counts of the formats' assets."""
+    from icosa.models import Asset, Format, bump_landing_page_version
+    from icosa.models.asset import clear_asset_caches
+
+    now = timezone.now()
+    formats = list(Format.objects.filter(pk__in=results))
+    for format in formats:
+        stats = results[format.pk]
+        # Keep a client supplied triangle count if we found no triangles,
+        # e.g. for point clouds.
+        if stats.triangle_count or not format.triangle_count:
+            format.triangle_count = stats.triangle_count
+        format.vertex_count = stats.vertex_count
+        format.bounding_box = stats.bounding_box
+        format.texture_bytes = stats.texture_bytes
+        format.mesh_stats_time = now
+    Format.objects.bulk_update(
+        formats,
+        ["triangle_count", "vertex_count", "bounding_box", "texture_bytes", "mesh_stats_time"],
+        batch_size=1000,
+    )
+
+    asset_ids = {format.asset_id for format in formats}
+    triangle_counts = dict(
+        Format.objects.filter(asset_id__in=asset_ids)
+        .values("asset_id")
+        .annotate(max_triangle_count=Max("triangle_count"))
+        .values_list("asset_id", "max_triangle_count")
+    )
+    changed = False
+    for asset_id, old_triangle_count in Asset.objects.filter(pk__in=asset_ids).values_list("pk", "triangle_count"):
+        triangle_count = triangle_counts.get(asset_id) or 0
+        if old_triangle_count != triangle_count:
+            Asset.objects.filter(pk=asset_id).update(triangle_count=triangle_count)
+            clear_asset_caches(asset_id)
+            changed = True
+    if changed:
+        # Once per batch, rather than once per asset as Asset.save would.
+        transaction.on_commit(bump_landing_page_version)
+
+
+def analyze_asset_meshes(asset):
+    """Read and save the stats for all of `asset`'s formats which we can
+    read."""
+    results = {}
+    formats = asset.format_set.select_related("root_resource").prefetch_related("resource_set")
+    for format in formats:
+        format_files = get_format_files(format)
+        if format_files is None:
+            continue
+        try:
+            results[format.pk] = analyze_format_files(format_files)
+        except Exception as e:
+            logger.error(f"Could not read mesh stats for format {format.pk}: {type(e).__name__}: {e}")
+    if results:
+        save_format_stats(results)
+    return results
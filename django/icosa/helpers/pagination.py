@@ -0,0 +1,178 @@
+import hashlib
+from functools import cached_property
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db.models import QuerySet
+
+# How the total number of results is worked out:
+# COUNT_EXACT: a full count, cached briefly per query.
+# COUNT_APPROXIMATE: a count which stops a few pages past the requested page.
+# COUNT_NONE: no count at all; only previous and next links are shown.
+COUNT_EXACT = "EXACT"
+COUNT_APPROXIMATE = "APPROXIMATE"
+COUNT_NONE = "NONE"
+
+PAGINATION_COUNT_CACHE_SECONDS = 60
+# The fewest results an approximate count will look for, and how many pages
+# past the requested page it looks.
+APPROXIMATE_COUNT_MIN_LIMIT = 1000
+APPROXIMATE_COUNT_PAGES_AHEAD = 5
+
+
+def get_count_cache_key(queryset):
+    """A key for the count of `queryset`, or None if it has no results by
+    construction."""
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        return None
+    signature = hashlib.sha1(f"{queryset.db}:{sql}:{params!r}".encode()).hexdigest()
+    return f"pagination_count-{signature}"
+
+
+class CountingPaginator(Paginator):
+    """A Paginator which counts once per request and, for querysets, caches
+    the count for a short time. With `count_limit` set, counting stops there
+    and `count_is_approximate` is True if the limit was reached."""
+
+    next_only = False
+
+    def __init__(self, *args, count_limit=None, count_cache_seconds=PAGINATION_COUNT_CACHE_SECONDS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.count_limit = count_limit
+        self.count_cache_seconds = count_cache_seconds
+        self.count_is_approximate = False
+
+    @cached_property
+    def count(self):
+        if not isinstance(self.object_list, QuerySet):
+            return super().count
+
+        queryset = self.object_list
+        if self.count_limit is not None:
+            # Counting a slice lets the database stop early.
+            queryset = queryset[: self.count_limit + 1]
+
+        cache_key = None
+        if self.count_cache_seconds:
+            cache_key = get_count_cache_key(queryset)
+            if cache_key is None:
+                return 0
+            count = cache.get(cache_key)
+        else:
+            count = None
+        if count is None:
+            count = queryset.count()
+            if cache_key is not None:
+                cache.set(cache_key, count, self.count_cache_seconds)
+
+        if self.count_limit is not None and count > self.count_limit:
+            self.count_is_approximate = True
+            return self.count_limit
+        return count
+
+
+class NextOnlyPage(Page):
+    """A page which knows whether there is a next page without knowing how
+    many pages there are."""
+
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+    def start_index(self):
+        if not self.object_list:
+            return 0
+        return (self.number - 1) * self.paginator.per_page + 1
+
+    def end_index(self):
+        return self.start_index() + len(self.object_list) - 1 if self.object_list else 0
+
+
+class NextOnlyPaginator(Paginator):
+    """A Paginator which never counts. Each page fetches one extra row to find
+    out if there is a next page."""
+
+    next_only = True
+    count_is_approximate = False
+
+    @property
+    def count(self):
+        return None
+
+    @property
+    def num_pages(self):
+        return None
+
+    def validate_number(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages["invalid_page"])
+        if number < 1:
+            raise EmptyPage(self.error_messages["min_page"])
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        object_list = list(self.object_list[bottom : bottom + self.per_page + 1])
+        has_next = len(object_list) > self.per_page
+        return NextOnlyPage(object_list[: self.per_page], number, self, has_next)
+
+    def get_page(self, number):
+        try:
+            return self.page(number)
+        except (PageNotAnInteger, EmptyPage):
+            return self.page(1)
+
+
+def get_page_number(request):
+    try:
+        return int(request.GET.get("page", 1))
+    except ValueError:
+        return 1
+
+
+def paginate(
+    request,
+    object_list,
+    count_mode=COUNT_EXACT,
+    per_page=None,
+    count_cache_seconds=PAGINATION_COUNT_CACHE_SECONDS,
+):
+    """Paginate `object_list` for the page number in the request. Returns the
+    paginator and the page, for the `paginator` and `assets` template context
+    used by partials/pagination.html."""
+    if per_page is None:
+        per_page = settings.PAGINATION_PER_PAGE
+    page_number = get_page_number(request)
+
+    if count_mode == COUNT_NONE:
+        paginator = NextOnlyPaginator(object_list, per_page)
+    else:
+        count_limit = None
+        if count_mode == COUNT_APPROXIMATE:
+            count_limit = max(
+                APPROXIMATE_COUNT_MIN_LIMIT,
+                (page_number + APPROXIMATE_COUNT_PAGES_AHEAD) * per_page,
+            )
+        paginator = CountingPaginator(
+            object_list,
+            per_page,
+            count_limit=count_limit,
+            count_cache_seconds=count_cache_seconds,
+        )
+    return paginator, paginator.get_page(page_number)
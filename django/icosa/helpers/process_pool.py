@@ -0,0 +1,64 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import django
+from django.db import connections
+
+BATCH_SIZE = 500
+
+
+def setup_worker():
+    # Worker processes which weren't forked from a set up parent need Django
+    # set up before they can use storage.
+    django.setup()
+
+
+def call_in_worker(job: Tuple[Callable, Any, Any]) -> Tuple[Any, Any, Optional[str]]:
+    """Call `fn(arg)` for the job `(fn, key, arg)`, returning `(key, result,
+    error)`. Errors are returned rather than raised, so that one bad job
+    doesn't stop the rest of the pool's work."""
+    fn, key, arg = job
+    try:
+        return key, fn(arg), None
+    except Exception as e:
+        return key, None, f"{type(e).__name__}: {e}"
+
+
+def map_in_process_pool(
+    queryset,
+    get_job_arg: Callable[[Any], Any],
+    fn: Callable[[Any], Any],
+    workers: Optional[int] = None,
+    batch_size: int = BATCH_SIZE,
+) -> Iterator[Tuple[List, Dict[Any, Any], Dict[Any, str]]]:
+    """Page through `queryset` in pk order and run `fn` on each object's job
+    across a pool of worker processes.
+
+    `get_job_arg(obj)` runs in this process and returns the argument for
+    `fn`, or None to skip the object. It must be plain data; `fn` must be a
+    module level function, and must not touch the database. Yields
+    `(batch, results, errors)` for each batch, where results and errors are
+    keyed by pk, so that the caller can save the results in this process."""
+    last_pk = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=setup_worker) as executor:
+        while True:
+            batch = list(queryset.filter(pk__gt=last_pk).order_by("pk")[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            jobs = []
+            for obj in batch:
+                arg = get_job_arg(obj)
+                if arg is not None:
+                    jobs.append((fn, obj.pk, arg))
+            # Workers may be forked while the pool starts up; they must not
+            # share our database connections.
+            connections.close_all()
+            results = {}
+            errors = {}
+            for key, result, error in executor.map(call_in_worker, jobs):
+                if error is not None:
+                    errors[key] = error
+                else:
+                    results[key] = result
+            yield batch, results, errors
@@ -0,0 +1,125 @@
+import io
+import logging
+import os
+from typing import Optional
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger("django")
+
+# Derivatives are made at each of these widths which is narrower than the
+# source image, or at the source's width if it is narrower than all of them.
+THUMBNAIL_WIDTHS = [256, 512, 1024]
+
+# Extension, Pillow format, content type and save options for each kind of
+# derivative. WebP is used by our own pages; JPEG is for API and oEmbed
+# consumers which might not support WebP.
+THUMBNAIL_DERIVATIVE_FORMATS = [
+    ("webp", "WEBP", "image/webp", {"quality": 80, "method": 4}),
+    ("jpg", "JPEG", "image/jpeg", {"quality": 82, "optimize": True, "progressive": True}),
+]
+
+
+def get_thumbnail_storage():
+    from icosa.models import Asset
+
+    return Asset._meta.get_field("thumbnail").storage
+
+
+def get_derivative_name(source_name: str, width: int, extension: str) -> str:
+    # Stored next to the source, e.g. 1/2/thumbnail.png -> 1/2/thumbnail-256w.webp
+    stem, _ = os.path.splitext(source_name)
+    return f"{stem}-{width}w.{extension}"
+
+
+def render_thumbnail_derivatives(source_name: str, storage=None) -> dict:
+    """Resize the image at `source_name` to each of THUMBNAIL_WIDTHS, encode
+    each size in each of THUMBNAIL_DERIVATIVE_FORMATS and store the results.
+    Returns the data for Asset.thumbnail_derivatives. This does not touch the
+    database, so can run in a worker process."""
+    if storage is None:
+        storage = get_thumbnail_storage()
+    with storage.open(source_name, "rb") as source_file:
+        with Image.open(source_file) as source_image:
+            source_image.load()
+            image = ImageOps.exif_transpose(source_image)
+    if image.mode not in ["RGB", "RGBA"]:
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+    widths = [x for x in THUMBNAIL_WIDTHS if x < image.width] or [image.width]
+    variants = []
+    for width in widths:
+        height = max(round(image.height * width / image.width), 1)
+        resized = image.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        for extension, pil_format, content_type, options in THUMBNAIL_DERIVATIVE_FORMATS:
+            output_image = resized
+            if pil_format == "JPEG" and resized.mode == "RGBA":
+                opaque_image = Image.new("RGB", resized.size, (255, 255, 255))
+                opaque_image.paste(resized, mask=resized.getchannel("A"))
+                output_image = opaque_image
+            buffer = io.BytesIO()
+            output_image.save(buffer, pil_format, **options)
+            name = storage.save(
+                get_derivative_name(source_name, width, extension),
+                ContentFile(buffer.getvalue()),
+            )
+            variants.append(
+                {
+                    "name": name,
+                    "content_type": content_type,
+                    "width": width,
+                    "height": height,
+                }
+            )
+    return {"source": source_name, "variants": variants}
+
+
+def delete_derivative_files(derivatives: Optional[dict], keep_names=()):
+    if not derivatives:
+        return
+    storage = get_thumbnail_storage()
+    for variant in derivatives.get("variants", []):
+        if variant["name"] not in keep_names:
+            try:
+                storage.delete(variant["name"])
+            except Exception as e:
+                logger.error(e)
+
+
+def save_thumbnail_derivatives(asset_id: int, derivatives: dict):
+    """Point the asset at freshly rendered derivatives, and delete the files
+    of the ones they replace. If the asset's image changed while they were
+    being rendered, they are thrown away instead."""
+    from icosa.models import Asset, bump_landing_page_version
+    from icosa.models.asset import clear_asset_caches
+
+    asset = Asset.objects.filter(pk=asset_id).only("pk", "thumbnail", "preview_image", "thumbnail_derivatives").first()
+    if asset is None or asset.get_thumbnail_source_name() != derivatives["source"]:
+        delete_derivative_files(derivatives)
+        return
+    new_names = {x["name"] for x in derivatives["variants"]}
+    delete_derivative_files(asset.thumbnail_derivatives, keep_names=new_names)
+    Asset.objects.filter(pk=asset_id).update(thumbnail_derivatives=derivatives)
+    clear_asset_caches(asset_id)
+    # Cached landing page grids include each card's srcset.
+    transaction.on_commit(bump_landing_page_version)
+
+
+def make_thumbnail_derivatives(asset):
+    """Render and save derivatives of `asset`'s thumbnail in this process. If
+    the asset no longer has an image, its old derivatives are removed."""
+    from icosa.models import Asset, bump_landing_page_version
+
+    source_name = asset.get_thumbnail_source_name()
+    if source_name is None:
+        if asset.thumbnail_derivatives:
+            delete_derivative_files(asset.thumbnail_derivatives)
+            Asset.objects.filter(pk=asset.pk).update(thumbnail_derivatives=None)
+            asset.clear_asset_caches()
+            transaction.on_commit(bump_landing_page_version)
+        return None
+    derivatives = render_thumbnail_derivatives(source_name)
+    save_thumbnail_derivatives(asset.pk, derivatives)
+    return derivatives
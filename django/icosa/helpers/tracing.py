@@ -0,0 +1,109 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Optional
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("trace", default=None)
+
+
+@dataclass
+class Span:
+    name: str
+    bytes: int = 0
+    files: int = 0
+
+
+class Trace:
+    """Totals of the time, bytes and files spent in each named stage of one
+    piece of work, such as an upload. Spans with the same name are summed, so
+    a stage which runs once per file shows up once. Spans may be recorded
+    from several threads at once."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.end = None
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float, bytes: int = 0, files: int = 0):
+        with self._lock:
+            stage = self.stages.setdefault(name, {"count": 0, "seconds": 0.0, "bytes": 0, "files": 0})
+            stage["count"] += 1
+            stage["seconds"] += seconds
+            stage["bytes"] += bytes
+            stage["files"] += files
+
+    @contextmanager
+    def span(self, name: str, bytes: int = 0, files: int = 0):
+        """Time the enclosed block as stage `name`. Byte and file counts
+        which are only known inside the block can be set on the yielded
+        Span."""
+        span = Span(name, bytes, files)
+        start = time.perf_counter()
+        try:
+            yield span
+        finally:
+            self.add(name, time.perf_counter() - start, span.bytes, span.files)
+
+    def finish(self):
+        self.end = time.perf_counter()
+
+    @property
+    def total_seconds(self) -> float:
+        return (self.end or time.perf_counter()) - self.start
+
+    def get_summary(self) -> dict:
+        """The stages as compact, JSON serialisable data, in the order they
+        started."""
+        with self._lock:
+            return {
+                name: {
+                    "n": stage["count"],
+                    "s": round(stage["seconds"], 4),
+                    "b": stage["bytes"],
+                    "f": stage["files"],
+                }
+                for name, stage in self.stages.items()
+            }
+
+    def __str__(self):
+        stages = ", ".join([f"{name} {x['s']}s" for name, x in self.get_summary().items()])
+        return f"{self.total_seconds:.4f}s ({stages})"
+
+
+def get_current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def use_trace(trace: Optional[Trace]):
+    """Make `trace` the one which `span` records to, in this thread or task
+    and the ones it starts with a copy of its context, e.g. sync_to_async.
+    Plain thread pools don't copy context, so their workers must call this
+    themselves."""
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def span(name: str, bytes: int = 0, files: int = 0):
+    """Time the enclosed block as stage `name` of the current trace, if there
+    is one."""
+    trace = get_current_trace()
+    if trace is None:
+        yield Span(name, bytes, files)
+        return
+    with trace.span(name, bytes, files) as s:
+        yield s
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
@@ -1,7 +1,7 @@
-import io
 import os
 import time
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
 from typing import (
@@ -9,6 +9,11 @@ from typing import (
     Optional,
 )
 
+from asgiref.sync import sync_to_async
+from botocore.exceptions import ClientError
+from botocore.exceptions import ConnectionError as BotoConnectionError
+from botocore.exceptions import HTTPClientError
+from django.conf import settings
 from django.utils import timezone
 from icosa.api.exceptions import ZipException
 from icosa.api.schema import AssetMetaData
@@ -18,19 +23,39 @@ from icosa.helpers.file import (
     ProcessedUpload,
     UploadedFormat,
     add_thumbnail_to_asset,
+    extract_zip_member,
     get_content_type,
+    get_file_sha256,
     validate_file,
     validate_mime,
 )
 from icosa.helpers.logger import icosa_log
+from icosa.helpers.mesh_stats import analyze_asset_meshes
+from icosa.helpers.tracing import Trace, get_current_trace, span, use_trace
+from icosa.helpers.upload_progress import (
+    UPLOAD_STAGE_FINISHING,
+    UPLOAD_STAGE_PROCESSING_FILES,
+    UPLOAD_STAGE_THUMBNAIL,
+    UPLOAD_STAGE_VALIDATING,
+    set_format_progress,
+    set_upload_complete,
+    set_upload_failed,
+    set_upload_progress,
+)
 from icosa.models import (
     ASSET_STATE_COMPLETE,
     ASSET_STATE_UPLOADING,
+    FILENAME_MAX_LENGTH,
     VALID_THUMBNAIL_MIME_TYPES,
     Asset,
     Format,
     Resource,
+    ResourceBlob,
+    UploadSession,
+    UploadTraceLog,
+    get_cloud_media_root,
 )
+from icosa.models.asset import clear_asset_caches
 from ninja import Form
 from ninja.errors import HttpError
 from ninja.files import UploadedFile
@@ -39,6 +64,17 @@ DUMMY_EXTRACT_PATH = "/tmp"
 
 ZIP_MAX_DEPTH = 7
 
+# Sub resource files are pushed to storage by this many threads at once.
+STORAGE_WRITE_WORKERS = 8
+STORAGE_WRITE_ATTEMPTS = 3
+STORAGE_WRITE_BACKOFF_SECONDS = 0.5
+TRANSIENT_STORAGE_ERROR_CODES = [
+    "RequestTimeout",
+    "SlowDown",
+    "Throttling",
+    "ThrottlingException",
+]
+
 SUB_FILE_MAP = {
     "IMAGE": "GLB",
     "BIN": "GLTF",
@@ -92,8 +128,10 @@ def process_files(files: List[UploadedFile], skip_thumbnail=False) -> UploadSet:
             raise HttpError(400, "Uploaded file is not a zip archive.")
         unzip_start = timezone.now()
         total_size_bytes = 0
-        # Read the file as a ZIP file
-        with zipfile.ZipFile(io.BytesIO(file.read())) as zip_file:
+        extracted_bytes = 0
+        # Read the zip straight from the upload, which is on disk for large
+        # files, rather than copying it into memory first.
+        with zipfile.ZipFile(file) as zip_file:
             for i, member in enumerate(zip_file.infolist()):
                 # Protect against unbounded execution time (i.e) stop if it's
                 # taking too long.
@@ -129,36 +167,35 @@ def process_files(files: List[UploadedFile], skip_thumbnail=False) -> UploadSet:
                 if member.is_dir():
                     continue
 
-                # Read the file contents
-                with zip_file.open(member) as extracted_file:
-                    # Create a new UploadedFile object
-                    content = extracted_file.read()
-                    filename = member.filename
-                    processed_file = ProcessedUpload(
-                        file=UploadedFile(
-                            name=filename,
-                            file=io.BytesIO(content),
-                        ),
-                        full_path=filename,
-                    )
-                    if (
-                        not skip_thumbnail
-                        and thumbnail is None
-                        and filename.lower() in ["thumbnail.png", "thumbnail.jpg", "thumbnail.jpeg"]
-                    ):
-                        # Only process one thumbnail file: the first one we
-                        # find. All subsequent files passing this test will not
-                        # be treated as thumbnails.
-                        # NOTE: We cannot know if the first file that passes
-                        # this test is a texture rather than a thumbnail.
-                        # TODO: Perhaps we should warn the user about the above
-                        # note.
-                        if validate_mime(content, VALID_THUMBNAIL_MIME_TYPES):
-                            thumbnail = processed_file
-                            continue
-                        else:
-                            raise HttpError(400, "Thumbnail must be png or jpg.")
-                    unzipped_files.append(processed_file)
+                # Extract the file contents. The header's file_size can't be
+                # trusted, so the extracted size is checked as well.
+                extracted_file = extract_zip_member(zip_file, member, MAX_UNZIP_BYTES - extracted_bytes)
+                extracted_bytes += extracted_file.size
+                filename = member.filename
+                processed_file = ProcessedUpload(
+                    file=extracted_file,
+                    full_path=filename,
+                )
+                if (
+                    not skip_thumbnail
+                    and thumbnail is None
+                    and filename.lower() in ["thumbnail.png", "thumbnail.jpg", "thumbnail.jpeg"]
+                ):
+                    # Only process one thumbnail file: the first one we
+                    # find. All subsequent files passing this test will not
+                    # be treated as thumbnails.
+                    # NOTE: We cannot know if the first file that passes
+                    # this test is a texture rather than a thumbnail.
+                    # TODO: Perhaps we should warn the user about the above
+                    # note.
+                    magic_bytes = extracted_file.read(2048)
+                    extracted_file.seek(0)
+                    if validate_mime(magic_bytes, VALID_THUMBNAIL_MIME_TYPES):
+                        thumbnail = processed_file
+                        continue
+                    else:
+                        raise HttpError(400, "Thumbnail must be png or jpg.")
+                unzipped_files.append(processed_file)
     return UploadSet(
         files=unzipped_files,
         thumbnail=thumbnail,
@@ -170,20 +207,56 @@ async def upload_api_asset(
     data: Optional[Form[AssetMetaData]] = None,
     files: Optional[List[UploadedFile]] = None,
     skip_thumbnail: bool = False,
+    source: str = UploadTraceLog.SOURCE_API,
 ):
-    total_start = time.time()  # Logging
+    """Process an upload, recording how long each stage took in an
+    UploadTraceLog whether or not it succeeds. Progress is reported as it goes;
+    see helpers/upload_progress.py."""
+    trace = Trace()
+    succeeded = False
+    try:
+        with use_trace(trace):
+            asset = await process_api_upload(asset, data, files, skip_thumbnail)
+        succeeded = True
+        return asset
+    except Exception as e:
+        set_upload_failed(asset.url, e)
+        raise
+    finally:
+        trace.finish()
+        summary = trace.get_summary()
+        icosa_log(f"Finish uploading asset {asset.url} in {trace}.")  # Logging
+        # The trace is only diagnostic; failing to record it must neither
+        # fail the upload nor hide the error which did.
+        try:
+            await UploadTraceLog.objects.acreate(
+                asset_id=asset.pk,
+                source=source,
+                succeeded=succeeded,
+                total_seconds=trace.total_seconds,
+                total_bytes=summary.get("process_files", {}).get("b", 0),
+                file_count=summary.get("process_files", {}).get("f", 0),
+                stages=summary,
+            )
+        except Exception as e:
+            icosa_log(f"Could not record upload trace for asset {asset.url}: {e}")  # Logging
+
 
+async def process_api_upload(
+    asset: Asset,
+    data: Optional[Form[AssetMetaData]] = None,
+    files: Optional[List[UploadedFile]] = None,
+    skip_thumbnail: bool = False,
+):
     asset.state = ASSET_STATE_UPLOADING
     await asset.asave()
     if files is None:
         raise HttpError(400, "Include files for upload.")
+    set_upload_progress(asset.url, UPLOAD_STAGE_PROCESSING_FILES)
     try:
-        process_files_start = time.time()  # Logging
-        upload_set = process_files(files, skip_thumbnail)  # Logging
-        process_files_end = time.time()
-        icosa_log(
-            f"Finish processing files for asset {asset.url} in {process_files_end - process_files_start} seconds."
-        )  # Logging
+        with span("process_files", bytes=sum([x.size or 0 for x in files])) as s:
+            upload_set = process_files(files, skip_thumbnail)
+            s.files = len(upload_set.files)
     except (ZipException, HttpError):
         raise HttpError(400, "Invalid zip archive.")
 
@@ -196,19 +269,21 @@ async def upload_api_asset(
     }
     asset_name = "Untitled Asset"
 
-    for processed_file in upload_set.files:
-        if processed_file.file.name is None:
-            continue
-        splitext = os.path.splitext(processed_file.file.name)
-        extension = splitext[1].lower().replace(".", "")
-        upload_details = validate_file(processed_file, extension)
-        if upload_details is not None:
-            if upload_details.mainfile is True:
-                main_files.append(upload_details)
-                asset_name = splitext[0]
-            else:
-                parent_resource_type = SUB_FILE_MAP[upload_details.filetype]
-                sub_files[parent_resource_type].append(upload_details)
+    set_upload_progress(asset.url, UPLOAD_STAGE_VALIDATING)
+    with span("validate", files=len(upload_set.files)):
+        for processed_file in upload_set.files:
+            if processed_file.file.name is None:
+                continue
+            splitext = os.path.splitext(processed_file.file.name)
+            extension = splitext[1].lower().replace(".", "")
+            upload_details = validate_file(processed_file, extension)
+            if upload_details is not None:
+                if upload_details.mainfile is True:
+                    main_files.append(upload_details)
+                    asset_name = splitext[0]
+                else:
+                    parent_resource_type = SUB_FILE_MAP[upload_details.filetype]
+                    sub_files[parent_resource_type].append(upload_details)
 
     # Begin upload process.
 
@@ -225,7 +300,8 @@ async def upload_api_asset(
             break
 
     format_overrides = get_format_overrides(data)
-    for mainfile in main_files:
+    for i, mainfile in enumerate(main_files):
+        set_format_progress(asset.url, i, len(main_files))
         type = mainfile.filetype
         if type in ["GLTF1", "GLTF2"]:
             sub_files_list = sub_files["GLTF"] + sub_files["GLB"]
@@ -249,36 +325,71 @@ async def upload_api_asset(
         )
 
     if upload_set.thumbnail:
-        await add_thumbnail_to_asset(upload_set.thumbnail, asset)
+        set_upload_progress(asset.url, UPLOAD_STAGE_THUMBNAIL)
+        with span("thumbnail", bytes=upload_set.thumbnail.size or 0, files=1):
+            await add_thumbnail_to_asset(upload_set.thumbnail, asset)
 
-    await asset.asave()  # Denorm asset so far and save formats
+    set_upload_progress(asset.url, UPLOAD_STAGE_FINISHING)
+    with span("denorm_save"):
+        await asset.asave()  # Denorm asset so far and save formats
 
     # Apply the one triangle count to all formats and resources.
     if data is not None:
-        formats = asset.format_set.all()
-        async for fmt in formats:
-            fmt.triangle_count = data.triangleCount
-            await fmt.asave()
+        with span("triangle_counts"):
+            formats = asset.format_set.all()
+            async for fmt in formats:
+                fmt.triangle_count = data.triangleCount
+                await fmt.asave()
 
         asset.remix_ids = getattr(data, "remixIds", None)
 
-    # TODO(james): We should move this blocks-related code into the flagship instance or trigger it some other way.
-    if asset.has_blocks:
-        preferred_format = await asset.format_set.select_related("root_resource").filter(format_type="OBJ").afirst()
-        if preferred_format is not None and preferred_format.root_resource and preferred_format.root_resource.file:
-            preferred_format.is_preferred_for_gallery_viewer = True
-            await preferred_format.asave()
-    else:
-        await asset.assign_preferred_viewer_format()
-    asset.state = ASSET_STATE_COMPLETE
-    await asset.asave()
+    with span("preferred_format"):
+        # TODO(james): We should move this blocks-related code into the flagship instance or trigger it some other way.
+        if asset.has_blocks:
+            preferred_format = (
+                await asset.format_set.select_related("root_resource").filter(format_type="OBJ").afirst()
+            )
+            if preferred_format is not None and preferred_format.root_resource and preferred_format.root_resource.file:
+                preferred_format.is_preferred_for_gallery_viewer = True
+                await preferred_format.asave()
+        else:
+            await asset.assign_preferred_viewer_format()
+    with span("complete_save"):
+        asset.state = ASSET_STATE_COMPLETE
+        await asset.asave()
+    set_upload_complete(asset.url)
 
-    total_end = time.time()  # Logging
-    icosa_log(f"Finish uploading asset {asset.url} in {total_end - total_start} seconds.")  # Logging
+    if getattr(settings, "ENABLE_TASK_QUEUE", True) is True:
+        from icosa.tasks import queue_analyze_asset_meshes
+
+        queue_analyze_asset_meshes(asset.id)
+    else:
+        with span("mesh_stats"):
+            await sync_to_async(analyze_asset_meshes)(asset)
 
     return asset
 
 
+async def upload_session_asset(
+    asset: Asset,
+    data: Optional[Form[AssetMetaData]],
+    upload_session: UploadSession,
+):
+    """Run upload_api_asset on the file assembled by a finalized resumable
+    upload, then remove the file."""
+    try:
+        with open(upload_session.path, "rb") as part_file:
+            file = UploadedFile(
+                part_file,
+                name=upload_session.filename,
+                content_type=get_content_type(upload_session.filename),
+                size=upload_session.size,
+            )
+            return await upload_api_asset(asset, data, [file], source=UploadTraceLog.SOURCE_UPLOAD_SESSION)
+    finally:
+        upload_session.delete_file()
+
+
 def get_format_overrides(data: Optional[AssetMetaData]):
     overrides = {}
     if data is not None and data.formatOverride is not None:
@@ -312,40 +423,130 @@ async def make_formats(mainfile, sub_files: List[UploadedFormat], asset, role, f
     }
     format = await Format.objects.acreate(**format_data)
 
-    file_start = time.time()  # Logging
-
-    root_resource_data = {
-        "file": file,
-        "asset": asset,
-        "format": format,
-        "contenttype": get_content_type(name),
-    }
-    root_resource = await Resource.objects.acreate(**root_resource_data)
-    await format.aadd_root_resource(root_resource)
-    await format.asave()
-
-    file_end = time.time()  # Logging
-    icosa_log(
-        f"Finish processing file {file.name} for asset {asset.url} in {file_end - file_start} seconds."
-    )  # Logging
-
-    for subfile in sub_files:
-        file_start = time.time()  # Logging
-
-        sub_resource_data = {
-            "uploaded_file_path": subfile.full_path,
-            "format": format,
+    with span("store_root_resource", bytes=file.size or 0, files=1):
+        root_resource_data = {
+            "file": file,
             "asset": asset,
-            "contenttype": get_content_type(subfile.file.name),
+            "format": format,
+            "contenttype": get_content_type(name),
         }
-        resource = await Resource.objects.acreate(**sub_resource_data)
-        resource.file = subfile.file
-        await resource.asave()
-
-        file_end = time.time()  # Logging
-        icosa_log(
-            f"Finish processing file {subfile.file.name} for asset {asset.url} in {file_end - file_start} seconds."
-        )  # Logging
+        if not sub_files:
+            # Nothing refers to this file by a relative path, so it can be
+            # stored once for everyone who uploads the same bytes.
+            blob = await sync_to_async(store_blob)(file, f"model.{name.split('.')[-1]}", asset.url)
+            root_resource_data["file"] = blob.file_name
+            root_resource_data["blob"] = blob
+        root_resource = await Resource.objects.acreate(**root_resource_data)
+        await format.aadd_root_resource(root_resource)
+        await format.asave()
+
+    if sub_files:
+        with span(
+            "store_sub_resources",
+            bytes=sum([x.file.size or 0 for x in sub_files]),
+            files=len(sub_files),
+        ):
+            await sync_to_async(store_sub_resources)(sub_files, asset, format, root_resource)
+
+
+def is_transient_storage_error(e: Exception) -> bool:
+    if isinstance(e, ClientError):
+        status = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+        code = e.response.get("Error", {}).get("Code", "")
+        return status >= 500 or code in TRANSIENT_STORAGE_ERROR_CODES
+    # Only network failures are worth retrying. Other OSErrors, such as a
+    # missing directory or bad permissions, would fail again.
+    # HTTPClientError covers botocore's read timeouts and dropped connections.
+    return isinstance(e, (ConnectionError, TimeoutError, BotoConnectionError, HTTPClientError))
+
+
+def save_to_storage(name: str, file: UploadedFile, asset_url: str) -> str:
+    """Save `file` to the default storage as `name`, retrying transient errors
+    with exponential backoff. Returns the name the storage used."""
+    storage = Resource._meta.get_field("file").storage
+    with span("storage_write", bytes=file.size or 0, files=1):
+        for attempt in range(1, STORAGE_WRITE_ATTEMPTS + 1):
+            try:
+                file.seek(0)
+                stored_name = storage.save(name, file, max_length=FILENAME_MAX_LENGTH)
+                break
+            except Exception as e:
+                if attempt == STORAGE_WRITE_ATTEMPTS or not is_transient_storage_error(e):
+                    raise
+                icosa_log(f"Retrying storage write of {name} for asset {asset_url} after error: {e}")  # Logging
+                with span("storage_retry_wait"):
+                    time.sleep(STORAGE_WRITE_BACKOFF_SECONDS * 2 ** (attempt - 1))
+    return stored_name
+
+
+def store_blob(file: UploadedFile, name: str, asset_url: str) -> ResourceBlob:
+    """Return a referenced ResourceBlob with `file`'s contents, storing the
+    file under its sha256 as `name` if no blob has those contents yet."""
+    with span("hash", bytes=file.size or 0, files=1):
+        sha256 = get_file_sha256(file)
+    blob = ResourceBlob.objects.filter(sha256=sha256).first()
+    if blob is not None and blob.acquire():
+        icosa_log(f"Reusing stored file {blob.file_name} for asset {asset_url}.")  # Logging
+        return blob
+
+    stored_name = save_to_storage(f"{get_cloud_media_root()}blobs/{sha256[:2]}/{sha256}/{name}", file, asset_url)
+    blob, created = ResourceBlob.objects.get_or_create(
+        sha256=sha256,
+        defaults={
+            "file_name": stored_name,
+            "size": file.size,
+            "ref_count": 1,
+        },
+    )
+    if not created:
+        # The same file was stored by another upload in the meantime.
+        if blob.file_name != stored_name:
+            Resource._meta.get_field("file").storage.delete(stored_name)
+        blob.acquire()
+    return blob
+
+
+def store_sub_resources(
+    sub_files: List[UploadedFormat],
+    asset: Asset,
+    format: Format,
+    root_resource: Resource,
+) -> List[Resource]:
+    """Push the files for a format's sub resources to storage concurrently,
+    then create all their Resource rows in one query."""
+    file_field = Resource._meta.get_field("file")
+    resources = [
+        Resource(
+            uploaded_file_path=subfile.full_path,
+            format=format,
+            asset=asset,
+            contenttype=get_content_type(subfile.file.name),
+        )
+        for subfile in sub_files
+    ]
+    # Work out the storage names up front; upload_to needs the asset's owner,
+    # which should only be loaded once and not from the worker threads.
+    names = [
+        file_field.generate_filename(resource, subfile.file.name) for resource, subfile in zip(resources, sub_files)
+    ]
+
+    trace = get_current_trace()
+
+    def save(name, file):
+        # Pool threads don't inherit the caller's trace.
+        with use_trace(trace):
+            return save_to_storage(name, file, asset.url)
+
+    with ThreadPoolExecutor(max_workers=STORAGE_WRITE_WORKERS) as executor:
+        stored_names = list(executor.map(save, names, [subfile.file for subfile in sub_files]))
+
+    for resource, stored_name in zip(resources, stored_names):
+        resource.file = stored_name
+        # bulk_create skips Resource.save, which would normally do this.
+        resource.denorm_paths(root_resource.base_path)
+    Resource.objects.bulk_create(resources)
+    clear_asset_caches(asset.id)
+    return resources
 
 
 def get_role(
@@ -0,0 +1,122 @@
+import time
+from typing import Optional
+
+from django.core.cache import cache
+from icosa.api.exceptions import ZipException
+from icosa.models import (
+    ASSET_STATE_COMPLETE,
+    ASSET_STATE_FAILED,
+    ASSET_STATE_UPLOADING,
+)
+from ninja.errors import HttpError
+
+# Progress is kept in the cache, which is Redis in production, so that it can
+# be polled often without touching the database. Each entry records the id of
+# the user who uploaded, and is only shown to them.
+UPLOAD_PROGRESS_TIMEOUT = 60 * 60 * 24
+
+UPLOAD_STAGE_QUEUED = "queued"
+UPLOAD_STAGE_PROCESSING_FILES = "processing_files"
+UPLOAD_STAGE_VALIDATING = "validating"
+UPLOAD_STAGE_STORING_FORMATS = "storing_formats"
+UPLOAD_STAGE_THUMBNAIL = "thumbnail"
+UPLOAD_STAGE_FINISHING = "finishing"
+UPLOAD_STAGE_COMPLETE = "complete"
+UPLOAD_STAGE_FAILED = "failed"
+
+# Percentage complete at the start of each stage. Storing formats is reported
+# per format between its start and the next stage's.
+UPLOAD_STAGE_PERCENTS = {
+    UPLOAD_STAGE_QUEUED: 0,
+    UPLOAD_STAGE_PROCESSING_FILES: 5,
+    UPLOAD_STAGE_VALIDATING: 20,
+    UPLOAD_STAGE_STORING_FORMATS: 25,
+    UPLOAD_STAGE_THUMBNAIL: 85,
+    UPLOAD_STAGE_FINISHING: 90,
+    UPLOAD_STAGE_COMPLETE: 100,
+}
+
+# Only these errors' messages are meant for users. Others may contain
+# internals, so are reported by type alone.
+USER_FACING_ERRORS = (HttpError, ZipException)
+GENERIC_ERROR_MESSAGE = "The upload could not be processed."
+
+
+def get_upload_progress_cache_key(asset_url):
+    return f"upload_progress-{asset_url}"
+
+
+def get_upload_progress(asset_url: str) -> Optional[dict]:
+    return cache.get(get_upload_progress_cache_key(asset_url))
+
+
+def get_upload_progress_for_user(asset_url: str, user) -> Optional[dict]:
+    """The upload's progress, if `user` is the one who started it."""
+    progress = get_upload_progress(asset_url)
+    if progress is None or user is None or not user.is_authenticated:
+        return None
+    if progress.get("user_id") is None or progress["user_id"] != user.pk:
+        return None
+    return progress
+
+
+def set_upload_progress(
+    asset_url: str,
+    stage: str,
+    percent: Optional[int] = None,
+    state: str = ASSET_STATE_UPLOADING,
+    error: Optional[str] = None,
+    error_type: Optional[str] = None,
+    user_id: Optional[int] = None,
+):
+    """Record the upload's progress. `user_id` is given when the upload
+    starts and kept by later updates."""
+    if percent is None:
+        percent = UPLOAD_STAGE_PERCENTS.get(stage, 0)
+    if user_id is None:
+        user_id = (get_upload_progress(asset_url) or {}).get("user_id")
+    cache.set(
+        get_upload_progress_cache_key(asset_url),
+        {
+            "user_id": user_id,
+            "state": state,
+            "stage": stage,
+            "percent": percent,
+            "error": error,
+            "error_type": error_type,
+            "update_time": time.time(),
+        },
+        UPLOAD_PROGRESS_TIMEOUT,
+    )
+
+
+def set_format_progress(asset_url: str, done: int, total: int):
+    """Report that `done` of `total` formats have been stored."""
+    start = UPLOAD_STAGE_PERCENTS[UPLOAD_STAGE_STORING_FORMATS]
+    end = UPLOAD_STAGE_PERCENTS[UPLOAD_STAGE_THUMBNAIL]
+    percent = start + (end - start) * done // max(total, 1)
+    set_upload_progress(asset_url, UPLOAD_STAGE_STORING_FORMATS, percent)
+
+
+def set_upload_complete(asset_url: str):
+    set_upload_progress(asset_url, UPLOAD_STAGE_COMPLETE, state=ASSET_STATE_COMPLETE)
+
+
+def set_upload_failed(asset_url: str, exc: Optional[BaseException] = None):
+    """Mark the upload failed, keeping the percentage it reached."""
+    progress = get_upload_progress(asset_url) or {}
+    if isinstance(exc, HttpError):
+        error = exc.message
+    elif isinstance(exc, USER_FACING_ERRORS):
+        error = str(exc)
+    else:
+        error = GENERIC_ERROR_MESSAGE
+    set_upload_progress(
+        asset_url,
+        UPLOAD_STAGE_FAILED,
+        percent=progress.get("percent", 0),
+        state=ASSET_STATE_FAILED,
+        error=error,
+        error_type=None if exc is None else type(exc).__name__,
+        user_id=progress.get("user_id"),
+    )
@@ -1,11 +1,10 @@
 import io
 import os
-import subprocess
 import zipfile
 from pathlib import Path
 from typing import List, Optional
 
-from django.conf import settings
+from asgiref.sync import sync_to_async
 from django.utils import timezone
 from icosa.api.exceptions import ZipException
 from icosa.helpers.file import (
@@ -13,9 +12,16 @@ from icosa.helpers.file import (
     MAX_UNZIP_SECONDS,
     UploadedFormat,
     add_thumbnail_to_asset,
+    extract_zip_member,
     get_content_type,
     validate_file,
 )
+from icosa.helpers.gltf_conversion import (
+    GltfConversionError,
+    convert_gltf_to_glb,
+    get_conversion_storage,
+)
+from icosa.helpers.logger import icosa_log
 from icosa.helpers.upload import TYPE_ROLE_MAP
 from icosa.models import (
     ASSET_STATE_COMPLETE,
@@ -26,8 +32,6 @@ from icosa.models import (
 from ninja import File
 from ninja.files import UploadedFile
 
-CONVERTER_EXE = "/node_modules/gltf-pipeline/bin/gltf-pipeline.js"
-
 SUB_FILE_MAP = {
     "IMAGE": "GLB",
     "BIN": "GLTF",
@@ -81,46 +85,20 @@ def write_files_to_convert(in_file, asset_dir):
 
 
 def convert_gltf(gltf_file, bin_file, asset_dir):
+    """Convert the written glTF 1 file to GLB. Returns the storage name of the
+    GLB, or None if there was nothing to convert or conversion failed, in
+    which case the upload carries on with the glTF 1 format."""
     if gltf_file is not None and bin_file is not None:
-        Path(os.path.join(asset_dir, "converted")).mkdir(
-            parents=True,
-            exist_ok=True,
-        )
-        name, extension = os.path.splitext(gltf_file[1])
-        out_path = os.path.join(
-            asset_dir,
-            "converted",
-            f"{name}.glb",
-        )
-        data = Path(gltf_file[0]).read_text()
-        shader_dummy_path = os.path.join(
-            settings.STATIC_ROOT,
-            "shader_dummy",
-        )
-        Path(gltf_file[0]).write_text(
-            data.replace(
-                "https://vr.google.com/shaders/w/",
-                shader_dummy_path,
-            )
-        )
-        subprocess.run(
-            [
-                "node",
-                CONVERTER_EXE,
-                "-i",
-                gltf_file[0],
-                "-o",
-                out_path,
-                "--keepUnusedElements",
-                "--binary",
-            ]
-        )
-        return out_path
+        try:
+            return convert_gltf_to_glb(gltf_file[0])
+        except GltfConversionError as e:
+            icosa_log(f"Could not convert {gltf_file[0]}: {e}")  # Logging
+            return None
     else:
         return None
 
 
-def clean_up_conversion(gltf_file, bin_file, gltf_path, asset_dir):
+def clean_up_conversion(gltf_file, bin_file, asset_dir):
     # Clean up temp files.
     # NOTE(james): missing_ok might squash genuine errors where the file should
     # exist.
@@ -128,12 +106,6 @@ def clean_up_conversion(gltf_file, bin_file, gltf_path, asset_dir):
         Path.unlink(gltf_file[0], missing_ok=True)
     if bin_file is not None:
         Path.unlink(bin_file[0], missing_ok=True)
-    if gltf_path is not None:
-        Path.unlink(gltf_path, missing_ok=True)
-    try:
-        Path.rmdir(os.path.join(asset_dir, "converted"))
-    except FileNotFoundError:
-        pass
     try:
         Path.rmdir(os.path.join(asset_dir))
     except FileNotFoundError:
@@ -151,8 +123,10 @@ def process_files(files: List[UploadedFile]) -> List[UploadedFile]:
 
         unzip_start = timezone.now()
         total_size_bytes = 0
-        # Read the file as a ZIP file
-        with zipfile.ZipFile(io.BytesIO(file.read())) as zip_file:
+        extracted_bytes = 0
+        # Read the zip straight from the upload, which is on disk for large
+        # files, rather than copying it into memory first.
+        with zipfile.ZipFile(file) as zip_file:
             # Iterate over each file in the ZIP
             for i, zip_info in enumerate(zip_file.infolist()):
                 unzip_elapsed = timezone.now() - unzip_start
@@ -171,17 +145,12 @@ def process_files(files: List[UploadedFile]) -> List[UploadedFile]:
                 total_size_bytes += zip_info.file_size
                 if total_size_bytes > MAX_UNZIP_BYTES:
                     raise ZipException(f"Uncompressed zip will be larger than {MAX_UNZIP_BYTES}")
-                # Read the file contents
-                with zip_file.open(zip_info) as extracted_file:
-                    # Create a new UploadedFile object
-                    content = extracted_file.read()
-                    filename = zip_info.filename
-                    processed_file = UploadedFile(
-                        name=filename,
-                        file=io.BytesIO(content),
-                    )
-                    # Add the file to the list of unzipped files to process.
-                    unzipped_files.append(processed_file)
+                # Extract the file contents. The header's file_size can't be
+                # trusted, so the extracted size is checked as well.
+                processed_file = extract_zip_member(zip_file, zip_info, MAX_UNZIP_BYTES - extracted_bytes)
+                extracted_bytes += processed_file.size
+                # Add the file to the list of unzipped files to process.
+                unzipped_files.append(processed_file)
     return unzipped_files
 
 
@@ -190,10 +159,10 @@ async def make_formats(mainfile, sub_files, asset, gltf_to_convert, role=None):
     format_type = mainfile.filetype
     name = mainfile.file.name
     file = mainfile.file
-    if format_type == "GLTF1" and gltf_to_convert is not None and os.path.exists(gltf_to_convert):
+    if format_type == "GLTF1" and gltf_to_convert is not None:
         format_type = "GLB"
         name = f"{os.path.splitext(name)[0]}.glb"
-        with open(gltf_to_convert, "rb") as f:
+        with get_conversion_storage().open(gltf_to_convert, "rb") as f:
             file = UploadedFile(
                 name=name,
                 file=io.BytesIO(f.read()),
@@ -292,7 +261,7 @@ async def upload(
 
     # Currently a no-op, will return None. See where we assign gltf_to_convert
     # and bin_to_convert.
-    converted_gltf_path = convert_gltf(
+    converted_gltf_path = await sync_to_async(convert_gltf)(
         gltf_to_convert,
         bin_to_convert,
         asset_dir,
@@ -326,7 +295,6 @@ async def upload(
     clean_up_conversion(
         gltf_to_convert,
         bin_to_convert,
-        converted_gltf_path,
         asset_dir,
     )
 
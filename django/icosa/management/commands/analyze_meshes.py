@@ -0,0 +1,69 @@
+import os
+
+from django.core.management.base import BaseCommand
+from icosa.helpers.mesh_stats import (
+    analyze_format_files,
+    get_format_files,
+    save_format_stats,
+)
+from icosa.helpers.process_pool import map_in_process_pool
+from icosa.models import Format
+
+
+class Command(BaseCommand):
+    help = """
+    Reads triangle and vertex counts, bounds and texture memory from the files
+    of existing formats, across a pool of worker processes, and saves them to
+    the formats and their assets. New uploads are analysed after upload.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--missing-only",
+            action="store_true",
+            help="Only process formats which have not been analysed yet.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="Number of worker processes.",
+        )
+        parser.add_argument(
+            "--verbose",
+            action="store_true",
+            help="Print logs to stdout",
+        )
+
+    def handle(self, *args, **options):
+        verbose = bool(options["verbose"])
+        formats = (
+            Format.objects.select_related("root_resource")
+            .prefetch_related("resource_set")
+            .filter(root_resource__isnull=False)
+            .order_by("pk")
+        )
+        if options["missing_only"]:
+            formats = formats.filter(mesh_stats_time__isnull=True)
+
+        processed = 0
+        analysed = 0
+        failed = 0
+        for batch, results, errors in map_in_process_pool(
+            formats,
+            get_format_files,
+            analyze_format_files,
+            workers=options["workers"],
+        ):
+            processed += len(batch)
+            failed += len(errors)
+            if verbose:
+                for format_id, error in errors.items():
+                    print(f"Format {format_id}: {error}")
+            if results:
+                save_format_stats(results)
+            analysed += len(results)
+            if verbose:
+                print(f"Processed {processed} formats", end="\r")
+
+        print(f"Analysed {analysed} of {processed} formats. {failed} could not be read.")
@@ -0,0 +1,101 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from icosa.models import Asset, Format
+from icosa.models.asset import (
+    PREFERRED_VIEWER_FORMAT_TYPES,
+    get_download_manifest_cache_key,
+    get_view_model_cache_key,
+    preferred_viewer_format_rank,
+)
+
+BATCH_SIZE = 5000
+
+
+def assign_preferred_formats(asset_ids) -> int:
+    """Mark the best viewer format for each asset as preferred, and all its
+    other formats as not preferred. Two UPDATE statements regardless of the
+    number of assets. The assets' cached view models and download manifests
+    are cleared once the updates commit."""
+    best_format = (
+        Format.objects.filter(
+            asset=OuterRef("pk"),
+            root_resource__isnull=False,
+            format_type__in=PREFERRED_VIEWER_FORMAT_TYPES,
+        )
+        .annotate(viewer_rank=preferred_viewer_format_rank())
+        .order_by("viewer_rank", "-pk")
+        .values("pk")[:1]
+    )
+    best_format_ids = (
+        Asset.objects.filter(pk__in=asset_ids)
+        .annotate(best_format_id=Subquery(best_format))
+        .filter(best_format_id__isnull=False)
+        .values("best_format_id")
+    )
+    with transaction.atomic():
+        Format.objects.filter(
+            asset_id__in=asset_ids,
+            is_preferred_for_gallery_viewer=True,
+        ).update(is_preferred_for_gallery_viewer=False)
+        updated = Format.objects.filter(pk__in=best_format_ids).update(is_preferred_for_gallery_viewer=True)
+        transaction.on_commit(lambda: clear_assets_caches(asset_ids))
+    return updated
+
+
+def clear_assets_caches(asset_ids):
+    """As clear_asset_caches, for many assets in one round trip."""
+    keys = []
+    for asset_id in asset_ids:
+        keys += [get_download_manifest_cache_key(asset_id), get_view_model_cache_key(asset_id)]
+    cache.delete_many(keys)
+
+
+class Command(BaseCommand):
+    help = """
+    Reassigns the preferred viewer format for assets in bulk, using the same
+    priority order as the upload process. Blocks assets are skipped unless
+    specified by --ids, because uploads prefer their OBJ format instead.
+
+    Asset denorm fields (e.g. is_viewer_compatible) are not updated; run
+    save_all_assets afterwards if needed.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--ids",
+            nargs="*",
+            help="Space-separated list of asset urls to process.",
+            default=[],
+            type=str,
+        )
+        parser.add_argument(
+            "--missing-only",
+            action="store_true",
+            help="Only process assets with no preferred viewer format.",
+        )
+        parser.add_argument(
+            "--verbose",
+            action="store_true",
+            help="Print logs to stdout",
+        )
+
+    def handle(self, *args, **options):
+        verbose = bool(options["verbose"])
+        if options["ids"]:
+            assets = Asset.objects.filter(url__in=options["ids"])
+        else:
+            assets = Asset.objects.exclude(has_blocks=True)
+        if options["missing_only"]:
+            assets = assets.exclude(format__is_preferred_for_gallery_viewer=True)
+
+        asset_ids = list(assets.order_by("pk").values_list("pk", flat=True).distinct())
+        updated = 0
+        for i in range(0, len(asset_ids), BATCH_SIZE):
+            batch = asset_ids[i : i + BATCH_SIZE]
+            updated += assign_preferred_formats(batch)
+            if verbose:
+                print(f"Processed {i + len(batch)} of {len(asset_ids)} assets", end="\r")
+
+        print(f"Assigned preferred formats for {updated} of {len(asset_ids)} assets.")
@@ -0,0 +1,150 @@
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
+
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from icosa.helpers.file import get_content_type
+from icosa.helpers.gltf_conversion import (
+    CONVERTED_GLB_ROLE,
+    GltfConversionError,
+    convert_gltf_to_glb,
+    get_conversion_storage,
+    get_converter_missing_reason,
+)
+from icosa.models import Format, Resource
+
+BATCH_SIZE = 100
+
+
+def download_format(format, directory):
+    """Write the format's root and sub resources into `directory`, laid out
+    as the glTF expects. Returns the path of the glTF file."""
+    storage = get_conversion_storage()
+    root_name = os.path.basename(format.root_resource.file.name)
+    files = [(root_name, format.root_resource.file.name)]
+    for resource in format.resource_set.all():
+        if not resource.file or not resource.relative_path:
+            continue
+        relative_path = PurePosixPath(resource.relative_path)
+        if relative_path.is_absolute() or ".." in relative_path.parts:
+            continue
+        files.append((relative_path.as_posix(), resource.file.name))
+    for relative_path, file_name in files:
+        path = Path(directory, relative_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with storage.open(file_name, "rb") as f_in, open(path, "wb") as f_out:
+            for chunk in f_in.chunks():
+                f_out.write(chunk)
+    return os.path.join(directory, root_name)
+
+
+def convert_format(format):
+    """Download and convert one format, returning (format, storage name of
+    the GLB, error). Runs in a thread, so doesn't write to the database."""
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            gltf_path = download_format(format, directory)
+            return format, convert_gltf_to_glb(gltf_path), None
+    except (GltfConversionError, OSError) as e:
+        return format, None, str(e)
+    finally:
+        connections.close_all()
+
+
+def create_converted_format(format, glb_name):
+    storage = get_conversion_storage()
+    name = f"{os.path.splitext(os.path.basename(format.root_resource.file.name))[0]}.glb"
+    with storage.open(glb_name, "rb") as f:
+        data = f.read()
+    with transaction.atomic():
+        converted_format = Format.objects.create(
+            format_type="GLB",
+            asset=format.asset,
+            role=CONVERTED_GLB_ROLE,
+        )
+        root_resource = Resource.objects.create(
+            asset=format.asset,
+            format=converted_format,
+            contenttype=get_content_type(name),
+        )
+        converted_format.add_root_resource(root_resource)
+        converted_format.save()
+        root_resource.file.save(name, ContentFile(data))
+        # Denorm the asset's format types.
+        format.asset.save(bypass_moderation_logging=True)
+
+
+class Command(BaseCommand):
+    help = """
+    Converts each asset's first glTF 1 format to GLB with gltf-pipeline, and
+    adds the result to the asset as a new format with the role
+    CONVERTED_GLB_FORMAT. Assets which already have one are skipped.
+    Conversions are cached by input, so re-running after a failure is cheap.
+    Needs node and gltf-pipeline, which the Docker image does not install
+    unless they are uncommented in the Dockerfile.
+    Run analyze_meshes --missing-only afterwards to fill in the new formats'
+    stats.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Number of formats to download and convert at once. Node processes are further limited by "
+            "GLTF_CONVERSION_WORKERS.",
+        )
+        parser.add_argument(
+            "--verbose",
+            action="store_true",
+            help="Print logs to stdout",
+        )
+
+    def handle(self, *args, **options):
+        missing_reason = get_converter_missing_reason()
+        if missing_reason is not None:
+            raise CommandError(f"Can't convert glTF files: {missing_reason}")
+
+        verbose = bool(options["verbose"])
+        converted_assets = Format.objects.filter(role=CONVERTED_GLB_ROLE).values("asset_id")
+        formats = (
+            Format.objects.select_related("asset", "root_resource")
+            .prefetch_related("resource_set")
+            .filter(format_type="GLTF1", root_resource__file__isnull=False)
+            .exclude(root_resource__file="")
+            .exclude(asset_id__in=converted_assets)
+            .order_by("pk")
+        )
+
+        processed = 0
+        converted = 0
+        failed = 0
+        seen_asset_ids = set()
+        last_pk = 0
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            while True:
+                batch = list(formats.filter(pk__gt=last_pk)[:BATCH_SIZE])
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+                jobs = []
+                for format in batch:
+                    if format.asset_id not in seen_asset_ids:
+                        seen_asset_ids.add(format.asset_id)
+                        jobs.append(format)
+                processed += len(jobs)
+                for format, glb_name, error in executor.map(convert_format, jobs):
+                    if error is not None:
+                        failed += 1
+                        if verbose:
+                            print(f"Format {format.pk}: {error}")
+                        continue
+                    create_converted_format(format, glb_name)
+                    converted += 1
+                    if verbose:
+                        print(f"Converted format {format.pk} of asset {format.asset.url}")
+
+        print(f"Converted {converted} of {processed} assets' glTF 1 formats. {failed} failed.")
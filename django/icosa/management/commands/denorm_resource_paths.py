@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from icosa.models import Resource
+
+BATCH_SIZE = 2000
+
+
+class Command(BaseCommand):
+    help = """
+    Populates Resource.base_path and Resource.relative_path for existing
+    resources. New and updated resources are populated on save.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--missing-only",
+            action="store_true",
+            help="Only process resources with no base_path.",
+        )
+        parser.add_argument(
+            "--verbose",
+            action="store_true",
+            help="Print logs to stdout",
+        )
+
+    def handle(self, *args, **options):
+        verbose = bool(options["verbose"])
+        resources = Resource.objects.select_related("format__root_resource").order_by("pk")
+        if options["missing_only"]:
+            resources = resources.filter(base_path__isnull=True)
+
+        processed = 0
+        changed = []
+        updated = 0
+        for resource in resources.iterator(chunk_size=BATCH_SIZE):
+            processed += 1
+            if resource.denorm_paths():
+                changed.append(resource)
+            if len(changed) >= BATCH_SIZE:
+                Resource.objects.bulk_update(changed, ["base_path", "relative_path"])
+                updated += len(changed)
+                changed = []
+            if verbose and processed % BATCH_SIZE == 0:
+                print(f"Processed {processed} resources", end="\r")
+        if changed:
+            Resource.objects.bulk_update(changed, ["base_path", "relative_path"])
+            updated += len(changed)
+
+        print(f"Updated paths for {updated} of {processed} resources.")
@@ -0,0 +1,71 @@
+import os
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from icosa.helpers.process_pool import map_in_process_pool
+from icosa.helpers.thumbnails import (
+    render_thumbnail_derivatives,
+    save_thumbnail_derivatives,
+)
+from icosa.models import Asset
+
+
+class Command(BaseCommand):
+    help = """
+    Makes resized WebP and JPEG copies of existing assets' preview images or
+    thumbnails, across a pool of worker processes. New and changed images get
+    theirs when the asset is saved.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--missing-only",
+            action="store_true",
+            help="Only process assets which have no derivatives yet.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="Number of worker processes.",
+        )
+        parser.add_argument(
+            "--verbose",
+            action="store_true",
+            help="Print logs to stdout",
+        )
+
+    def handle(self, *args, **options):
+        verbose = bool(options["verbose"])
+        has_image = (Q(thumbnail__isnull=False) & ~Q(thumbnail="")) | (
+            Q(preview_image__isnull=False) & ~Q(preview_image="")
+        )
+        assets = (
+            Asset.objects.filter(has_image)
+            .only("pk", "thumbnail", "preview_image", "thumbnail_derivatives")
+            .order_by("pk")
+        )
+        if options["missing_only"]:
+            assets = assets.filter(thumbnail_derivatives__isnull=True)
+
+        processed = 0
+        made = 0
+        failed = 0
+        for batch, results, errors in map_in_process_pool(
+            assets,
+            lambda asset: asset.get_thumbnail_source_name(),
+            render_thumbnail_derivatives,
+            workers=options["workers"],
+        ):
+            processed += len(batch)
+            failed += len(errors)
+            if verbose:
+                for asset_id, error in errors.items():
+                    print(f"Asset {asset_id}: {error}")
+            for asset_id, derivatives in results.items():
+                save_thumbnail_derivatives(asset_id, derivatives)
+            made += len(results)
+            if verbose:
+                print(f"Processed {processed} assets", end="\r")
+
+        print(f"Made derivatives for {made} of {processed} assets. {failed} could not be read.")
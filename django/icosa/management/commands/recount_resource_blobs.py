@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from icosa.models import ResourceBlob
+
+BATCH_SIZE = 2000
+
+
+class Command(BaseCommand):
+    help = """
+    Recalculates ResourceBlob.ref_count from the resources which point at each
+    blob. Deleting resources without going through Resource.delete or
+    Asset.hide_media, e.g. from the admin, leaves counts too high, which
+    keeps blobs from ever being hidden. Run this while no uploads are in
+    progress, as a blob is referenced just before its resource is created.
+    """
+
+    def handle(self, *args, **options):
+        blobs = ResourceBlob.objects.annotate(resource_count=Count("resources")).order_by("pk")
+
+        processed = 0
+        changed = []
+        updated = 0
+        for blob in blobs.iterator(chunk_size=BATCH_SIZE):
+            processed += 1
+            if blob.ref_count != blob.resource_count:
+                blob.ref_count = blob.resource_count
+                changed.append(blob)
+            if len(changed) >= BATCH_SIZE:
+                ResourceBlob.objects.bulk_update(changed, ["ref_count"])
+                updated += len(changed)
+                changed = []
+        if changed:
+            ResourceBlob.objects.bulk_update(changed, ["ref_count"])
+            updated += len(changed)
+
+        print(f"Updated reference counts for {updated} of {processed} blobs.")
@@ -0,0 +1,47 @@
+import logging
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import autodiscover_modules
+from huey.consumer_options import ConsumerConfig
+from icosa.queues import get_queue, get_queue_config
+
+
+class Command(BaseCommand):
+    help = """
+    Runs the consumer for one of the queues in settings.HUEY_QUEUES, with the
+    worker count and type configured there. The default queue is still run by
+    run_huey.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("queue", choices=list(getattr(settings, "HUEY_QUEUES", {})))
+        parser.add_argument(
+            "--workers",
+            type=int,
+            help="Override the configured number of workers.",
+        )
+
+    def handle(self, *args, **options):
+        consumer_options = {
+            # Periodic tasks are scheduled by the default queue's consumer.
+            "periodic": False,
+            **get_queue_config(options["queue"]),
+        }
+        if options["workers"] is not None:
+            consumer_options["workers"] = options["workers"]
+
+        # Register the tasks, which routes them to their queues.
+        autodiscover_modules("tasks")
+
+        config = ConsumerConfig(**consumer_options)
+        try:
+            config.validate()
+        except ValueError as e:
+            raise CommandError(e)
+
+        logger = logging.getLogger("huey")
+        if not logger.handlers:
+            config.setup_logger(logger)
+
+        get_queue(options["queue"]).create_consumer(**config.values).run()
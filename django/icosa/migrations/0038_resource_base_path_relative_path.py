@@ -0,0 +1,23 @@
+# Generated by Django 5.2.10 on 2026-10-19 05:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('icosa', '0037_remove_assetcollection_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resource',
+            name='base_path',
+            field=models.CharField(blank=True, max_length=1024, null=True),
+        ),
+        migrations.AddField(
+            model_name='resource',
+            name='relative_path',
+            field=models.CharField(blank=True, max_length=1024, null=True),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.10 on 2026-10-19 05:38
+
+from django.db import migrations, models
+
+ORDER_KEY_GAP = 1024
+
+
+def space_order_keys(apps, schema_editor):
+    AssetCollectionAsset = apps.get_model("icosa", "AssetCollectionAsset")
+    database = schema_editor.connection.alias
+
+    # Existing keys are list indexes, or all zero for items added through the
+    # API. Space them out and break ties the same way the views did.
+    items = (
+        AssetCollectionAsset.objects.using(database)
+        .order_by("collection_id", "order", "create_time", "pk")
+        .only("pk", "collection_id", "order")
+    )
+    changed_items = []
+    collection_id = None
+    index = 0
+    for item in items.iterator(chunk_size=2000):
+        if item.collection_id != collection_id:
+            collection_id = item.collection_id
+            index = 0
+        index += 1
+        item.order = index * ORDER_KEY_GAP
+        changed_items.append(item)
+        if len(changed_items) >= 1000:
+            AssetCollectionAsset.objects.using(database).bulk_update(changed_items, ["order"])
+            changed_items = []
+    if changed_items:
+        AssetCollectionAsset.objects.using(database).bulk_update(changed_items, ["order"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('icosa', '0038_resource_base_path_relative_path'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='assetcollectionasset',
+            index=models.Index(fields=['collection', 'order'], name='icosa_asset_collect_4089b8_idx'),
+        ),
+        migrations.RunPython(space_order_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations
+
+INDEX_NAME = "icosa_tag_name_lower_prefix_idx"
+
+
+def create_index(apps, schema_editor):
+    # text_pattern_ops lets `lower(name) LIKE 'prefix%'` use the index
+    # regardless of the database's collation. There is no equivalent on other
+    # databases, which don't need it for the sizes involved.
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(f"CREATE INDEX IF NOT EXISTS {INDEX_NAME} ON icosa_tag (lower(name) text_pattern_ops)")
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(f"DROP INDEX IF EXISTS {INDEX_NAME}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("icosa", "0039_collection_order_keys"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
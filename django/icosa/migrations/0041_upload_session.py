@@ -0,0 +1,31 @@
+# Generated by Django 5.2.10 on 2026-10-19 05:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('icosa', '0040_tag_name_prefix_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('create_time', models.DateTimeField(auto_now_add=True)),
+                ('update_time', models.DateTimeField(auto_now=True)),
+                ('url', models.CharField(max_length=255, unique=True)),
+                ('filename', models.CharField(max_length=1024)),
+                ('size', models.BigIntegerField()),
+                ('received_bytes', models.BigIntegerField(default=0)),
+                ('sha256', models.CharField(blank=True, max_length=64)),
+                ('state', models.CharField(choices=[('OPEN', 'Open'), ('FINALIZED', 'Finalized')], default='OPEN', max_length=9)),
+                ('asset', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='icosa.asset')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
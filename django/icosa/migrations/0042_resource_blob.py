@@ -0,0 +1,30 @@
+# Generated by Django 5.2.10 on 2026-10-19 05:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('icosa', '0041_upload_session'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResourceBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('create_time', models.DateTimeField(auto_now_add=True)),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('file_name', models.CharField(max_length=1024)),
+                ('size', models.BigIntegerField()),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='resource',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='resources', to='icosa.resourceblob'),
+        ),
+    ]
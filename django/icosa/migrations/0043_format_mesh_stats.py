@@ -0,0 +1,33 @@
+# Generated by Django 5.2.10 on 2026-10-19 05:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('icosa', '0042_resource_blob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='format',
+            name='bounding_box',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='format',
+            name='mesh_stats_time',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='format',
+            name='texture_bytes',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='format',
+            name='vertex_count',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+    ]
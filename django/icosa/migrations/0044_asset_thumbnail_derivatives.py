@@ -0,0 +1,18 @@
+# Generated by Django 5.2.10 on 2026-10-19 05:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('icosa', '0043_format_mesh_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asset',
+            name='thumbnail_derivatives',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.10 on 2026-10-19 06:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('icosa', '0044_asset_thumbnail_derivatives'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadTraceLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('create_time', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('source', models.CharField(choices=[('API', 'API'), ('UPLOAD_SESSION', 'Resumable upload')], default='API', max_length=14)),
+                ('succeeded', models.BooleanField(default=False)),
+                ('total_seconds', models.FloatField()),
+                ('total_bytes', models.BigIntegerField(default=0)),
+                ('file_count', models.PositiveIntegerField(default=0)),
+                ('stages', models.JSONField(default=dict)),
+                ('asset', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='upload_trace_logs', to='icosa.asset')),
+            ],
+        ),
+    ]
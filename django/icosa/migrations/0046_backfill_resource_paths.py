@@ -0,0 +1,85 @@
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+# These mirror Resource.get_base_path and get_relative_path, which historical
+# models don't have.
+def get_root_base_path(resource):
+    if resource is None:
+        return None
+    if resource.file:
+        if "model_(GLTFupdated)" in resource.file.name and resource.external_url:
+            path = resource.external_url
+        else:
+            path = resource.file.name
+    elif resource.external_url:
+        path = resource.external_url
+    else:
+        return None
+    return f'{"/".join(path.split("/")[0:-1])}/'
+
+
+def get_paths(resource):
+    if resource.format_id is None:
+        base_path = get_root_base_path(resource)
+        if base_path is None:
+            return None, None
+        if resource.file:
+            return base_path, resource.file.name.split("/")[-1]
+        return base_path, resource.external_url.split("/")[-1]
+
+    base_path = get_root_base_path(resource.format.root_resource)
+    if base_path is None:
+        return None, None
+    if resource.file:
+        full_path = resource.file.name
+    elif resource.external_url:
+        full_path = resource.external_url
+    else:
+        return base_path, None
+    if full_path.startswith(base_path) and len(full_path) != len(base_path):
+        return base_path, full_path[len(base_path) :]
+    return base_path, None
+
+
+def backfill_resource_paths(apps, schema_editor):
+    Resource = apps.get_model("icosa", "Resource")
+    resources = (
+        Resource.objects.filter(base_path__isnull=True)
+        .select_related("format__root_resource")
+        .only(
+            "pk",
+            "file",
+            "external_url",
+            "format_id",
+            "format__root_resource__file",
+            "format__root_resource__external_url",
+        )
+        .order_by("pk")
+    )
+    last_pk = 0
+    while True:
+        batch = list(resources.filter(pk__gt=last_pk)[:BATCH_SIZE])
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+        changed = []
+        for resource in batch:
+            base_path, relative_path = get_paths(resource)
+            if base_path is not None:
+                resource.base_path = base_path
+                resource.relative_path = relative_path
+                changed.append(resource)
+        Resource.objects.bulk_update(changed, ["base_path", "relative_path"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("icosa", "0045_upload_trace_log"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_resource_paths, migrations.RunPython.noop),
+    ]
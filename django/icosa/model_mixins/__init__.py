@@ -1,5 +1,7 @@
 from django.contrib.contenttypes.fields import GenericRelation
 from django.db import models
+from django.db.models.fields.files import FieldFile
+from django.utils import timezone
 
 MOD_LEGACY = "LEGACY"
 MOD_NEW = "NEW"
@@ -24,6 +26,16 @@ MODERATION_STATE_CHOICES = [
     (MOD_MODIFIED, "Modified"),
 ]
 
+# Fields written by `ModerationMixin.log_moderation_changes`. Callers saving
+# with `update_fields` get these appended when a change is logged.
+MODERATION_LOG_FIELDS = [
+    "moderation_state",
+    "previous_moderation_state",
+    "moderation_state_change_time",
+    "moderation_state_change_by",
+    "moderation_changed_fields",
+]
+
 
 class ModerationMixin(models.Model):
     moderation_state = models.CharField(
@@ -52,5 +64,98 @@ class ModerationMixin(models.Model):
     def moderation_watch_fields(self):
         raise NotImplementedError
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.snapshot_moderation_watch_fields()
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self.snapshot_moderation_watch_fields()
+
+    def get_moderation_watch_value(self, field):
+        value = getattr(self, field)
+        if isinstance(value, FieldFile):
+            # Compare files by their stored name, as FieldFile.__eq__ does.
+            return value.name
+        return value
+
+    def snapshot_moderation_watch_fields(self, fields=None):
+        """Record the current values of the watched fields so that a later
+        save can diff against them without re-fetching the row. Deferred
+        fields are skipped; touching them here would cost a query each."""
+        if fields is None:
+            fields = self.moderation_watch_fields
+        deferred = self.get_deferred_fields()
+        snapshot = getattr(self, "_moderation_snapshot", {})
+        for field in fields:
+            if field not in deferred:
+                snapshot[field] = self.get_moderation_watch_value(field)
+        self._moderation_snapshot = snapshot
+
+    def get_changed_moderation_watch_fields(self, fields=None):
+        if fields is None:
+            fields = self.moderation_watch_fields
+        snapshot = getattr(self, "_moderation_snapshot", {})
+        deferred = self.get_deferred_fields()
+        fields = [x for x in fields if x not in deferred]
+
+        # This instance was not loaded from the database (or some fields were
+        # deferred at load time and have since been set), so we have nothing
+        # to compare against in memory. Fall back to the stored row.
+        missing = [x for x in fields if x not in snapshot]
+        original = dict(snapshot)
+        if missing:
+            stored = type(self)._base_manager.filter(pk=self.pk).values(*missing).first()
+            if stored is not None:
+                original.update(stored)
+
+        return [x for x in fields if x not in original or self.get_moderation_watch_value(x) != original[x]]
+
+    def log_moderation_changes(self, update_fields=None) -> bool:
+        """Move this object into the moderation queue if any watched fields
+        have changed since it was loaded. Returns True if a change was
+        logged."""
+        should_log = False
+        changed_fields = []
+        if self._state.adding:
+            changed_fields = self.moderation_watch_fields
+            moderation_state = MOD_NEW
+            should_log = True
+        elif self.moderation_state != MOD_DEFERRED:
+            watch_fields = self.moderation_watch_fields
+            if update_fields is not None:
+                # Changes to fields we are not writing will not be persisted,
+                # so they are not changes yet.
+                watch_fields = [x for x in watch_fields if x in update_fields]
+            changed_fields = self.get_changed_moderation_watch_fields(watch_fields)
+            moderation_state = MOD_MODIFIED
+            if changed_fields:
+                should_log = True
+        else:
+            # Just for QA
+            moderation_state = self.moderation_state
+
+        if should_log:
+            self.previous_moderation_state = self.moderation_state
+            self.moderation_state = moderation_state
+            self.moderation_state_change_time = timezone.now()
+            self.moderation_state_change_by = None
+            if self.moderation_changed_fields:
+                self.moderation_changed_fields = list(set(self.moderation_changed_fields + changed_fields))
+            else:
+                self.moderation_changed_fields = changed_fields
+        return should_log
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None:
+            self.snapshot_moderation_watch_fields()
+        else:
+            # Only the written columns now match the database.
+            self.snapshot_moderation_watch_fields([x for x in self.moderation_watch_fields if x in update_fields])
+
     class Meta:
         abstract = True
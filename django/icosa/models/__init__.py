@@ -1,5 +1,7 @@
 # Required to keep linters happy when re-exporting.
 __all__ = [
+    "UPLOAD_SESSION_FINALIZED",
+    "UPLOAD_SESSION_OPEN",
     "Asset",
     "AssetCollection",
     "AssetCollectionAsset",
@@ -16,11 +18,17 @@ __all__ = [
     "Oauth2Code",
     "Oauth2Token",
     "Resource",
+    "ResourceBlob",
     "Tag",
+    "UploadChecksumError",
+    "UploadSession",
+    "UploadTraceLog",
     "User",
     "UserLike",
+    "bump_landing_page_version",
     "format_upload_path",
     "get_cloud_media_root",
+    "get_landing_page_version",
     "masthead_image_upload_path",
     "preview_image_upload_path",
     "suffix",
@@ -33,14 +41,16 @@ from .common import *  # noqa
 from .device_code import DeviceCode
 from .format import Format, FormatRoleLabel
 from .helpers import (
+    bump_landing_page_version,
     format_upload_path,
     get_cloud_media_root,
+    get_landing_page_version,
     masthead_image_upload_path,
     preview_image_upload_path,
     suffix,
     thumbnail_upload_path,
 )
-from .log import BulkSaveLog, HiddenMediaFileLog
+from .log import BulkSaveLog, HiddenMediaFileLog, UploadTraceLog
 from .masthead import MastheadSection
 from .moderation import (
     ModerationEvent,
@@ -48,6 +58,13 @@ from .moderation import (
 )
 from .oauth import Oauth2Client, Oauth2Code, Oauth2Token
 from .resource import Resource
+from .resource_blob import ResourceBlob
 from .tag import Tag
+from .upload_session import (
+    UPLOAD_SESSION_FINALIZED,
+    UPLOAD_SESSION_OPEN,
+    UploadChecksumError,
+    UploadSession,
+)
 from .user import User
 from .user_like import UserLike
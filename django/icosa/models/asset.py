@@ -1,12 +1,14 @@
 import logging
-from collections import OrderedDict
+from collections import Counter, OrderedDict
 from datetime import datetime
 from typing import Optional
 
 from django.conf import settings
+from django.core.cache import cache
 from django.core.validators import FileExtensionValidator
 from django.db import models, transaction
-from django.db.models import Max, Q
+from django.db.models import Case, IntegerField, Max, Q, Value, When
+from django.template.loader import render_to_string
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.safestring import mark_safe
@@ -15,9 +17,7 @@ from django.utils.text import slugify
 from icosa.helpers.snowflake import get_snowflake_timestamp
 from icosa.helpers.storage import get_b2_bucket
 from icosa.model_mixins import (
-    MOD_DEFERRED,
-    MOD_MODIFIED,
-    MOD_NEW,
+    MODERATION_LOG_FIELDS,
     ModerationMixin,
 )
 
@@ -36,10 +36,13 @@ from .common import (
     VALID_THUMBNAIL_EXTENSIONS,
 )
 from .helpers import (
+    bump_landing_page_version,
+    get_cached_cors_allow_list,
     preview_image_upload_path,
     thumbnail_upload_path,
 )
 from .log import HiddenMediaFileLog
+from .resource_blob import ResourceBlob
 
 logger = logging.getLogger("django")
 
@@ -49,6 +52,107 @@ RECENCY_WEIGHT = 1
 
 NON_REMIXABLE_FORMAT_TYPES = ["TILT", "BLOCKS"]
 
+# Saves which only touch these fields are view counts, so don't clear the
+# asset's caches.
+VIEW_RANK_FIELDS = ["views", "rank"]
+
+# Fields which decide whether an asset is in a landing page grid or how its
+# card looks. Changing one invalidates cached landing pages; other changes,
+# including rank drift from likes and views, show once the grids expire.
+LANDING_PAGE_FIELDS = [
+    "url",
+    "name",
+    "thumbnail",
+    "preview_image",
+    "owner_id",
+    "visibility",
+    "license",
+    "curated",
+    "is_viewer_compatible",
+    "moderation_state",
+]
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+# Format types we can show in the viewer, best first.
+# IMM is the authored source, including playback, chapters, and camera
+# viewpoints that are not preserved by derived static formats. GLB is our
+# primary preferred format; GLTF2 is the next best option; GLTF1, if we must;
+# OBJ, if we really must.
+# TODO: the ordering of the newer types matters, but perhaps it is unlikely
+# that a usdz and ksplat are present (for example).
+PREFERRED_VIEWER_FORMAT_TYPES = [
+    "IMM",
+    "GLB",
+    "GLTF2",
+    "GLTF1",
+    "OBJ",
+    "KSPLAT",
+    "PLY",
+    "STL",
+    "SOG",
+    "SPZ",
+    "SPLAT",
+    "USDZ",
+    "VOX",
+]
+
+
+def preferred_viewer_format_rank():
+    """An expression ranking a Format by PREFERRED_VIEWER_FORMAT_TYPES, lowest
+    first. Order by this, then `-pk`, to pick the same format that querying
+    each type in turn with `last()` would."""
+    return Case(
+        *[When(format_type=x, then=Value(i)) for i, x in enumerate(PREFERRED_VIEWER_FORMAT_TYPES)],
+        output_field=IntegerField(),
+    )
+
+
+DOWNLOAD_MANIFEST_TTL = 60 * 60 * 24  # One day
+VIEW_MODEL_TTL = 60 * 60 * 24  # One day
+
+
+# The CORS allow list is part of these keys so that changing it in constance
+# invalidates everything which depends on whether a resource is CORS allowed.
+
+
+def get_download_manifest_cache_key(asset_id):
+    cors_allow_list = get_cached_cors_allow_list()
+    return f"asset_download_manifest-{asset_id}-{cors_allow_list}"
+
+
+def get_view_model_cache_key(asset_id):
+    cors_allow_list = get_cached_cors_allow_list()
+    return f"asset_view_model-{asset_id}-{cors_allow_list}"
+
+
+def queue_thumbnail_derivatives(asset_id):
+    if getattr(settings, "ENABLE_TASK_QUEUE", True) is True:
+        from icosa.tasks import queue_make_thumbnail_derivatives
+
+        queue_make_thumbnail_derivatives(asset_id)
+    else:
+        from icosa.helpers.thumbnails import make_thumbnail_derivatives
+
+        asset = Asset.objects.filter(pk=asset_id).first()
+        if asset is not None:
+            try:
+                make_thumbnail_derivatives(asset)
+            except Exception as e:
+                logger.error(e)
+
+
+def clear_asset_caches(asset_id):
+    """Clear cached data derived from an asset and its formats and
+    resources."""
+    if asset_id is not None:
+        cache.delete_many(
+            [
+                get_download_manifest_cache_key(asset_id),
+                get_view_model_cache_key(asset_id),
+            ]
+        )
+
 
 class Asset(ModerationMixin):
     COLOR_SPACES = [("LINEAR", "LINEAR"), ("GAMMA", "GAMMA")]
@@ -81,6 +185,9 @@ class Asset(ModerationMixin):
         validators=[FileExtensionValidator(allowed_extensions=VALID_THUMBNAIL_EXTENSIONS)],
     )
     thumbnail_contenttype = models.CharField(max_length=255, blank=True, null=True)
+    # Resized copies of the preview image, or the thumbnail if there is no
+    # preview image. See helpers/thumbnails.py.
+    thumbnail_derivatives = models.JSONField(null=True, blank=True)
     create_time = models.DateTimeField()
     update_time = models.DateTimeField(null=True, blank=True)
     license = models.CharField(max_length=50, null=True, blank=True, choices=LICENSE_CHOICES)
@@ -167,45 +274,18 @@ class Asset(ModerationMixin):
         else:
             return None
 
-    async def get_preferred_viewer_format_for_assignment(self):
-        formats = self.format_set.filter(root_resource__isnull=False)
-        # IMM is the authored source, including playback, chapters, and camera
-        # viewpoints that are not preserved by derived static formats.
-        inst = await formats.filter(format_type="IMM").alast()
-        if inst is not None:
-            return inst
-
-        # GLB is our primary preferred format;
-        inst = await formats.filter(format_type="GLB").alast()
-        if inst is not None:
-            return inst
-
-        # GLTF2 is the next best option;
-        inst = await formats.filter(format_type="GLTF2").alast()
-        if inst is not None:
-            return inst
-
-        # GLTF1, if we must.
-        inst = await formats.filter(format_type="GLTF1").alast()
-        if inst is not None:
-            return inst
-
-        # OBJ, if we really must
-        inst = await formats.filter(format_type="OBJ").alast()
-        if inst is not None:
-            return inst
-
-        # Last chance, can we get one of the newer format types?
-        # TODO: the ordering of these matters, but perhaps it is unlikely that
-        # a usdz and ksplat are present (for example).
-        for format_type in ["KSPLAT", "PLY", "STL", "SOG", "SPZ", "SPLAT", "USDZ", "VOX"]:
-            inst = await formats.filter(format_type=format_type).alast()
-            if inst is not None:
-                # This will return the first we find from the list above; this
-                # is why ordering matters.
-                return inst
+    def get_preferred_viewer_format_candidates(self):
+        return (
+            self.format_set.filter(
+                root_resource__isnull=False,
+                format_type__in=PREFERRED_VIEWER_FORMAT_TYPES,
+            )
+            .annotate(viewer_rank=preferred_viewer_format_rank())
+            .order_by("viewer_rank", "-pk")
+        )
 
-        return None
+    async def get_preferred_viewer_format_for_assignment(self):
+        return await self.get_preferred_viewer_format_candidates().afirst()
 
     async def assign_preferred_viewer_format(self):
         preferred_format = await self.get_preferred_viewer_format_for_assignment()
@@ -213,11 +293,34 @@ class Asset(ModerationMixin):
             # TODO(james) do we mark all other formats as not preferred?
             preferred_format.is_preferred_for_gallery_viewer = True
             await preferred_format.asave()
+        self.clear_preferred_viewer_format_cache()
         return preferred_format
 
     @property
     def preferred_viewer_format(self):
-        return self.format_set.filter(is_preferred_for_gallery_viewer=True).first()
+        # Templates ask for this several times per render, so only query once
+        # per instance. Use the prefetched formats if we have them.
+        if "_preferred_viewer_format" not in self.__dict__:
+            prefetched = getattr(self, "_prefetched_objects_cache", {}).get("format_set")
+            if prefetched is not None:
+                preferred_format = min(
+                    (x for x in prefetched if x.is_preferred_for_gallery_viewer),
+                    key=lambda x: x.pk,
+                    default=None,
+                )
+            else:
+                preferred_format = (
+                    self.format_set.filter(is_preferred_for_gallery_viewer=True).select_related("root_resource").first()
+                )
+            self._preferred_viewer_format = preferred_format
+        return self._preferred_viewer_format
+
+    def clear_preferred_viewer_format_cache(self):
+        self.__dict__.pop("_preferred_viewer_format", None)
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self.clear_preferred_viewer_format_cache()
 
     def get_absolute_url(self):
         return reverse("icosa:asset_view", kwargs={"asset_url": self.url})
@@ -238,6 +341,53 @@ class Asset(ModerationMixin):
             thumbnail_url = self.thumbnail.url
         return thumbnail_url
 
+    def get_thumbnail_source_name(self) -> Optional[str]:
+        """The stored name of the image which thumbnail derivatives are made
+        from."""
+        if self.preview_image:
+            return self.preview_image.name
+        if self.thumbnail:
+            return self.thumbnail.name
+        return None
+
+    def get_thumbnail_variants(self, content_type: str = "image/webp", source_name: Optional[str] = None) -> list:
+        """Derivatives of the current thumbnail source in `content_type`,
+        narrowest first, with their urls. Derivatives made from an image we
+        have since replaced are ignored until new ones are made. Pass
+        `source_name` to only return derivatives of that image."""
+        derivatives = self.thumbnail_derivatives
+        if source_name is None:
+            source_name = self.get_thumbnail_source_name()
+        if not derivatives or derivatives.get("source") != source_name:
+            return []
+        storage = self._meta.get_field("thumbnail").storage
+        variants = [
+            dict(x, url=storage.url(x["name"])) for x in derivatives["variants"] if x["content_type"] == content_type
+        ]
+        return sorted(variants, key=lambda x: x["width"])
+
+    def get_thumbnail_variant(
+        self,
+        max_width: Optional[int] = None,
+        max_height: Optional[int] = None,
+        content_type: str = "image/jpeg",
+    ) -> Optional[dict]:
+        """The largest derivative which fits within the given bounds, or the
+        smallest one if none do."""
+        variants = self.get_thumbnail_variants(content_type)
+        if not variants:
+            return None
+        fitting = [
+            x
+            for x in variants
+            if (max_width is None or x["width"] <= max_width) and (max_height is None or x["height"] <= max_height)
+        ]
+        return fitting[-1] if fitting else variants[0]
+
+    @property
+    def thumbnail_srcset(self) -> str:
+        return ", ".join([f"{x['url']} {x['width']}w" for x in self.get_thumbnail_variants()])
+
     @property
     def thumbnail_url(self):
         return self.thumbnail.url
@@ -274,7 +424,9 @@ class Asset(ModerationMixin):
         return self.name if self.name else "(Un-named asset)"
 
     def is_owned_by_django_user(self, user=None):
-        return user is not None and not user.is_anonymous and self.owner in user.assetowner_set.all()
+        if user is None or user.is_anonymous or self.owner is None:
+            return False
+        return self.owner.django_user_id == user.pk
 
     def update_search_text(self):
         if not self.pk:
@@ -345,45 +497,53 @@ class Asset(ModerationMixin):
     def inc_views_and_rank(self):
         self.views += 1
         self.rank = self.get_updated_rank()
-        self.save(bypass_custom_logic=True)
+        self.save(bypass_custom_logic=True, update_fields=VIEW_RANK_FIELDS)
 
     def get_all_file_names(self):
         file_list = []
         if self.thumbnail:
             file_list.append(self.thumbnail.file.name)
+        if self.thumbnail_derivatives:
+            file_list.extend([x["name"] for x in self.thumbnail_derivatives.get("variants", [])])
         for resource in self.resource_set.all():
             if resource.file:
                 file_list.append(resource.file.name)
         return file_list
 
-    # TODO(james|performance): This causes a bunch of n+1 queries but is
-    # impervious to `select_related`-type optimisations.
-    def get_all_downloadable_formats(self, user=None):
-        # The user owns this asset so can view all files.
-        if self.is_owned_by_django_user(user):
-            dl_formats = self.format_set.all()
-        else:
-            # We used to not provide any downloads for assets with restrictive
-            # licenses. This was inconsistent with the API, which must return all
-            # available formats because it can't tell the difference between a
-            # 'view' and a 'download'. In short, we are here to host people's art,
-            # not enforce copyright restrictions. Show all formats that are good
-            # for download.
-            dl_formats = self.format_set.filter(is_preferred_for_download=True)
-
-        formats = {}
-
-        for format in dl_formats:
+    def build_download_manifest(self):
+        """Compute the download data for all of this asset's formats in a
+        fixed number of queries, regardless of how many formats and resources
+        there are.
+
+        Returns a list of dicts with the format's type and role, whether it is
+        preferred for download, and its resource data. The result only
+        contains plain data so that it can be cached; see
+        get_download_manifest. User labels are looked up when the manifest is
+        read so that FormatRoleLabel edits are seen straight away.
+        """
+        from .resource import Resource
+
+        cors_allow_list = get_cached_cors_allow_list()
+        formats = list(self.format_set.select_related("root_resource").order_by("pk"))
+
+        # Query all resources which have either an external url or a file.
+        # Ignoring resources which have neither.
+        query = Q(external_url__isnull=False) & ~Q(external_url="")
+        query |= Q(file__isnull=False)
+        sub_resources = {}
+        for resource in Resource.objects.filter(query, format__asset=self).order_by("pk"):
+            sub_resources.setdefault(resource.format_id, []).append(resource)
+
+        manifest = []
+        for format in formats:
             # If the format in its entirety is on a remote host, just provide
             # the link to that.
             if format.zip_archive_url:
                 resource_data = {"zip_archive_url": format.zip_archive_url}
             else:
-                # Query all resources which have either an external url or a
-                # file. Ignoring resources which have neither.
-                query = Q(external_url__isnull=False) & ~Q(external_url="")
-                query |= Q(file__isnull=False)
-                resources = format.get_all_resources(query)
+                resources = sub_resources.get(format.pk, [])
+                if format.root_resource is not None:
+                    resources = [format.root_resource] + resources
 
                 # If there is more than one resource, this means we need to
                 # create a zip file of it on the client. We can only do this
@@ -394,20 +554,31 @@ class Asset(ModerationMixin):
                 # The second criteria is met if the resource's remote host is
                 # in the EXTERNAL_MEDIA_CORS_ALLOW_LIST setting in constance.
                 if len(resources) > 1:
-                    resource_data = format.get_resource_data(resources)
+                    resource_data = format.get_resource_data(resources, cors_allow_list)
                     # If there are exactly 2 resources, and we can't make a
                     # zip, owing to cors restrictions, let's instead offer
                     # direct links to the individual files.
                     if resource_data == {} and format.format_type in ["OBJ", "OBJ_NGON", "GLTF1", "GLTF2"]:
-                        non_image_resources = format.get_non_image_resources(query)
+                        non_image_resources = [
+                            x
+                            for x in resources
+                            if x == format.root_resource or not x.file or not x.file.name.endswith(IMAGE_EXTENSIONS)
+                        ]
                         if len(non_image_resources) == 2:
-                            resource_data = {"individual_files": list(resources)}
+                            resource_data = {
+                                "individual_files": [
+                                    {
+                                        "external_url": x.external_url,
+                                        "external_file_name": x.external_file_name,
+                                    }
+                                    for x in resources
+                                ]
+                            }
                 # If there is only one resource, there is no need to create
                 # a zip file; we can offer our local file, or a link to the
                 # external host.
                 elif len(resources) == 1:
-                    resource = resources[0]
-                    file_url = resource.url
+                    file_url = resources[0].url
                     if file_url is None:
                         resource_data = {}
                     else:
@@ -415,13 +586,107 @@ class Asset(ModerationMixin):
                 else:
                     resource_data = {}
 
-            format_name = format.user_label()
-
             if resource_data:
-                # TODO: Currently, we only offer the first format per type (or
-                # role) that we find. This might be a mistake. Should we include
-                # all duplicates?
-                formats.setdefault(format_name, resource_data)
+                manifest.append(
+                    {
+                        "format_type": format.format_type,
+                        "role": format.role,
+                        "is_preferred_for_download": format.is_preferred_for_download,
+                        "resource_data": resource_data,
+                    }
+                )
+        return manifest
+
+    def get_download_manifest(self):
+        if "_download_manifest" in self.__dict__:
+            return self.__dict__["_download_manifest"]
+        cache_key = get_download_manifest_cache_key(self.pk)
+        manifest = cache.get(cache_key, None)
+        if manifest is None:
+            manifest = self.build_download_manifest()
+            cache.set(cache_key, manifest, DOWNLOAD_MANIFEST_TTL)
+        self.__dict__["_download_manifest"] = manifest
+        return manifest
+
+    def get_view_model(self):
+        """Data for the asset and embed pages which only changes when the
+        asset, its formats or its resources do. Cached per asset, so user-
+        specific values must be layered on top by the caller."""
+        if "_view_model" in self.__dict__:
+            return self.__dict__["_view_model"]
+        cache_key = get_view_model_cache_key(self.pk)
+        view_model = cache.get(cache_key, None)
+        if view_model is None:
+            view_model = self.build_view_model()
+            cache.set(cache_key, view_model, VIEW_MODEL_TTL)
+        self.__dict__["_view_model"] = view_model
+        return view_model
+
+    def build_view_model(self):
+        viewer_format = self.preferred_viewer_format
+        viewer_format_type = ""
+        viewer_url = ""
+        viewer_mtl_url = None
+        if viewer_format is not None:
+            viewer_format_type = viewer_format.format_type
+            if viewer_format.root_resource is not None:
+                viewer_url = viewer_format.root_resource.internal_or_cors_url or ""
+            # Only used when loading OBJs.
+            mtl_resource = viewer_format.resource_set.first()
+            if mtl_resource is not None:
+                viewer_mtl_url = mtl_resource.url or ""
+
+        embed_code = render_to_string(
+            "partials/oembed_code.html",
+            {
+                "host": f"{settings.DEPLOYMENT_SCHEME}{settings.DEPLOYMENT_HOST_WEB}",
+                "asset": self,
+                "frame_width": 1920,
+                "frame_height": 1440,
+            },
+        )
+
+        download_manifest = self.get_download_manifest()
+        return {
+            "viewer_format_type": viewer_format_type,
+            "viewer_url": viewer_url,
+            "viewer_mtl_url": viewer_mtl_url,
+            "embed_code": embed_code.strip(),
+            "has_downloads": any([x["is_preferred_for_download"] for x in download_manifest]),
+            "has_owner_downloads": bool(download_manifest),
+        }
+
+    def clear_asset_caches(self):
+        self.__dict__.pop("_download_manifest", None)
+        self.__dict__.pop("_view_model", None)
+        clear_asset_caches(self.pk)
+
+    def get_downloadable_manifest_entries(self, user=None):
+        # The user owns this asset so can view all files.
+        if self.is_owned_by_django_user(user):
+            return self.get_download_manifest()
+        # We used to not provide any downloads for assets with restrictive
+        # licenses. This was inconsistent with the API, which must return all
+        # available formats because it can't tell the difference between a
+        # 'view' and a 'download'. In short, we are here to host people's art,
+        # not enforce copyright restrictions. Show all formats that are good
+        # for download.
+        return [x for x in self.get_download_manifest() if x["is_preferred_for_download"]]
+
+    def has_downloads(self, user=None):
+        return bool(self.get_downloadable_manifest_entries(user))
+
+    def get_all_downloadable_formats(self, user=None):
+        from .format import FormatRoleLabel
+
+        labels = FormatRoleLabel.get_label_map()
+        formats = {}
+        for entry in self.get_downloadable_manifest_entries(user):
+            format_name = labels.get(entry["role"], entry["format_type"].lower())
+            # TODO: Currently, we only offer the first format per type (or
+            # role) that we find. This might be a mistake. Should we include
+            # all duplicates?
+            formats.setdefault(format_name, entry["resource_data"])
 
         formats = OrderedDict(sorted(formats.items(), key=lambda x: x[0].lower()))
         return formats
@@ -437,9 +702,13 @@ class Asset(ModerationMixin):
         if len(file_names) == 0:
             return hidden_files
 
+        shared_file_names = self.release_blobs()
         bucket = get_b2_bucket()
-        for file_name in file_names:
-            if file_name.startswith("poly/"):
+        for file_name in dict.fromkeys(file_names):
+            if file_name in shared_file_names:
+                # This is a blob which other assets' resources still use.
+                pass
+            elif file_name.startswith("poly/"):
                 # This is a poly file and we might not want to delete/hide it.
                 pass  # TODO
             elif file_name.startswith("icosa/"):
@@ -450,6 +719,46 @@ class Asset(ModerationMixin):
                 # This is not a file we care to mess with.
                 pass
 
+    def release_blobs(self):
+        """Release this asset's references to shared blobs. Blobs nothing
+        else uses are deleted, so that their files can be hidden along with
+        the rest of this asset's files. Returns the file names of the blobs
+        which are still in use."""
+        blob_counts = Counter(self.resource_set.filter(blob__isnull=False).values_list("blob_id", flat=True))
+        shared_file_names = set()
+        for blob in ResourceBlob.objects.filter(pk__in=blob_counts):
+            if blob.release(blob_counts[blob.pk]) > 0 or not blob.delete_if_unused():
+                shared_file_names.add(blob.file_name)
+        return shared_file_names
+
+    def snapshot_moderation_watch_fields(self, fields=None):
+        # Landing page fields are snapshotted alongside the moderation ones,
+        # so that saves can tell whether they changed without a query.
+        if fields is None:
+            fields = self.moderation_watch_fields + LANDING_PAGE_FIELDS
+        super().snapshot_moderation_watch_fields(fields)
+
+    def has_landing_page_changed(self, update_fields=None) -> bool:
+        if self._state.adding:
+            return self.visibility == PUBLIC
+        fields = LANDING_PAGE_FIELDS
+        if update_fields is not None:
+            update_fields = {"owner_id" if x == "owner" else x for x in update_fields}
+            fields = [x for x in fields if x in update_fields]
+        if not fields:
+            return False
+        return bool(self.get_changed_moderation_watch_fields(fields))
+
+    def has_thumbnail_source_changed(self, update_fields=None) -> bool:
+        fields = ["thumbnail", "preview_image"]
+        if update_fields is not None:
+            fields = [x for x in fields if x in update_fields]
+        if not fields:
+            return False
+        if self._state.adding:
+            return any([getattr(self, x) for x in fields])
+        return bool(self.get_changed_moderation_watch_fields(fields))
+
     @property
     def moderation_watch_fields(self):
         return [
@@ -472,7 +781,9 @@ class Asset(ModerationMixin):
             if self._state.adding:
                 self.create_time = now
             else:
-                # Only denorm fields when updating an existing model
+                # Only denorm fields when updating an existing model. Formats
+                # may have changed since we last looked.
+                self.clear_preferred_viewer_format_cache()
                 self.rank = self.get_updated_rank()
                 self.update_search_text()
                 self.is_viewer_compatible = self.calc_is_viewer_compatible()
@@ -483,40 +794,37 @@ class Asset(ModerationMixin):
                 if update_timestamps:
                     self.update_time = now
 
+        thumbnail_changed = False
+        if not bypass_custom_logic:
+            thumbnail_changed = self.has_thumbnail_source_changed(kwargs.get("update_fields"))
+
         if not bypass_custom_logic and not bypass_moderation_logging:
-            should_log = False
             try:
-                changed_fields = []
-                if self._state.adding:
-                    changed_fields = self.moderation_watch_fields
-                    moderation_state = MOD_NEW
-                    should_log = True
-                elif self.moderation_state != MOD_DEFERRED:
-                    original_instance = Asset.objects.get(pk=self.pk)
-                    for field in self.moderation_watch_fields:
-                        if getattr(self, field) != getattr(original_instance, field):
-                            changed_fields.append(field)
-                    moderation_state = MOD_MODIFIED
-                    if changed_fields:
-                        should_log = True
-                else:
-                    # Just for QA
-                    moderation_state = self.moderation_state
-
-                if should_log:
-                    self.previous_moderation_state = self.moderation_state
-                    self.moderation_state = moderation_state
-                    self.moderation_state_change_time = timezone.now()
-                    self.moderation_state_change_by = None
-                    if self.moderation_changed_fields:
-                        self.moderation_changed_fields = list(set(self.moderation_changed_fields + changed_fields))
-                    else:
-                        self.moderation_changed_fields = changed_fields
+                update_fields = kwargs.get("update_fields")
+                if self.log_moderation_changes(update_fields) and update_fields is not None:
+                    kwargs["update_fields"] = list(set(update_fields) | set(MODERATION_LOG_FIELDS))
             except Exception as e:
                 logger.error(e)
 
+        # After moderation logging, which may change moderation_state.
+        landing_page_changed = self.has_landing_page_changed(kwargs.get("update_fields"))
+
         super().save(*args, **kwargs)
 
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            # The mixin only re-snapshots the moderation fields written.
+            update_fields = {"owner_id" if x == "owner" else x for x in update_fields}
+            self.snapshot_moderation_watch_fields([x for x in LANDING_PAGE_FIELDS if x in update_fields])
+        if update_fields is None or not set(update_fields) <= set(VIEW_RANK_FIELDS):
+            self.clear_asset_caches()
+        if landing_page_changed:
+            transaction.on_commit(bump_landing_page_version)
+
+        if thumbnail_changed:
+            asset_id = self.pk
+            transaction.on_commit(lambda: queue_thumbnail_derivatives(asset_id))
+
     class Meta:
         # Foreign keys (including m2m) are indexed by default
         indexes = [
@@ -8,9 +8,7 @@ from django.urls import reverse
 from django.utils import timezone
 
 from icosa.model_mixins import (
-    MOD_DEFERRED,
-    MOD_MODIFIED,
-    MOD_NEW,
+    MODERATION_LOG_FIELDS,
     ModerationMixin,
 )
 
@@ -112,34 +110,10 @@ class AssetOwner(ModerationMixin):
                     self.update_time = now
 
         if not bypass_custom_logic and not bypass_moderation_logging:
-            should_log = False
             try:
-                changed_fields = []
-                if self._state.adding:
-                    changed_fields = self.moderation_watch_fields
-                    moderation_state = MOD_NEW
-                    should_log = True
-                elif self.moderation_state != MOD_DEFERRED:
-                    original_instance = AssetOwner.objects.get(pk=self.pk)
-                    for field in self.moderation_watch_fields:
-                        if getattr(self, field) != getattr(original_instance, field):
-                            changed_fields.append(field)
-                    moderation_state = MOD_MODIFIED
-                    if changed_fields:
-                        should_log = True
-                else:
-                    # Just for QA
-                    moderation_state = self.moderation_state
-
-                if should_log:
-                    self.previous_moderation_state = self.moderation_state
-                    self.moderation_state = moderation_state
-                    self.moderation_state_change_time = timezone.now()
-                    self.moderation_state_change_by = None
-                    if self.moderation_changed_fields:
-                        self.moderation_changed_fields = list(set(self.moderation_changed_fields + changed_fields))
-                    else:
-                        self.moderation_changed_fields = changed_fields
+                update_fields = kwargs.get("update_fields")
+                if self.log_moderation_changes(update_fields) and update_fields is not None:
+                    kwargs["update_fields"] = list(set(update_fields) | set(MODERATION_LOG_FIELDS))
             except Exception as e:
                 logger.error(e)
         super().save(*args, **kwargs)
@@ -3,15 +3,15 @@ import secrets
 
 from django.conf import settings
 from django.core.validators import FileExtensionValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.urls import reverse
 from django.utils import timezone
 
 from icosa.model_mixins import (
-    MOD_DEFERRED,
     MOD_HIDDEN,
-    MOD_MODIFIED,
-    MOD_NEW,
+    MODERATION_LOG_FIELDS,
     ModerationMixin,
 )
 from icosa.models import Asset
@@ -27,6 +27,35 @@ from .helpers import collection_image_upload_path
 
 logger = logging.getLogger("django")
 
+# Collection items are ordered by sparse integer keys, so that an item can be
+# moved by giving it a key between its new neighbours without renumbering the
+# rest of the collection.
+ORDER_KEY_GAP = 1024
+# Moves which leave less room than this between neighbouring keys schedule a
+# background rebalance of the collection's keys.
+ORDER_KEY_MIN_GAP = 8
+
+
+class AssetCollectionQuerySet(models.QuerySet):
+    def with_listing_data(self):
+        """Annotate what collection list pages show for each collection, so
+        that rendering a page of collections doesn't query per row."""
+        collected_assets = AssetCollectionAsset.objects.filter(collection=OuterRef("pk"))
+        listed_asset_count = (
+            collected_assets.filter(asset__visibility=PUBLIC)
+            .exclude(asset__moderation_state__in=MOD_HIDDEN)
+            .order_by()
+            .values("collection")
+            .annotate(count=Count("pk"))
+            .values("count")
+        )
+        first_asset = collected_assets.order_by("order", "pk")
+        return self.annotate(
+            listed_asset_count=Coalesce(Subquery(listed_asset_count), 0),
+            first_asset_preview_image=Subquery(first_asset.values("asset__preview_image")[:1]),
+            first_asset_thumbnail=Subquery(first_asset.values("asset__thumbnail")[:1]),
+        )
+
 
 class AssetCollection(ModerationMixin):
     create_time = models.DateTimeField(auto_now_add=True)
@@ -55,7 +84,11 @@ class AssetCollection(ModerationMixin):
         # same name.
         return self.name
 
+    objects = AssetCollectionQuerySet.as_manager()
+
     def get_asset_count(self):
+        if hasattr(self, "listed_asset_count"):
+            return self.listed_asset_count
         return self.assets.filter(visibility=PUBLIC).exclude(moderation_state__in=MOD_HIDDEN).count()
 
     def get_thumbnail_url(self):
@@ -65,11 +98,90 @@ class AssetCollection(ModerationMixin):
 
         if self.image:
             thumbnail_url = self.image.url
-        elif collected_asset := self.collected_assets.first():
+        elif hasattr(self, "first_asset_preview_image"):
+            # Annotated by AssetCollectionQuerySet.with_listing_data. Mirrors
+            # Asset.get_thumbnail_url.
+            if self.first_asset_preview_image:
+                thumbnail_url = Asset._meta.get_field("preview_image").storage.url(self.first_asset_preview_image)
+            elif self.first_asset_thumbnail:
+                thumbnail_url = Asset._meta.get_field("thumbnail").storage.url(self.first_asset_thumbnail)
+        elif collected_asset := self.collected_assets.select_related("asset").first():
             thumbnail_url = collected_asset.asset.get_thumbnail_url()
 
         return thumbnail_url
 
+    def get_next_order_key(self):
+        last_order = self.collected_assets.aggregate(Max("order"))["order__max"]
+        return ORDER_KEY_GAP if last_order is None else last_order + ORDER_KEY_GAP
+
+    def add_assets(self, assets):
+        """Append `assets` to the end of this collection in the order given,
+        skipping any already in it. Returns the number of assets added."""
+        asset_ids = list(dict.fromkeys(asset.pk for asset in assets))
+        with transaction.atomic():
+            existing_ids = set(
+                self.collected_assets.filter(asset_id__in=asset_ids).values_list("asset_id", flat=True)
+            )
+            new_ids = [asset_id for asset_id in asset_ids if asset_id not in existing_ids]
+            if not new_ids:
+                return 0
+            next_order = self.get_next_order_key()
+            AssetCollectionAsset.objects.bulk_create(
+                [
+                    AssetCollectionAsset(
+                        collection=self,
+                        asset_id=asset_id,
+                        order=next_order + index * ORDER_KEY_GAP,
+                    )
+                    for index, asset_id in enumerate(new_ids)
+                ],
+                batch_size=1000,
+            )
+        return len(new_ids)
+
+    def remove_assets(self, assets):
+        """Remove `assets`, a list or queryset, from this collection. Returns
+        the number of assets removed."""
+        deleted, _ = self.collected_assets.filter(asset__in=assets).delete()
+        return deleted
+
+    def replace_assets(self, assets):
+        """Make `assets` the contents of this collection, in the order given.
+        Items for assets which were already collected are kept, so that their
+        create_time survives."""
+        asset_ids = list(dict.fromkeys(asset.pk for asset in assets))
+        with transaction.atomic():
+            self.collected_assets.exclude(asset_id__in=asset_ids).delete()
+            existing_items = {item.asset_id: item for item in self.collected_assets.only("pk", "asset_id", "order")}
+            changed_items = []
+            new_items = []
+            for index, asset_id in enumerate(asset_ids, start=1):
+                order = index * ORDER_KEY_GAP
+                item = existing_items.get(asset_id)
+                if item is None:
+                    new_items.append(AssetCollectionAsset(collection=self, asset_id=asset_id, order=order))
+                elif item.order != order:
+                    item.order = order
+                    changed_items.append(item)
+            if changed_items:
+                AssetCollectionAsset.objects.bulk_update(changed_items, ["order"], batch_size=1000)
+            if new_items:
+                AssetCollectionAsset.objects.bulk_create(new_items, batch_size=1000)
+
+    def rebalance_order_keys(self):
+        """Space this collection's order keys ORDER_KEY_GAP apart, keeping the
+        current order. This touches every item, so is normally run in the
+        background by tasks.queue_rebalance_collection_order."""
+        items = self.collected_assets.order_by("order", "create_time", "pk").only("pk", "order")
+        changed_items = []
+        for index, item in enumerate(items, start=1):
+            order = index * ORDER_KEY_GAP
+            if item.order != order:
+                item.order = order
+                changed_items.append(item)
+        if changed_items:
+            AssetCollectionAsset.objects.bulk_update(changed_items, ["order"], batch_size=1000)
+
     @property
     def moderation_watch_fields(self):
         return [
@@ -94,34 +206,10 @@ class AssetCollection(ModerationMixin):
                     self.update_time = now
 
         if not bypass_custom_logic and not bypass_moderation_logging:
-            should_log = False
             try:
-                changed_fields = []
-                if self._state.adding:
-                    changed_fields = self.moderation_watch_fields
-                    moderation_state = MOD_NEW
-                    should_log = True
-                elif self.moderation_state != MOD_DEFERRED:
-                    original_instance = AssetCollection.objects.get(pk=self.pk)
-                    for field in self.moderation_watch_fields:
-                        if getattr(self, field) != getattr(original_instance, field):
-                            changed_fields.append(field)
-                    moderation_state = MOD_MODIFIED
-                    if changed_fields:
-                        should_log = True
-                else:
-                    # Just for QA
-                    moderation_state = self.moderation_state
-
-                if should_log:
-                    self.previous_moderation_state = self.moderation_state
-                    self.moderation_state = moderation_state
-                    self.moderation_state_change_time = timezone.now()
-                    self.moderation_state_change_by = None
-                    if self.moderation_changed_fields:
-                        self.moderation_changed_fields = list(set(self.moderation_changed_fields + changed_fields))
-                    else:
-                        self.moderation_changed_fields = changed_fields
+                update_fields = kwargs.get("update_fields")
+                if self.log_moderation_changes(update_fields) and update_fields is not None:
+                    kwargs["update_fields"] = list(set(update_fields) | set(MODERATION_LOG_FIELDS))
             except Exception as e:
                 logger.error(e)
         super().save(*args, **kwargs)
@@ -152,5 +240,50 @@ class AssetCollectionAsset(models.Model):
     def __str__(self):
         return f"{self.order}: {self.asset.name}"
 
+    def move_before(self, target):
+        self._move_next_to(target, before=True)
+
+    def move_after(self, target):
+        self._move_next_to(target, before=False)
+
+    def _move_next_to(self, target, before, rebalanced=False):
+        """Give this item an order key between `target` and its neighbour.
+        Only this item's row is updated, unless the keys have run out of room
+        and the collection has to be rebalanced first."""
+        if target.pk == self.pk:
+            return
+        siblings = AssetCollectionAsset.objects.filter(collection_id=self.collection_id).exclude(pk=self.pk)
+        if before:
+            neighbour_order = (
+                siblings.filter(order__lt=target.order).order_by("-order").values_list("order", flat=True).first()
+            )
+            lower = 0 if neighbour_order is None else neighbour_order
+            upper = target.order
+        else:
+            neighbour_order = (
+                siblings.filter(order__gt=target.order).order_by("order").values_list("order", flat=True).first()
+            )
+            lower = target.order
+            upper = target.order + 2 * ORDER_KEY_GAP if neighbour_order is None else neighbour_order
+
+        if upper - lower < 2:
+            if rebalanced:
+                raise ValueError(f"No room to move collection item {self.pk}")
+            self.collection.rebalance_order_keys()
+            target.refresh_from_db(fields=["order"])
+            self._move_next_to(target, before, rebalanced=True)
+            return
+
+        self.order = (lower + upper) // 2
+        AssetCollectionAsset.objects.filter(pk=self.pk).update(order=self.order)
+        if min(self.order - lower, upper - self.order) < ORDER_KEY_MIN_GAP:
+            from icosa.tasks import queue_rebalance_collection_order
+
+            collection_id = self.collection_id
+            transaction.on_commit(lambda: queue_rebalance_collection_order(collection_id))
+
     class Meta:
         ordering = ("order",)
+        indexes = [
+            models.Index(fields=["collection", "order"]),
+        ]
@@ -1,18 +1,26 @@
+import uuid
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, Iterable, List, Optional
 
 from django.core.cache import cache
-from django.db import models
+from django.db import models, transaction
 from django.db.models import Q
 from django.utils import timezone
 
-from .asset import Asset
+from .asset import Asset, clear_asset_caches
 from .common import FILENAME_MAX_LENGTH, STORAGE_PREFIX
 from .helpers import get_cached_cors_allow_list
 from .resource import Resource
 
 ROLE_MAX_LENGTH = 255
 
+FORMAT_ROLE_LABELS_VERSION_KEY = "format_role_labels_version"
+
+# Process-local copy of all FormatRoleLabel records, as a map of role_text to
+# label. It is reloaded when the version in the shared cache no longer
+# matches the version we loaded it at.
+_format_role_labels = {"version": None, "labels": {}}
+
 
 class Format(models.Model):
     asset = models.ForeignKey(Asset, on_delete=models.CASCADE)
@@ -20,6 +28,11 @@ class Format(models.Model):
     zip_archive_url = models.CharField(max_length=FILENAME_MAX_LENGTH, null=True, blank=True)
     triangle_count = models.PositiveIntegerField(null=True, blank=True)
     lod_hint = models.PositiveIntegerField(null=True, blank=True)
+    # Read from the format's files by helpers.mesh_stats after upload.
+    vertex_count = models.PositiveBigIntegerField(null=True, blank=True)
+    bounding_box = models.JSONField(null=True, blank=True)
+    texture_bytes = models.PositiveBigIntegerField(null=True, blank=True)
+    mesh_stats_time = models.DateTimeField(null=True, blank=True)
     role = models.CharField(
         max_length=ROLE_MAX_LENGTH,
         null=True,
@@ -67,6 +80,12 @@ class Format(models.Model):
         return resources
 
     def get_all_resources(self, query: Q = Q()):
+        if not query and "resource_set" in getattr(self, "_prefetched_objects_cache", {}):
+            # Use the prefetched resources rather than querying again.
+            resources = list(self.resource_set.all())
+            if self.root_resource:
+                resources.append(self.root_resource)
+            return resources
         return self.get_resources(query)
 
     def get_non_image_resources(self, query: Q = Q()):
@@ -75,7 +94,7 @@ class Format(models.Model):
             exclude_q |= Q(file__endswith=ext)
         return self.get_resources(query, exclude_q)
 
-    def get_resource_data(self, resources: List[Resource]):
+    def get_resource_data(self, resources: List[Resource], cors_allow_list: Optional[str] = None):
         local_files = []
         for r in resources:
             if not r.file:
@@ -86,7 +105,9 @@ class Format(models.Model):
                 full_path = ""
             local_files.append([f"{STORAGE_PREFIX}{r.file.name}", full_path])
 
-        if all([x.is_cors_allowed and x.remote_host for x in resources]):
+        if cors_allow_list is None:
+            cors_allow_list = get_cached_cors_allow_list()
+        if all([x.calc_is_cors_allowed(cors_allow_list) and x.remote_host for x in resources]):
             external_files = [[x.external_url, ""] for x in resources if x.external_url]
             resource_data = {
                 "files_to_zip": external_files + local_files,
@@ -97,14 +118,13 @@ class Format(models.Model):
             resource_data = {}
         return resource_data
 
-    def user_label(self):
-        # If self.role is None, then we avoid a db lookup by returning early.
+    def user_label(self, labels: Optional[Dict[str, str]] = None):
+        # If self.role is None, then we avoid a label lookup by returning early.
         if self.role is None:
             return self.format_type.lower()
-        role_label = FormatRoleLabel.objects.filter(role_text=self.role).first()
-        if role_label is None:
-            return self.format_type.lower()
-        return role_label.label
+        if labels is None:
+            labels = FormatRoleLabel.get_label_map()
+        return labels.get(self.role, self.format_type.lower())
 
     @property
     def is_cors_allowed(self):
@@ -127,6 +147,16 @@ class Format(models.Model):
         cache.set(cache_key, is_allowed, None)  # No expiry
         return is_allowed
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        clear_asset_caches(self.asset_id)
+
+    def delete(self, *args, **kwargs):
+        asset_id = self.asset_id
+        result = super().delete(*args, **kwargs)
+        clear_asset_caches(asset_id)
+        return result
+
     class Meta:
         indexes = [
             models.Index(
@@ -145,7 +175,8 @@ class FormatRoleLabel(models.Model):
     User-facing format display implementations should either use a format's
     format_type, or a friendly version of role.
 
-    See Format.user_label for an example of an implementation.
+    See Format.user_label for an example of an implementation. Lookups go
+    through get_label_map, which is cached in process memory.
     """
 
     create_time = models.DateTimeField()
@@ -153,6 +184,40 @@ class FormatRoleLabel(models.Model):
     role_text = models.CharField(max_length=ROLE_MAX_LENGTH)
     label = models.CharField(max_length=1024)
 
+    @staticmethod
+    def get_label_map() -> Dict[str, str]:
+        """Return a map of role_text to label for all records. This is held
+        in process memory and only queried again when another process has
+        bumped the shared version, so most calls make no queries."""
+        version = cache.get(FORMAT_ROLE_LABELS_VERSION_KEY, None)
+        if version is not None and version == _format_role_labels["version"]:
+            return _format_role_labels["labels"]
+
+        if version is None:
+            version = FormatRoleLabel.bump_version()
+        labels = {}
+        # Where there are duplicate roles, the oldest record wins.
+        for role_text, label in FormatRoleLabel.objects.order_by("pk").values_list("role_text", "label"):
+            labels.setdefault(role_text, label)
+        _format_role_labels["version"] = version
+        _format_role_labels["labels"] = labels
+        return labels
+
+    @staticmethod
+    def bump_version() -> str:
+        # A random version, rather than an incrementing one, means a process
+        # can never mistake a version set after a cache eviction for the one
+        # it loaded at.
+        version = uuid.uuid4().hex
+        cache.set(FORMAT_ROLE_LABELS_VERSION_KEY, version, None)  # No expiry
+        return version
+
+    @staticmethod
+    def labels_for(formats: Iterable[Format]) -> List[str]:
+        """Return the user-facing label for each of `formats`, in order."""
+        labels = FormatRoleLabel.get_label_map()
+        return [x.user_label(labels) for x in formats]
+
     def save(self, *args, **kwargs):
         update_timestamps = kwargs.pop("update_timestamps", True)
         now = timezone.now()
@@ -162,6 +227,12 @@ class FormatRoleLabel(models.Model):
             if update_timestamps:
                 self.update_time = now
         super().save(*args, **kwargs)
+        transaction.on_commit(FormatRoleLabel.bump_version)
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        transaction.on_commit(FormatRoleLabel.bump_version)
+        return result
 
     def __str__(self):
         return f"{self.role_text} => {self.label}"
@@ -1,4 +1,5 @@
 import os
+import uuid
 from pathlib import Path
 
 from constance import config
@@ -80,3 +81,21 @@ def get_cached_cors_allow_list():
     allow_list = config.EXTERNAL_MEDIA_CORS_ALLOW_LIST
     cache.set(cache_key, allow_list, 60)  # 60 secs, one minute
     return allow_list
+
+
+LANDING_PAGE_VERSION_KEY = "landing_page_version"
+
+
+def get_landing_page_version():
+    version = cache.get(LANDING_PAGE_VERSION_KEY, None)
+    if version is None:
+        version = bump_landing_page_version()
+    return version
+
+
+def bump_landing_page_version():
+    """Invalidate all cached landing page fragments. Called when a change
+    could alter which assets a grid shows or how their cards look."""
+    version = uuid.uuid4().hex
+    cache.set(LANDING_PAGE_VERSION_KEY, version, None)  # No expiry
+    return version
@@ -49,3 +49,34 @@ class BulkSaveLog(models.Model):
     )
     kill_sig = models.BooleanField(default=False)
     last_id = models.BigIntegerField(null=True, blank=True)
+
+
+class UploadTraceLog(models.Model):
+    """Where the time went in one upload. `stages` maps each stage's name to
+    its span count (n), seconds (s), bytes (b) and files (f); see
+    helpers/tracing.py."""
+
+    SOURCE_API = "API"
+    SOURCE_UPLOAD_SESSION = "UPLOAD_SESSION"
+
+    SOURCE_CHOICES = [
+        (SOURCE_API, "API"),
+        (SOURCE_UPLOAD_SESSION, "Resumable upload"),
+    ]
+    create_time = models.DateTimeField(auto_now_add=True, db_index=True)
+    asset = models.ForeignKey(
+        "Asset",
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="upload_trace_logs",
+    )
+    source = models.CharField(max_length=14, choices=SOURCE_CHOICES, default=SOURCE_API)
+    succeeded = models.BooleanField(default=False)
+    total_seconds = models.FloatField()
+    total_bytes = models.BigIntegerField(default=0)
+    file_count = models.PositiveIntegerField(default=0)
+    stages = models.JSONField(default=dict)
+
+    def __str__(self):
+        return f"{self.asset_id}: {self.total_seconds:.2f}s"
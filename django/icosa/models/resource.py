@@ -2,9 +2,9 @@ from typing import Optional
 from urllib.parse import urlparse
 
 from django.core.cache import cache
-from django.db import models
+from django.db import models, transaction
 
-from .asset import Asset
+from .asset import Asset, clear_asset_caches
 from .common import (
     FILENAME_MAX_LENGTH,
     STORAGE_PREFIX,
@@ -13,6 +13,7 @@ from .helpers import (
     format_upload_path,
     get_cached_cors_allow_list,
 )
+from .resource_blob import ResourceBlob
 
 
 class Resource(models.Model):
@@ -28,6 +29,20 @@ class Resource(models.Model):
     )
     external_url = models.CharField(max_length=FILENAME_MAX_LENGTH, null=True, blank=True)
     hide_from_downloads = models.BooleanField(default=False)
+    # Denormed from get_base_path and get_relative_path on save so that API
+    # serialization doesn't need to walk to the root resource. See
+    # denorm_paths.
+    base_path = models.CharField(max_length=FILENAME_MAX_LENGTH, null=True, blank=True)
+    relative_path = models.CharField(max_length=FILENAME_MAX_LENGTH, null=True, blank=True)
+    # Set when `file` is a content-addressed blob which other resources may
+    # share.
+    blob = models.ForeignKey(
+        ResourceBlob,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="resources",
+    )
 
     @property
     def url(self) -> Optional[str]:
@@ -48,12 +63,14 @@ class Resource(models.Model):
 
     def get_base_path(self):
         if self.format is not None:
-            return self.format.root_resource.get_base_path()
+            root_resource = self.format.root_resource
+            if root_resource is None:
+                return None
+            return root_resource.get_base_path()
         else:
             # We are a root resource and so do not have a sub path
             if self.file:
-                # XXX(james): This logic needs to be baked into a denormed field
-                if "model_(GLTFupdated)" in self.file.name:
+                if "model_(GLTFupdated)" in self.file.name and self.external_url:
                     path_split = self.external_url.split("/")
                 else:
                     path_split = self.file.name.split("/")
@@ -63,9 +80,7 @@ class Resource(models.Model):
                 return None
             return f'{"/".join(path_split[0:-1])}/'
 
-    @property
-    def relative_path(self):
-        base_path = self.get_base_path()
+    def get_relative_path(self, base_path: Optional[str]):
         if base_path is None:
             return None
         if self.format is None:
@@ -88,6 +103,19 @@ class Resource(models.Model):
         else:
             return None
 
+    def denorm_paths(self, base_path: Optional[str] = None) -> bool:
+        """Set base_path and relative_path from the current file or external
+        url. Pass `base_path` when it is already known, e.g. from the root
+        resource, to avoid loading the format. Returns True if either value
+        changed."""
+        if base_path is None:
+            base_path = self.get_base_path()
+        relative_path = self.get_relative_path(base_path)
+        changed = base_path != self.base_path or relative_path != self.relative_path
+        self.base_path = base_path
+        self.relative_path = relative_path
+        return changed
+
     @property
     def content_type(self):
         return self.file.content_type if self.file else self.contenttype
@@ -113,6 +141,17 @@ class Resource(models.Model):
         else:
             return self.file.name.split(".")[-1]
 
+    def calc_is_cors_allowed(self, cors_allow_list):
+        remote_host = self.remote_host
+        if remote_host is None:
+            return True
+        if self.file:
+            return True
+        if cors_allow_list:
+            allowed_sources = tuple([x.strip() for x in cors_allow_list.split(",")])
+            return remote_host in allowed_sources
+        return False
+
     @property
     def is_cors_allowed(self):
         cors_allow_list = get_cached_cors_allow_list()
@@ -124,14 +163,40 @@ class Resource(models.Model):
             return is_allowed
 
         # We got nothing back from the cache; let's compute the value.
-        is_allowed = False
-        remote_host = self.remote_host
-        if remote_host is None:
-            is_allowed = True
-        elif remote_host is not None and self.file:
-            is_allowed = True
-        elif cors_allow_list:
-            allowed_sources = tuple([x.strip() for x in cors_allow_list.split(",")])
-            is_allowed = remote_host in allowed_sources
+        is_allowed = self.calc_is_cors_allowed(cors_allow_list)
         cache.set(cache_key, is_allowed, None)  # No expiry
         return is_allowed
+
+    def save(self, *args, **kwargs):
+        self.denorm_paths()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = list(set(update_fields) | set(["base_path", "relative_path"]))
+        super().save(*args, **kwargs)
+
+        # A newly assigned file only gets its final name in storage during
+        # save, so check again now we know it.
+        if self.denorm_paths():
+            Resource.objects.filter(pk=self.pk).update(
+                base_path=self.base_path,
+                relative_path=self.relative_path,
+            )
+
+        if self.format_id is None:
+            # We might be a root resource, in which case our sub resources'
+            # paths are relative to us.
+            sub_resources = list(Resource.objects.filter(format__root_resource=self))
+            changed = [x for x in sub_resources if x.denorm_paths(self.base_path)]
+            if changed:
+                Resource.objects.bulk_update(changed, ["base_path", "relative_path"])
+
+        clear_asset_caches(self.asset_id)
+
+    def delete(self, *args, **kwargs):
+        asset_id = self.asset_id
+        blob = self.blob
+        result = super().delete(*args, **kwargs)
+        if blob is not None and blob.release() == 0 and blob.delete_if_unused():
+            transaction.on_commit(lambda: blob.hide_file(asset_id))
+        clear_asset_caches(asset_id)
+        return result
@@ -0,0 +1,65 @@
+import logging
+
+from django.db import models
+from django.db.models import F
+from icosa.helpers.storage import get_b2_bucket
+
+from .common import FILENAME_MAX_LENGTH
+from .log import HiddenMediaFileLog
+
+logger = logging.getLogger("django")
+
+
+class ResourceBlob(models.Model):
+    """A file in storage, keyed by the sha256 of its contents, which any
+    number of Resources may point at. `ref_count` is the number of Resources
+    using it; the file is only hidden by Asset.hide_media once nothing else
+    uses it.
+
+    Only self-contained files, i.e. the root resources of formats with no sub
+    resources, are stored as blobs. Other files are referenced by relative
+    path from their root resource, so they have to stay next to it."""
+
+    create_time = models.DateTimeField(auto_now_add=True)
+    sha256 = models.CharField(max_length=64, unique=True)
+    file_name = models.CharField(max_length=FILENAME_MAX_LENGTH)
+    size = models.BigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+
+    def acquire(self) -> bool:
+        """Add a reference to this blob. Returns False if the blob has been
+        deleted in the meantime."""
+        updated = ResourceBlob.objects.filter(pk=self.pk).update(ref_count=F("ref_count") + 1)
+        if updated:
+            self.ref_count += 1
+        return bool(updated)
+
+    def release(self, count: int = 1) -> int:
+        """Remove `count` references to this blob and return how many are
+        left."""
+        ResourceBlob.objects.filter(pk=self.pk, ref_count__gte=count).update(ref_count=F("ref_count") - count)
+        self.refresh_from_db(fields=["ref_count"])
+        return self.ref_count
+
+    def delete_if_unused(self) -> bool:
+        """Delete this blob if nothing references it. The check is part of
+        the delete, so a blob acquired in the meantime is kept. Returns
+        whether it was deleted."""
+        deleted, _ = ResourceBlob.objects.filter(pk=self.pk, ref_count=0).delete()
+        return bool(deleted)
+
+    def hide_file(self, original_asset_id):
+        """Hide the blob's file, as Asset.hide_media does for user files.
+        Only call this once the blob has been deleted."""
+        if not self.file_name.startswith("icosa/"):
+            # Poly files, and those we don't manage, are left alone.
+            return
+        try:
+            get_b2_bucket().hide_file(self.file_name)
+        except Exception as e:
+            logger.error(f"Could not hide blob file {self.file_name}: {e}")
+            return
+        HiddenMediaFileLog.objects.create(original_asset_id=original_asset_id, file_name=self.file_name)
+
+    def __str__(self):
+        return f"{self.sha256}: {self.ref_count}"
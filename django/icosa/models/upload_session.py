@@ -0,0 +1,105 @@
+import hashlib
+import os
+import secrets
+
+from django.conf import settings
+from django.db import models
+
+from .asset import Asset
+from .common import FILENAME_MAX_LENGTH
+
+UPLOAD_SESSION_OPEN = "OPEN"
+UPLOAD_SESSION_FINALIZED = "FINALIZED"
+UPLOAD_SESSION_STATE_CHOICES = [
+    (UPLOAD_SESSION_OPEN, "Open"),
+    (UPLOAD_SESSION_FINALIZED, "Finalized"),
+]
+
+UPLOAD_SESSION_READ_BYTES = 64 * 1024
+
+
+class UploadChecksumError(Exception):
+    pass
+
+
+class UploadSession(models.Model):
+    """A file being uploaded in chunks through the API. Chunks are appended
+    to a file under settings.UPLOAD_SESSION_ROOT until all `size` bytes have
+    arrived, so that a dropped connection only loses the chunk in flight."""
+
+    create_time = models.DateTimeField(auto_now_add=True)
+    update_time = models.DateTimeField(auto_now=True)
+    url = models.CharField(max_length=255, unique=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="upload_sessions")
+    asset = models.ForeignKey(Asset, null=True, blank=True, on_delete=models.SET_NULL)
+    filename = models.CharField(max_length=FILENAME_MAX_LENGTH)
+    size = models.BigIntegerField()
+    received_bytes = models.BigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True)
+    state = models.CharField(
+        max_length=9,
+        choices=UPLOAD_SESSION_STATE_CHOICES,
+        default=UPLOAD_SESSION_OPEN,
+    )
+
+    @property
+    def path(self):
+        return os.path.join(settings.UPLOAD_SESSION_ROOT, f"{self.url}.part")
+
+    @property
+    def is_complete(self):
+        return self.received_bytes == self.size
+
+    def save(self, *args, **kwargs):
+        if self._state.adding and not self.url:
+            self.url = secrets.token_urlsafe(16)
+        super().save(*args, **kwargs)
+
+    def write_chunk(self, stream, length, sha256):
+        """Append `length` bytes read from `stream` at received_bytes. The
+        chunk is only counted as received if its sha256 hex digest matches
+        `sha256`; otherwise UploadChecksumError is raised and the bytes
+        written are overwritten by the next attempt."""
+        os.makedirs(settings.UPLOAD_SESSION_ROOT, exist_ok=True)
+        digest = hashlib.sha256()
+        written = 0
+        mode = "r+b" if os.path.exists(self.path) else "wb"
+        with open(self.path, mode) as part_file:
+            part_file.seek(self.received_bytes)
+            while written < length:
+                data = stream.read(min(UPLOAD_SESSION_READ_BYTES, length - written))
+                if not data:
+                    break
+                digest.update(data)
+                part_file.write(data)
+                written += len(data)
+        if written != length:
+            raise UploadChecksumError(f"Expected {length} bytes, received {written}.")
+        if digest.hexdigest() != sha256.lower():
+            raise UploadChecksumError("Chunk checksum does not match.")
+        self.received_bytes += written
+        self.save(update_fields=["received_bytes", "update_time"])
+
+    def verify_checksum(self):
+        """Check the assembled file against the whole-file sha256 given when
+        the session was created, if any."""
+        if not self.sha256:
+            return True
+        digest = hashlib.sha256()
+        with open(self.path, "rb") as part_file:
+            while data := part_file.read(UPLOAD_SESSION_READ_BYTES):
+                digest.update(data)
+        return digest.hexdigest() == self.sha256.lower()
+
+    def delete_file(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def delete(self, *args, **kwargs):
+        self.delete_file()
+        return super().delete(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.filename}: {self.received_bytes}/{self.size}"
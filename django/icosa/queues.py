@@ -0,0 +1,196 @@
+"""Named huey queues.
+
+The default queue is djhuey's HUEY, configured by settings.HUEY and run by
+`manage.py run_huey`. The queues in settings.HUEY_QUEUES share its storage but
+are consumed separately, by `manage.py run_huey_queue <name>`, so that a long
+job on one can't hold up the others. Each has its own worker count and
+worker type. Within a queue, tasks with a higher priority run first.
+"""
+
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from huey import SqliteHuey, signals
+from icosa.helpers.tracing import percentile
+
+QUEUE_DEFAULT = "default"
+QUEUE_UPLOADS = "uploads"
+QUEUE_MEDIA = "media"
+QUEUE_BULK = "bulk"
+
+PRIORITY_HIGH = 100
+PRIORITY_NORMAL = 50
+PRIORITY_LOW = 0
+
+# How many recent tasks' timings to keep per queue.
+TASK_TIMING_SAMPLES = 200
+TASK_TIMING_TIMEOUT = 60 * 60 * 24 * 7
+
+_queues = {}
+_queues_lock = threading.Lock()
+# Task ids to the time they started executing in this process.
+_executing = {}
+
+
+def get_task_enqueued_cache_key(task_id):
+    return f"huey_task_enqueued-{task_id}"
+
+
+def get_task_timings_cache_key(queue_name):
+    return f"huey_task_timings-{queue_name}"
+
+
+class IcosaSqliteHuey(SqliteHuey):
+    """Records when each task is enqueued so that consumers can measure how
+    long it waited."""
+
+    def enqueue(self, task):
+        if not self.immediate:
+            cache.set(get_task_enqueued_cache_key(task.id), time.time(), TASK_TIMING_TIMEOUT)
+        return super().enqueue(task)
+
+
+def record_task_timing(queue_name, signal, task):
+    """Called in the consumer as each task starts and finishes."""
+    now = time.time()
+    if signal == signals.SIGNAL_EXECUTING:
+        _executing[task.id] = now
+        return
+    started = _executing.pop(task.id, None)
+    if started is None:
+        return
+    enqueued_key = get_task_enqueued_cache_key(task.id)
+    enqueued = cache.get(enqueued_key)
+    cache.delete(enqueued_key)
+    timings_key = get_task_timings_cache_key(queue_name)
+    timings = cache.get(timings_key, [])
+    timings.append(
+        {
+            "task": task.name,
+            "wait": None if enqueued is None else started - enqueued,
+            "run": now - started,
+            "failed": signal == signals.SIGNAL_ERROR,
+            "time": now,
+        }
+    )
+    cache.set(timings_key, timings[-TASK_TIMING_SAMPLES:], TASK_TIMING_TIMEOUT)
+
+
+def connect_timing_signals(queue, queue_name):
+    def handler(signal, task, *args, **kwargs):
+        record_task_timing(queue_name, signal, task)
+
+    queue.signal(signals.SIGNAL_EXECUTING, signals.SIGNAL_COMPLETE, signals.SIGNAL_ERROR)(handler)
+
+
+def get_queue_config(name):
+    return getattr(settings, "HUEY_QUEUES", {}).get(name, {})
+
+
+def get_queue(name=QUEUE_DEFAULT):
+    from huey.contrib.djhuey import HUEY
+
+    if name not in getattr(settings, "HUEY_QUEUES", {}):
+        # Queues which aren't configured fall back to the default one, so
+        # that routing a task never stops it from running.
+        name = QUEUE_DEFAULT
+    with _queues_lock:
+        if name not in _queues:
+            if name == QUEUE_DEFAULT:
+                queue = HUEY
+            else:
+                huey_settings = settings.HUEY if isinstance(settings.HUEY, dict) else {}
+                queue = IcosaSqliteHuey(
+                    f"{HUEY.name}-{name}",
+                    results=huey_settings.get("results", True),
+                    store_none=huey_settings.get("store_none", False),
+                    immediate=huey_settings.get("immediate", settings.DEBUG),
+                    utc=huey_settings.get("utc", True),
+                )
+            connect_timing_signals(queue, name)
+            _queues[name] = queue
+        return _queues[name]
+
+
+def get_queues():
+    """All queues by name, the default one first."""
+    queues = {QUEUE_DEFAULT: get_queue(QUEUE_DEFAULT)}
+    for name in getattr(settings, "HUEY_QUEUES", {}):
+        queues[name] = get_queue(name)
+    return queues
+
+
+def close_db(fn):
+    """As djhuey's close_db, for tasks on any queue."""
+
+    @wraps(fn)
+    def inner(*args, **kwargs):
+        immediate = get_queue().immediate
+        if not immediate:
+            close_old_connections()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            if not immediate:
+                close_old_connections()
+
+    return inner
+
+
+def queue_task(queue=QUEUE_DEFAULT, priority=PRIORITY_NORMAL, **kwargs):
+    """As djhuey's db_task, routed to the named queue with a default
+    priority."""
+
+    def decorator(fn):
+        ret = get_queue(queue).task(priority=priority, **kwargs)(close_db(fn))
+        ret.call_local = fn
+        return ret
+
+    return decorator
+
+
+def queue_periodic_task(validate_datetime, queue=QUEUE_DEFAULT, priority=PRIORITY_NORMAL, **kwargs):
+    """As djhuey's db_periodic_task, routed to the named queue. Periodic
+    tasks are only scheduled by consumers started with periodic tasks
+    enabled."""
+
+    def decorator(fn):
+        ret = get_queue(queue).periodic_task(validate_datetime, priority=priority, **kwargs)(close_db(fn))
+        ret.call_local = fn
+        return ret
+
+    return decorator
+
+
+def get_queue_stats():
+    """Depth and recent timings for each queue, for the admin."""
+    stats = []
+    for name, queue in get_queues().items():
+        if name == QUEUE_DEFAULT:
+            config = settings.HUEY.get("consumer", {}) if isinstance(settings.HUEY, dict) else {}
+        else:
+            config = get_queue_config(name)
+        timings = cache.get(get_task_timings_cache_key(name), [])
+        waits = [x["wait"] for x in timings if x["wait"] is not None]
+        runs = [x["run"] for x in timings]
+        stats.append(
+            {
+                "name": name,
+                "workers": config.get("workers", 1),
+                "worker_type": config.get("worker_type", "thread"),
+                "pending": queue.pending_count(),
+                "scheduled": queue.scheduled_count(),
+                "samples": len(timings),
+                "failed": len([x for x in timings if x["failed"]]),
+                "wait_p50": percentile(waits, 0.5),
+                "wait_p95": percentile(waits, 0.95),
+                "run_p50": percentile(runs, 0.5),
+                "run_p95": percentile(runs, 0.95),
+                "tasks": sorted({x["task"] for x in timings}),
+            }
+        )
+    return stats
@@ -1,58 +1,79 @@
 import time
+from datetime import timedelta
 from typing import (
     List,
     Optional,
 )
 
 from django.db import transaction
+from django.db.models import Q
 from django.utils import timezone
 from huey import (
     crontab,
     signals,
 )
-from huey.contrib.djhuey import (
-    db_periodic_task,
-    db_task,
-    signal,
-)
 from icosa.api.schema import AssetMetaData
-from icosa.helpers.upload import upload_api_asset
+from icosa.helpers.mesh_stats import analyze_asset_meshes
+from icosa.helpers.thumbnails import make_thumbnail_derivatives
+from icosa.helpers.upload import (
+    upload_api_asset,
+    upload_session_asset,
+)
+from icosa.helpers.upload_progress import set_upload_failed
 from icosa.models import (
     ASSET_STATE_FAILED,
+    UPLOAD_SESSION_FINALIZED,
+    UPLOAD_SESSION_OPEN,
     Asset,
+    AssetCollection,
     BulkSaveLog,
     ModerationNotification,
+    UploadSession,
     User,
 )
+from icosa.queues import (
+    PRIORITY_HIGH,
+    PRIORITY_LOW,
+    QUEUE_BULK,
+    QUEUE_DEFAULT,
+    QUEUE_MEDIA,
+    QUEUE_UPLOADS,
+    get_queue,
+    queue_periodic_task,
+    queue_task,
+)
 from ninja import (
     File,
     Form,
 )
 from ninja.files import UploadedFile
 
+# Unfinished resumable uploads are abandoned after this long without a chunk.
+# Finalized ones are kept for a while so that clients can still look them up.
+UPLOAD_SESSION_OPEN_EXPIRY = timedelta(days=1)
+UPLOAD_SESSION_FINALIZED_EXPIRY = timedelta(days=7)
 
-@signal(signals.SIGNAL_ERROR)
+
+@get_queue(QUEUE_UPLOADS).signal(signals.SIGNAL_ERROR)
 def task_error(signal, task, exc):
-    if task.name == "queue_upload_asset":
+    if task.name in ["queue_upload_api_asset", "queue_upload_session_asset"]:
         handle_upload_error(task, exc)
 
 
 def handle_upload_error(task, exc):
-    asset = task.kwargs.pop("asset")
-    user = task.kwargs.pop("current_user")
+    # Both upload tasks take the user and then the asset, which may be passed
+    # positionally or by name.
+    asset = task.kwargs["asset"] if "asset" in task.kwargs else task.args[1]
 
     asset.state = ASSET_STATE_FAILED
     asset.save(bypass_moderation_logging=True)
 
-    # TODO, instead of writing to a log file, we need to write to some kind of
-    # user-facing error log. The design for this needs to be decided. E.g. how
-    # will the user dismiss the error, or will we dismiss it after it has been
-    # viewed? How do we know it's been read?
-    with open("huey_task_error.log", "a") as logfile:
-        logfile.write(f"{timezone.now()} {asset.id} {user.id} {user.displayname}\n")
+    # The owner sees what went wrong through the upload's progress. The
+    # consumer logs the full traceback.
+    set_upload_failed(asset.url, exc)
 
 
-@db_task()
+@queue_task(QUEUE_UPLOADS)
 async def queue_upload_api_asset(
     current_user: User,
     asset: Asset,
@@ -68,6 +89,32 @@ async def queue_upload_api_asset(
     )
 
 
+@queue_task(QUEUE_UPLOADS)
+async def queue_upload_session_asset(
+    current_user: User,
+    asset: Asset,
+    data: Optional[AssetMetaData],
+    upload_session: UploadSession,
+):
+    await upload_session_asset(
+        asset,
+        data,
+        upload_session,
+    )
+
+
+@queue_periodic_task(crontab(minute="17"), QUEUE_DEFAULT)
+def expire_upload_sessions():
+    now = timezone.now()
+    expired_sessions = UploadSession.objects.filter(
+        Q(state=UPLOAD_SESSION_OPEN, update_time__lt=now - UPLOAD_SESSION_OPEN_EXPIRY)
+        | Q(state=UPLOAD_SESSION_FINALIZED, update_time__lt=now - UPLOAD_SESSION_FINALIZED_EXPIRY)
+    )
+    for upload_session in expired_sessions.iterator():
+        # Deletes the session's file too.
+        upload_session.delete()
+
+
 def save_all_assets(
     resume: bool = False,
     verbose: bool = False,
@@ -122,13 +169,38 @@ def save_all_assets(
     save_log.save()
 
 
-@db_task()
+@queue_task(QUEUE_BULK, priority=PRIORITY_LOW)
 def queue_save_all_assets(
     resume: bool = False,
 ):
     save_all_assets(resume)
 
 
-@db_periodic_task(crontab(minute="*/1"))
+@queue_task(QUEUE_MEDIA, priority=PRIORITY_LOW)
+def queue_analyze_asset_meshes(asset_id: int):
+    asset = Asset.objects.filter(pk=asset_id).first()
+    if asset is None:
+        return
+    analyze_asset_meshes(asset)
+
+
+@queue_task(QUEUE_MEDIA, priority=PRIORITY_HIGH)
+def queue_make_thumbnail_derivatives(asset_id: int):
+    asset = Asset.objects.filter(pk=asset_id).first()
+    if asset is None:
+        return
+    make_thumbnail_derivatives(asset)
+
+
+@queue_task(QUEUE_DEFAULT, priority=PRIORITY_HIGH)
+def queue_rebalance_collection_order(collection_id: int):
+    collection = AssetCollection.objects.filter(pk=collection_id).first()
+    if collection is None:
+        return
+    with transaction.atomic():
+        collection.rebalance_order_keys()
+
+
+@queue_periodic_task(crontab(minute="*/1"), QUEUE_DEFAULT)
 def try_send_moderation_notifications():
     ModerationNotification.try_send()
@@ -1,13 +1,38 @@
+import re
+
 from django import template
+from django.conf import settings
+from django.core.paginator import Page
+from django.db.models import QuerySet
+from django.urls import reverse
+from django.utils.http import urlencode
+from django.utils.safestring import mark_safe
 from icosa.model_mixins import MOD_HIDDEN
 from icosa.models import ARCHIVED, PRIVATE
 
 register = template.Library()
 
+# Cached asset grids contain one of these in place of each like button, so
+# that the grid can be shared between users. See views.main.render_like_buttons.
+LIKE_BUTTON_PLACEHOLDER = "<!--like_button:{}-->"
+LIKE_BUTTON_PLACEHOLDER_RE = re.compile(r"<!--like_button:([^>]*)-->")
+
 
 @register.inclusion_tag("main/tags/like_button.html", takes_context=True)
 def like_button(context, request, asset):
-    is_liked = asset.id in context.get("user_liked_asset_ids", [])
+    if settings.ESI_ENABLED:
+        if asset.id in get_listed_asset_ids(context.get("assets")):
+            # Filled in by the grid's like_buttons_include, so that a grid
+            # costs one ESI request rather than one per asset.
+            return {"slot": True, "asset_url": asset.url}
+        return {"esi_src": reverse("icosa:fragment_like_button", kwargs={"asset_url": asset.url})}
+
+    liked_asset_ids = context.get("user_liked_asset_ids", [])
+    if hasattr(liked_asset_ids, "prime"):
+        # Look up every asset in the list we are rendering in one go, rather
+        # than one query per like button.
+        liked_asset_ids.prime(get_listed_asset_ids(context.get("assets")))
+    is_liked = asset.id in liked_asset_ids
 
     return {
         "is_liked": is_liked,
@@ -16,8 +41,52 @@ def like_button(context, request, asset):
     }
 
 
+def get_listed_asset_ids(assets):
+    """Asset ids for a list of assets or collected assets, as passed to the
+    templates as `assets`. Returns an empty list for anything else."""
+    if isinstance(assets, QuerySet) and assets._result_cache is None:
+        # Don't run the query just for this; the ids will be looked up
+        # individually instead.
+        return []
+    if not isinstance(assets, (list, tuple, Page, QuerySet)):
+        return []
+    # Collection pages list AssetCollectionAsset objects rather than assets.
+    return [getattr(item, "asset_id", item.pk) for item in assets]
+
+
+def get_listed_asset_urls(assets):
+    """As get_listed_asset_ids, but asset urls."""
+    if isinstance(assets, QuerySet) and assets._result_cache is None:
+        return []
+    if not isinstance(assets, (list, tuple, Page, QuerySet)):
+        return []
+    return [getattr(item, "asset", item).url for item in assets]
+
+
+@register.inclusion_tag("partials/like_buttons_include.html", takes_context=True)
+def like_buttons_include(context):
+    """With ESI, one include which fills in the like buttons of every asset in
+    the grid above it. Place this after the grid's loop."""
+    asset_urls = get_listed_asset_urls(context.get("assets"))
+    if not settings.ESI_ENABLED or not asset_urls:
+        return {}
+    return {"esi_src": f"{reverse('icosa:fragment_like_buttons')}?{urlencode({'assets': ','.join(asset_urls)})}"}
+
+
+@register.simple_tag
+def like_button_placeholder(asset):
+    return mark_safe(LIKE_BUTTON_PLACEHOLDER.format(asset.url))
+
+
 @register.inclusion_tag("partials/admin_peek_banner.html", takes_context=True)
 def admin_peek_banner(context, request, asset):
+    if settings.ESI_ENABLED:
+        return {"esi_src": reverse("icosa:fragment_admin_peek_banner", kwargs={"asset_url": asset.url})}
+
+    return get_admin_peek_banner_context(request, asset)
+
+
+def get_admin_peek_banner_context(request, asset):
     user = request.user
     asset_is_hidden = asset.visibility in [PRIVATE, ARCHIVED] or asset.moderation_state in MOD_HIDDEN
     user_is_not_owner = user != asset.owner.django_user
@@ -1,3 +1,317 @@
-# from django.test import TestCase
+import hashlib
+import io
+import json
+import struct
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth.models import AnonymousUser
+from django.test import SimpleTestCase, TestCase, override_settings
+from icosa.helpers.mesh_stats import (
+    GLB_CHUNK_JSON,
+    STL_TRIANGLE_DTYPE,
+    MeshStatsError,
+    read_glb_stats,
+    read_gltf_stats,
+    read_obj_stats,
+    read_ply_stats,
+    read_stl_stats,
+)
+from icosa.helpers.upload_progress import (
+    GENERIC_ERROR_MESSAGE,
+    UPLOAD_STAGE_FAILED,
+    UPLOAD_STAGE_QUEUED,
+    get_upload_progress,
+    get_upload_progress_for_user,
+    set_format_progress,
+    set_upload_failed,
+    set_upload_progress,
+)
+from icosa.models import (
+    ASSET_STATE_FAILED,
+    Asset,
+    AssetOwner,
+    HiddenMediaFileLog,
+    Resource,
+    ResourceBlob,
+    UploadChecksumError,
+    UploadSession,
+    User,
+)
+from ninja.errors import HttpError
+
+LOCMEM_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+def no_sub_files(relative_path):
+    return None
+
+
+class ObjStatsTests(SimpleTestCase):
+    def test_counts_and_bounds(self):
+        data = b"# comment\nv -1 0 0\nv 1 2 0\nv 0 0 3\nv 1 1 1\nvn 0 0 1\nf 1 2 3\nf 1 2 3 4\n"
+        stats = read_obj_stats(io.BytesIO(data))
+        self.assertEqual(stats.vertex_count, 4)
+        # A quad is two triangles.
+        self.assertEqual(stats.triangle_count, 3)
+        self.assertEqual(stats.bounding_box, {"min": [-1.0, 0.0, 0.0], "max": [1.0, 2.0, 3.0]})
+
+    def test_ignores_non_finite_vertices(self):
+        data = b"v nan 0 0\nv 1e999 0 0\nv 1 2 3\nv -1 0 0\n"
+        stats = read_obj_stats(io.BytesIO(data))
+        self.assertEqual(stats.vertex_count, 4)
+        self.assertEqual(stats.bounding_box, {"min": [-1.0, 0.0, 0.0], "max": [1.0, 2.0, 3.0]})
+
+    def test_no_finite_vertices_has_no_bounds(self):
+        stats = read_obj_stats(io.BytesIO(b"v nan nan nan\n"))
+        self.assertIsNone(stats.bounding_box)
+
+    def test_missing_trailing_newline(self):
+        stats = read_obj_stats(io.BytesIO(b"v 0 0 0\nv 1 1 1"))
+        self.assertEqual(stats.vertex_count, 2)
+        self.assertEqual(stats.bounding_box["max"], [1.0, 1.0, 1.0])
+
+
+class StlStatsTests(SimpleTestCase):
+    def test_binary(self):
+        triangles = np.zeros(2, dtype=STL_TRIANGLE_DTYPE)
+        triangles["vertices"][0] = [[0, 0, 0], [1, 0, 0], [0, 1, 0]]
+        triangles["vertices"][1] = [[0, 0, -2], [1, 0, 0], [0, 1, 5]]
+        data = b"\0" * 80 + struct.pack("<I", 2) + triangles.tobytes()
+        stats = read_stl_stats(io.BytesIO(data), len(data))
+        self.assertEqual(stats.triangle_count, 2)
+        self.assertEqual(stats.vertex_count, 6)
+        self.assertEqual(stats.bounding_box, {"min": [0.0, 0.0, -2.0], "max": [1.0, 1.0, 5.0]})
+
+    def test_ascii(self):
+        data = (
+            b"solid test\n"
+            b"facet normal 0 0 1\nouter loop\n"
+            b"vertex 0 0 0\nvertex 1 0 0\nvertex 0 1 0\n"
+            b"endloop\nendfacet\n"
+            b"endsolid test\n"
+        )
+        stats = read_stl_stats(io.BytesIO(data), len(data))
+        self.assertEqual(stats.triangle_count, 1)
+        self.assertEqual(stats.vertex_count, 3)
+        self.assertEqual(stats.bounding_box, {"min": [0.0, 0.0, 0.0], "max": [1.0, 1.0, 0.0]})
+
+    def test_truncated(self):
+        with self.assertRaises(MeshStatsError):
+            read_stl_stats(io.BytesIO(b"solid"), 5)
+
+
+class PlyStatsTests(SimpleTestCase):
+    def test_binary(self):
+        header = (
+            b"ply\nformat binary_little_endian 1.0\n"
+            b"element vertex 2\nproperty float x\nproperty float y\nproperty float z\nproperty uchar red\n"
+            b"element face 1\nproperty list uchar int vertex_indices\n"
+            b"end_header\n"
+        )
+        vertices = struct.pack("<fffB", -1, 0, 0, 255) + struct.pack("<fffB", 2, 3, 4, 0)
+        stats = read_ply_stats(io.BytesIO(header + vertices))
+        self.assertEqual(stats.vertex_count, 2)
+        self.assertEqual(stats.triangle_count, 1)
+        self.assertEqual(stats.bounding_box, {"min": [-1.0, 0.0, 0.0], "max": [2.0, 3.0, 4.0]})
+
+    def test_ascii_counts_only(self):
+        data = b"ply\nformat ascii 1.0\nelement vertex 3\nproperty float x\nelement face 1\nend_header\n"
+        stats = read_ply_stats(io.BytesIO(data))
+        self.assertEqual(stats.vertex_count, 3)
+        self.assertEqual(stats.triangle_count, 1)
+        self.assertIsNone(stats.bounding_box)
+
+    def test_not_ply(self):
+        with self.assertRaises(MeshStatsError):
+            read_ply_stats(io.BytesIO(b"solid\n"))
+
+
+class GltfStatsTests(SimpleTestCase):
+    gltf = {
+        "accessors": [
+            {"count": 4, "min": [-1, -1, 0], "max": [1, 1, 0]},
+            {"count": 6},
+        ],
+        "meshes": [{"primitives": [{"attributes": {"POSITION": 0}, "indices": 1}]}],
+        # The mesh is used twice.
+        "nodes": [{"mesh": 0}, {"mesh": 0}],
+    }
+
+    def test_gltf(self):
+        stats = read_gltf_stats(io.BytesIO(json.dumps(self.gltf).encode()), no_sub_files)
+        self.assertEqual(stats.triangle_count, 4)
+        self.assertEqual(stats.vertex_count, 8)
+        self.assertEqual(stats.bounding_box, {"min": [-1.0, -1.0, 0.0], "max": [1.0, 1.0, 0.0]})
+
+    def test_glb(self):
+        content = json.dumps(self.gltf).encode()
+        content += b" " * (-len(content) % 4)
+        data = struct.pack("<4sII", b"glTF", 2, 20 + len(content)) + struct.pack("<II", len(content), GLB_CHUNK_JSON)
+        stats = read_glb_stats(io.BytesIO(data + content), no_sub_files)
+        self.assertEqual(stats.triangle_count, 4)
+        self.assertEqual(stats.vertex_count, 8)
+
+    def test_not_glb(self):
+        with self.assertRaises(MeshStatsError):
+            read_glb_stats(io.BytesIO(b"nope" + b"\0" * 8), no_sub_files)
+
+
+class ResourceBlobTests(TestCase):
+    def setUp(self):
+        owner = AssetOwner.objects.create(url="owner", displayname="Owner")
+        self.asset = Asset.objects.create(owner=owner, url="asset", name="Asset")
+        self.blob = ResourceBlob.objects.create(sha256="a" * 64, file_name="icosa/blobs/a.glb", size=1)
+
+    def add_resource(self):
+        self.assertTrue(self.blob.acquire())
+        return Resource.objects.create(asset=self.asset, blob=self.blob, file=self.blob.file_name)
+
+    def test_acquire_and_release(self):
+        self.blob.acquire()
+        self.blob.acquire()
+        self.assertEqual(self.blob.ref_count, 2)
+        self.assertEqual(self.blob.release(), 1)
+        self.assertEqual(self.blob.release(), 0)
+
+    def test_release_does_not_go_below_zero(self):
+        self.blob.acquire()
+        self.assertEqual(self.blob.release(2), 1)
+
+    def test_acquire_deleted_blob(self):
+        ResourceBlob.objects.filter(pk=self.blob.pk).delete()
+        self.assertFalse(self.blob.acquire())
+
+    def test_delete_if_unused_keeps_used_blob(self):
+        self.blob.acquire()
+        self.assertFalse(self.blob.delete_if_unused())
+        self.assertTrue(ResourceBlob.objects.filter(pk=self.blob.pk).exists())
+
+    @mock.patch("icosa.models.resource_blob.get_b2_bucket")
+    def test_resource_delete_keeps_shared_blob(self, get_b2_bucket):
+        resources = [self.add_resource(), self.add_resource()]
+        with self.captureOnCommitCallbacks(execute=True):
+            resources[0].delete()
+        self.blob.refresh_from_db()
+        self.assertEqual(self.blob.ref_count, 1)
+        get_b2_bucket.return_value.hide_file.assert_not_called()
+
+    @mock.patch("icosa.models.resource_blob.get_b2_bucket")
+    def test_resource_delete_removes_unused_blob(self, get_b2_bucket):
+        resource = self.add_resource()
+        with self.captureOnCommitCallbacks(execute=True):
+            resource.delete()
+        self.assertFalse(ResourceBlob.objects.filter(pk=self.blob.pk).exists())
+        get_b2_bucket.return_value.hide_file.assert_called_once_with(self.blob.file_name)
+        self.assertTrue(
+            HiddenMediaFileLog.objects.filter(original_asset_id=self.asset.pk, file_name=self.blob.file_name).exists()
+        )
+
+    def test_asset_release_blobs(self):
+        self.add_resource()
+        self.add_resource()
+        self.assertEqual(self.asset.release_blobs(), set())
+        self.assertFalse(ResourceBlob.objects.filter(pk=self.blob.pk).exists())
+
+
+class UploadSessionTests(TestCase):
+    def setUp(self):
+        self.upload_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.upload_root.cleanup)
+        override = override_settings(UPLOAD_SESSION_ROOT=self.upload_root.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        user = User.objects.create_user(username="uploader", email="uploader@example.com", password="password")
+        self.upload_session = UploadSession.objects.create(user=user, url="session", filename="model.glb", size=8)
+
+    def write_chunk(self, data, sha256=None):
+        sha256 = sha256 or hashlib.sha256(data).hexdigest()
+        self.upload_session.write_chunk(io.BytesIO(data), len(data), sha256)
+
+    def test_chunks_are_appended(self):
+        self.write_chunk(b"glTF")
+        self.write_chunk(b"1234")
+        self.assertEqual(self.upload_session.received_bytes, 8)
+        with open(self.upload_session.path, "rb") as f:
+            self.assertEqual(f.read(), b"glTF1234")
+
+    def test_bad_checksum_is_not_counted(self):
+        self.write_chunk(b"glTF")
+        with self.assertRaises(UploadChecksumError):
+            self.write_chunk(b"XXXX", sha256="0" * 64)
+        self.assertEqual(self.upload_session.received_bytes, 4)
+        # The retry overwrites the rejected bytes.
+        self.write_chunk(b"1234")
+        with open(self.upload_session.path, "rb") as f:
+            self.assertEqual(f.read(), b"glTF1234")
+
+    def test_short_chunk(self):
+        with self.assertRaises(UploadChecksumError):
+            self.upload_session.write_chunk(io.BytesIO(b"ab"), 4, hashlib.sha256(b"ab").hexdigest())
+        self.assertEqual(self.upload_session.received_bytes, 0)
+
+
+class ThumbnailVariantTests(SimpleTestCase):
+    def make_asset(self, source="1/2/thumbnail.png"):
+        asset = Asset(thumbnail=source)
+        asset.thumbnail_derivatives = {
+            "source": source,
+            "variants": [
+                {"name": f"1/2/thumbnail-{w}w.jpg", "content_type": "image/jpeg", "width": w, "height": w // 2}
+                for w in [1024, 256, 512]
+            ],
+        }
+        return asset
+
+    def test_largest_which_fits(self):
+        self.assertEqual(self.make_asset().get_thumbnail_variant(max_width=600)["width"], 512)
+
+    def test_smallest_when_none_fit(self):
+        self.assertEqual(self.make_asset().get_thumbnail_variant(max_width=100)["width"], 256)
+
+    def test_height_bound(self):
+        self.assertEqual(self.make_asset().get_thumbnail_variant(max_height=300)["width"], 512)
+
+    def test_stale_source(self):
+        asset = self.make_asset()
+        asset.thumbnail = "1/2/other.png"
+        self.assertIsNone(asset.get_thumbnail_variant())
+
+    def test_other_content_type(self):
+        self.assertIsNone(self.make_asset().get_thumbnail_variant(content_type="image/webp"))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class UploadProgressTests(SimpleTestCase):
+    def test_user_facing_error(self):
+        set_format_progress("progress-a", 1, 2)
+        set_upload_failed("progress-a", HttpError(400, "Invalid zip archive."))
+        progress = get_upload_progress("progress-a")
+        self.assertEqual(progress["state"], ASSET_STATE_FAILED)
+        self.assertEqual(progress["stage"], UPLOAD_STAGE_FAILED)
+        self.assertEqual(progress["error"], "Invalid zip archive.")
+        self.assertEqual(progress["error_type"], "HttpError")
+        # The percentage reached is kept.
+        self.assertEqual(progress["percent"], 55)
+
+    def test_internal_error_is_hidden(self):
+        set_upload_failed("progress-b", RuntimeError("/secret/path"))
+        progress = get_upload_progress("progress-b")
+        self.assertEqual(progress["error"], GENERIC_ERROR_MESSAGE)
+        self.assertEqual(progress["error_type"], "RuntimeError")
+        self.assertEqual(progress["percent"], 0)
+
+    def test_only_shown_to_uploader(self):
+        uploader = User(pk=1)
+        other = User(pk=2)
+        set_upload_progress("progress-c", UPLOAD_STAGE_QUEUED, user_id=uploader.pk)
+        # Later updates keep the uploader.
+        set_format_progress("progress-c", 1, 2)
+        self.assertEqual(get_upload_progress_for_user("progress-c", uploader)["percent"], 55)
+        self.assertIsNone(get_upload_progress_for_user("progress-c", other))
+        self.assertIsNone(get_upload_progress_for_user("progress-c", AnonymousUser()))
+
+    def test_unknown_uploader_is_hidden(self):
+        set_upload_progress("progress-d", UPLOAD_STAGE_QUEUED)
+        self.assertIsNone(get_upload_progress_for_user("progress-d", User(pk=1)))
@@ -10,6 +10,7 @@ from icosa.jwt.authentication import JWTAuth
 from icosa.views import asset_collections as asset_collection_views
 from icosa.views import auth as auth_views
 from icosa.views import autocomplete as autocomplete_views
+from icosa.views import fragments as fragment_views
 from icosa.views import main as main_views
 from icosa.views import moderation as moderation_views
 from ninja import NinjaAPI
@@ -86,6 +87,20 @@ urlpatterns = [
     path("device", auth_views.devicecode, name="devicecode"),
     path("device/<str:appid>/<str:secret>", auth_views.devicecode, name="devicecode"),
     path("device-login-success", auth_views.device_login_success, name="device_login_success"),
+    # ESI fragments
+    path(
+        "fragments/like_button/<str:asset_url>",
+        fragment_views.like_button,
+        name="fragment_like_button",
+    ),
+    path("fragments/like_buttons", fragment_views.like_buttons, name="fragment_like_buttons"),
+    path(
+        "fragments/admin_peek_banner/<str:asset_url>",
+        fragment_views.admin_peek_banner,
+        name="fragment_admin_peek_banner",
+    ),
+    path("fragments/side_nav", fragment_views.side_nav, name="fragment_side_nav"),
+    path("fragments/user_actions", fragment_views.user_actions, name="fragment_user_actions"),
     # Other views
     path("", main_views.home, name="home"),
     path(
@@ -187,6 +202,11 @@ urlpatterns = [
         main_views.asset_status,
         name="asset_status",
     ),
+    path(
+        "status/<str:asset_url>/progress",
+        main_views.asset_upload_progress,
+        name="asset_upload_progress",
+    ),
     path(
         "report/<str:asset_url>",
         main_views.report_asset,
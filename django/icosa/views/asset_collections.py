@@ -1,8 +1,6 @@
-from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
 from django.db import transaction
-from django.db.models import Max, Q
+from django.db.models import Q
 from django.http import HttpResponseBadRequest, HttpResponseNotAllowed
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils import timezone
@@ -11,6 +9,7 @@ from django.views.decorators.http import require_POST
 
 from icosa.forms import AssetCollectionForm
 from icosa.helpers.moderation import get_str_content_type
+from icosa.helpers.pagination import paginate
 from icosa.model_mixins import MOD_HIDDEN
 from icosa.models import (
     PUBLIC,
@@ -33,8 +32,7 @@ COLLECTION_ACTIONS = {
 
 
 def _paginate_collections(request, collections):
-    paginator = Paginator(collections, settings.PAGINATION_PER_PAGE)
-    return paginator, paginator.get_page(request.GET.get("page"))
+    return paginate(request, collections.with_listing_data())
 
 
 def _collection_items(collection):
@@ -50,32 +48,13 @@ def _touch_collection(collection):
 
 
 def _add_asset_to_collection(collection, asset):
-    if collection.collected_assets.filter(asset=asset).exists():
-        return
-    last_order = collection.collected_assets.aggregate(Max("order"))["order__max"]
-    AssetCollectionAsset.objects.create(
-        collection=collection,
-        asset=asset,
-        order=0 if last_order is None else last_order + 1,
-    )
-    _touch_collection(collection)
+    if collection.add_assets([asset]):
+        _touch_collection(collection)
 
 
 def _remove_asset_from_collection(collection, asset):
-    if not collection.collected_assets.filter(asset=asset).exists():
-        return
-    collection.assets.remove(asset)
-    _touch_collection(collection)
-
-
-def _save_collection_item_order(items):
-    changed_items = []
-    for order, item in enumerate(items):
-        if item.order != order:
-            item.order = order
-            changed_items.append(item)
-    if changed_items:
-        AssetCollectionAsset.objects.bulk_update(changed_items, ["order"])
+    if collection.remove_assets([asset]):
+        _touch_collection(collection)
 
 
 @never_cache
@@ -102,7 +81,11 @@ def asset_collection_list(request):
 @login_required
 @never_cache
 def my_asset_collection_list(request):
-    collections = AssetCollection.objects.filter(owner__django_user=request.user).order_by("-update_time")
+    collections = (
+        AssetCollection.objects.filter(owner__django_user=request.user)
+        .select_related("owner", "owner__django_user")
+        .order_by("-update_time")
+    )
     paginator, collection_page = _paginate_collections(request, collections)
     return render(
         request,
@@ -183,28 +166,29 @@ def asset_collection_item_update(request, collection_url: str):
         collection=collection,
     )
     action = request.POST.get("action")
-    items = list(_collection_items(collection))
-    item_index = next(index for index, candidate in enumerate(items) if candidate.pk == item.pk)
+    siblings = collection.collected_assets.exclude(pk=item.pk)
 
     if action == "remove":
-        items.pop(item_index)
         item.delete()
     elif action == "move_up":
-        if item_index > 0:
-            items[item_index - 1], items[item_index] = (
-                items[item_index],
-                items[item_index - 1],
-            )
+        target = siblings.filter(order__lt=item.order).order_by("-order").first()
+        if target is not None:
+            item.move_before(target)
     elif action == "move_down":
-        if item_index < len(items) - 1:
-            items[item_index], items[item_index + 1] = (
-                items[item_index + 1],
-                items[item_index],
-            )
+        target = siblings.filter(order__gt=item.order).order_by("order").first()
+        if target is not None:
+            item.move_after(target)
+    elif action in ["move_before", "move_after"]:
+        target = siblings.filter(pk=request.POST.get("target_id")).first()
+        if target is None:
+            return HttpResponseBadRequest("invalid target item")
+        if action == "move_before":
+            item.move_before(target)
+        else:
+            item.move_after(target)
     else:
         return HttpResponseBadRequest("invalid collection item action")
 
-    _save_collection_item_order(items)
     AssetCollection.objects.filter(pk=collection.pk).update(update_time=timezone.now())
     return redirect("icosa:asset_collection_edit", collection_url=collection.url)
 
@@ -399,16 +383,14 @@ def asset_collection_view(request, collection_url: str, user_url: str = None):
     collection = get_object_or_404(collections, url=collection_url)
     owner = collection.owner
 
-    asset_objs = collection.collected_assets.filter(asset__visibility=PUBLIC).exclude(
+    asset_objs = _collection_items(collection).filter(asset__visibility=PUBLIC).exclude(
         asset__moderation_state__in=MOD_HIDDEN
     )
-    paginator = Paginator(asset_objs, settings.PAGINATION_PER_PAGE)
-    page_number = request.GET.get("page")
-    assets = paginator.get_page(page_number)
+    paginator, assets = paginate(request, asset_objs)
     context = {
         "assets": assets,
-        "page_number": page_number,
-        "result_count": asset_objs.count(),
+        "page_number": assets.number,
+        "result_count": paginator.count,
         "paginator": paginator,
         "page_title": collection.name or "Untitled collection",
         "collection": collection,
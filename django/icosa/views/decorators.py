@@ -1,5 +1,6 @@
 from functools import wraps
 
+from django.conf import settings
 from django.core.cache import cache as core_cache
 
 
@@ -39,3 +40,22 @@ def cache_per_user(ttl=None, prefix=None):
         return apply_cache
 
     return decorator
+
+
+def esi_page_shell(ttl):
+    """Allow Varnish to cache a page for `ttl` seconds for all users. Only use
+    this on pages whose per-user parts are all rendered as ESI includes when
+    settings.ESI_ENABLED is set. Browsers are not told they can cache the page,
+    so combine this with `never_cache` as usual."""
+
+    def decorator(view_function):
+        @wraps(view_function)
+        def apply_surrogate_control(request, *args, **kwargs):
+            response = view_function(request, *args, **kwargs)
+            if settings.ESI_ENABLED and request.method in ["GET", "HEAD"] and response.status_code == 200:
+                response["Surrogate-Control"] = f'content="ESI/1.0", max-age={ttl}'
+            return response
+
+        return apply_surrogate_control
+
+    return decorator
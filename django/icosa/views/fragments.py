@@ -0,0 +1,107 @@
+"""Per-user parts of pages, served separately so that the pages themselves can
+be cached for all users. When settings.ESI_ENABLED is set, templates render ESI
+includes pointing at these views instead of rendering the parts inline. Varnish
+fetches them with the user's cookies and stitches them into the page.
+"""
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404, render
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.views.decorators.cache import never_cache
+
+from icosa.models import Asset, UserLike
+from icosa.templatetags.asset_tags import get_admin_peek_banner_context
+
+# More than any page of assets we list.
+MAX_LIKE_BUTTONS = 200
+
+
+@never_cache
+def like_button(request, asset_url):
+    template = "main/tags/like_button.html"
+
+    user = request.user
+    is_liked = False
+    if not user.is_anonymous:
+        is_liked = UserLike.objects.filter(user=user, asset__url=asset_url).exists()
+    context = {
+        "is_liked": is_liked,
+        "asset_url": asset_url,
+    }
+    return render(
+        request,
+        template,
+        context,
+    )
+
+
+@never_cache
+def like_buttons(request):
+    """Like buttons for every asset in a grid, which the response moves into
+    the grid's like button slots. Takes asset urls as `assets`, separated by
+    commas."""
+    template = "main/tags/like_buttons.html"
+
+    asset_urls = [x for x in request.GET.get("assets", "").split(",") if x][:MAX_LIKE_BUTTONS]
+    user = request.user
+    liked_asset_urls = set()
+    if not user.is_anonymous and asset_urls:
+        liked_asset_urls = set(
+            UserLike.objects.filter(user=user, asset__url__in=asset_urls).values_list("asset__url", flat=True)
+        )
+    context = {
+        "like_buttons": [(x, x in liked_asset_urls) for x in asset_urls],
+    }
+    return render(
+        request,
+        template,
+        context,
+    )
+
+
+@never_cache
+def admin_peek_banner(request, asset_url):
+    template = "partials/admin_peek_banner.html"
+
+    user = request.user
+    if not (user.is_staff or user.is_superuser):
+        # Only staff can peek, so skip looking up the asset.
+        context = {"is_peeking_at_asset": False}
+    else:
+        asset = get_object_or_404(Asset.objects.select_related("owner"), url=asset_url)
+        context = get_admin_peek_banner_context(request, asset)
+    return render(
+        request,
+        template,
+        context,
+    )
+
+
+@never_cache
+def side_nav(request):
+    template = "partials/side_nav.html"
+
+    if settings.MAINTENANCE_MODE and not request.user.is_staff:
+        return HttpResponse("")
+    return render(
+        request,
+        template,
+    )
+
+
+@never_cache
+def user_actions(request):
+    template = "partials/user_actions.html"
+
+    next_path = request.GET.get("next", "")
+    if not url_has_allowed_host_and_scheme(next_path, allowed_hosts={request.get_host()}):
+        next_path = ""
+    context = {
+        "next_path": next_path,
+    }
+    return render(
+        request,
+        template,
+        context,
+    )
@@ -1,4 +1,3 @@
-import inspect
 import logging
 import random
 import secrets
@@ -11,7 +10,6 @@ from django.contrib.auth.base_user import AbstractBaseUser
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.sites.shortcuts import get_current_site
 from django.core.cache import cache
-from django.core.paginator import Paginator
 from django.db import transaction
 from django.db.models import Q
 from django.http import (
@@ -23,11 +21,12 @@ from django.http import (
     HttpResponseRedirect,
     JsonResponse,
 )
+from django.middleware.csrf import get_token
 from django.shortcuts import (
     get_object_or_404,
     render,
 )
-from django.template.loader import render_to_string
+from django.template.loader import get_template, render_to_string
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.safestring import mark_safe
@@ -50,8 +49,15 @@ from icosa.forms import (
 from icosa.helpers.email import spawn_send_html_mail
 from icosa.helpers.file import b64_to_img
 from icosa.helpers.moderation import get_str_content_type
+from icosa.helpers.pagination import COUNT_APPROXIMATE, paginate
 from icosa.helpers.snowflake import generate_snowflake
 from icosa.helpers.upload import upload_api_asset
+from icosa.helpers.upload_progress import (
+    UPLOAD_STAGE_QUEUED,
+    get_upload_progress,
+    get_upload_progress_for_user,
+    set_upload_progress,
+)
 from icosa.model_mixins import (
     MOD_HIDDEN,
     MOD_REPORTED,
@@ -72,8 +78,11 @@ from icosa.models import (
     AssetOwner,
     MastheadSection,
     UserLike,
+    get_landing_page_version,
 )
 from icosa.tasks import queue_upload_api_asset
+from icosa.templatetags.asset_tags import LIKE_BUTTON_PLACEHOLDER_RE
+from icosa.views.decorators import esi_page_shell
 
 User = get_user_model()
 
@@ -85,6 +94,10 @@ MASTHEAD_TOP_RANK = 10000
 MASTHEAD_CACHE_SECONDS = 10
 MASTHEAD_CACHE_PREFIX = "mastheads"
 
+LANDING_PAGE_CACHE_SECONDS = 60 * 5  # Five minutes
+LANDING_PAGE_SHELL_CACHE_SECONDS = 60  # One minute
+LANDING_PAGE_CACHE_PREFIX = "landing_page"
+
 
 def set_viewer_js_version(request):
     viewer_js_version = request.GET.get("viewerjs", None)
@@ -165,32 +178,57 @@ def health(request):
     return HttpResponse("ok")
 
 
+def render_like_buttons(request, html, asset_ids):
+    """Replace the like button placeholders in a cached asset grid with like
+    buttons for the current user. `asset_ids` maps asset url to id for every
+    asset in the grid."""
+    user = request.user
+    if user.is_anonymous:
+        # Like buttons are not shown to anonymous users.
+        return mark_safe(LIKE_BUTTON_PLACEHOLDER_RE.sub("", html))
+
+    liked_asset_ids = set(
+        UserLike.objects.filter(
+            user=user,
+            asset_id__in=asset_ids.values(),
+        ).values_list("asset_id", flat=True)
+    )
+    like_button_template = get_template("main/tags/like_button.html")
+    csrf_token = get_token(request)
+
+    def like_button(match):
+        asset_url = match.group(1)
+        return like_button_template.render(
+            {
+                "is_liked": asset_ids.get(asset_url) in liked_asset_ids,
+                "asset_url": asset_url,
+                "request": request,
+                "csrf_token": csrf_token,
+            }
+        )
+
+    return mark_safe(LIKE_BUTTON_PLACEHOLDER_RE.sub(like_button, html))
+
+
 def landing_page(
     request,
-    assets=Asset.objects.filter(get_default_q()).select_related("owner"),
+    cache_key,
+    assets=None,
     show_masthead=True,
     heading=None,
     heading_link=None,
     is_explore_heading=False,
 ):
-    # Inspects this landing page function's caller's name so we don't have
-    # to worry about passing in unique values for each landing page's cache
-    # key. Neglecting to use - or repeating another - cache key has the subtle
-    # effect of showing unrelated mastheads.
-    curframe = inspect.currentframe()
-    calframe = inspect.getouterframes(curframe, 2)
-    landing_page_fn_name = calframe[1][3]
-
+    """Render a lister of assets ordered by rank.
+
+    `cache_key` must be unique per landing page. The asset grid is cached per
+    page number for LANDING_PAGE_CACHE_SECONDS, and invalidated early when an
+    asset's LANDING_PAGE_FIELDS or thumbnails change. Rank changes from likes
+    and views show once it expires. Only the parts which differ per user,
+    such as like buttons, are rendered on every request.
+    """
     template = "main/home.html"
 
-    # TODO(james): filter out assets with no formats
-    assets = (
-        assets.exclude(license__isnull=True)
-        .exclude(license=ALL_RIGHTS_RESERVED)
-        .select_related("owner")
-        .prefetch_related("resource_set", "format_set")
-    )
-
     try:
         page_number = int(request.GET.get("page", 1))
     except ValueError:
@@ -202,14 +240,13 @@ def landing_page(
         # The mastheads query is slow, but we still want a rotating list on
         # every page load. Cache a list of mastheads and choose one at random
         # each time.
-        cache_key = f"{MASTHEAD_CACHE_PREFIX}-{landing_page_fn_name}"
-        if cache.get(cache_key):
-            mastheads = cache.get(cache_key)
-        else:
+        masthead_cache_key = f"{MASTHEAD_CACHE_PREFIX}-{cache_key}"
+        mastheads = cache.get(masthead_cache_key)
+        if not mastheads:
             mastheads = list(MastheadSection.objects.all())
 
             cache.set(
-                f"{MASTHEAD_CACHE_PREFIX}-{landing_page_fn_name}",
+                masthead_cache_key,
                 mastheads,
                 MASTHEAD_CACHE_SECONDS,
             )
@@ -224,17 +261,56 @@ def landing_page(
     if masthead is not None and not masthead.visibility == PUBLIC:
         masthead = None
 
-    paginator = Paginator(assets.order_by("-rank"), settings.PAGINATION_PER_PAGE)
-    assets = paginator.get_page(page_number)
+    grid_cache_key = "-".join(
+        [
+            LANDING_PAGE_CACHE_PREFIX,
+            cache_key,
+            get_landing_page_version(),
+            "esi" if settings.ESI_ENABLED else "inline",
+            str(page_number),
+        ]
+    )
+    grid = cache.get(grid_cache_key)
+    if grid is None:
+        if assets is None:
+            assets = Asset.objects.filter(get_default_q())
+
+        # TODO(james): filter out assets with no formats
+        assets = (
+            assets.exclude(license__isnull=True)
+            .exclude(license=ALL_RIGHTS_RESERVED)
+            .select_related("owner")
+            .prefetch_related("resource_set", "format_set")
+        )
+
+        paginator, assets = paginate(request, assets.order_by("-rank"))
+        grid = {
+            "html": render_to_string(
+                "partials/landing_page_assets.html",
+                {
+                    "assets": assets,
+                    "paginator": paginator,
+                    # With ESI, like buttons are already the same for every
+                    # user.
+                    "like_button_placeholders": not settings.ESI_ENABLED,
+                },
+            ),
+            "asset_ids": {x.url: x.pk for x in assets},
+        }
+        cache.set(grid_cache_key, grid, LANDING_PAGE_CACHE_SECONDS)
+
     page_title = f"Exploring {heading}" if is_explore_heading else heading
     context = {
-        "assets": assets,
+        "asset_grid": (
+            mark_safe(grid["html"])
+            if settings.ESI_ENABLED
+            else render_like_buttons(request, grid["html"], grid["asset_ids"])
+        ),
         "masthead": masthead,
         "heading": heading,
         "heading_link": heading_link,
         "is_explore_heading": is_explore_heading,
         "page_title": page_title,
-        "paginator": paginator,
     }
 
     return render(
@@ -245,11 +321,13 @@ def landing_page(
 
 
 @never_cache
+@esi_page_shell(LANDING_PAGE_SHELL_CACHE_SECONDS)
 def home(request):
-    return landing_page(request)
+    return landing_page(request, "home")
 
 
 @never_cache
+@esi_page_shell(LANDING_PAGE_SHELL_CACHE_SECONDS)
 def home_openbrush(request):
     assets = Asset.objects.filter(
         visibility=PUBLIC,
@@ -259,6 +337,7 @@ def home_openbrush(request):
 
     return landing_page(
         request,
+        "openbrush",
         assets,
         heading="Open Brush",
         heading_link="https://openbrush.app",
@@ -268,6 +347,7 @@ def home_openbrush(request):
 
 
 @never_cache
+@esi_page_shell(LANDING_PAGE_SHELL_CACHE_SECONDS)
 def home_blocks(request):
     poly_by_google_q = Q(visibility=PUBLIC, owner__url=POLY_USER_URL)
     blocks_q = Q(visibility=PUBLIC, has_blocks=True, curated=True)
@@ -277,6 +357,7 @@ def home_blocks(request):
 
     return landing_page(
         request,
+        "blocks",
         assets,
         heading="Open Blocks",
         heading_link="https://openblocks.app",
@@ -311,6 +392,7 @@ def home_other(request):
 
     return landing_page(
         request,
+        "other",
         assets,
         show_masthead=True,
         heading="""stuff not on /blocks or /openbrush""",
@@ -318,6 +400,7 @@ def home_other(request):
 
 
 @never_cache
+@esi_page_shell(LANDING_PAGE_SHELL_CACHE_SECONDS)
 def category(request, category):
     category_label = category.upper()
     if category_label not in CATEGORY_LABELS:
@@ -330,6 +413,7 @@ def category(request, category):
     category_name = CATEGORY_LABEL_MAP.get(category)
     return landing_page(
         request,
+        f"category-{category_label}",
         assets,
         show_masthead=False,
         heading=f"Exploring: {category_name}",
@@ -345,17 +429,14 @@ def uploads(request):
     template = "main/manage_uploads.html"
     user = request.user
     form = AssetUploadForm()
-    asset_objs = list(
+    asset_objs = (
         Asset.objects.filter(owner__django_user=user)
         .exclude(state=ASSET_STATE_BARE, moderation_state__in=MOD_HIDDEN)
         .order_by("-create_time")
     )
-    try:
-        page_number = int(request.GET.get("page", 1))
-    except ValueError:
-        page_number = 1
-    paginator = Paginator(asset_objs, settings.PAGINATION_PER_PAGE)
-    assets = paginator.get_page(page_number)
+    # Users watch this list change as their uploads progress, so don't serve
+    # them a stale count.
+    paginator, assets = paginate(request, asset_objs, count_cache_seconds=0)
 
     context = {
         "assets": assets,
@@ -375,17 +456,14 @@ def uploads(request):
 def upload_list_partial(request):
     template = "partials/asset_upload_list.html"
     user = request.user
-    asset_objs = list(
+    asset_objs = (
         Asset.objects.filter(owner__django_user=user)
         .exclude(state=ASSET_STATE_BARE, moderation_state__in=MOD_HIDDEN)
         .order_by("-create_time")
     )
-    try:
-        page_number = int(request.GET.get("page", 1))
-    except ValueError:
-        page_number = 1
-    paginator = Paginator(asset_objs, settings.PAGINATION_PER_PAGE)
-    assets = paginator.get_page(page_number)
+    # Users watch this list change as their uploads progress, so don't serve
+    # them a stale count.
+    paginator, assets = paginate(request, asset_objs, count_cache_seconds=0)
     context = {
         "assets": assets,
         "paginator": paginator,
@@ -423,6 +501,7 @@ async def upload_asset(request):
             state=ASSET_STATE_UPLOADING,
         )
         try:
+            set_upload_progress(asset.url, UPLOAD_STAGE_QUEUED, user_id=user.pk)
             if getattr(settings, "ENABLE_TASK_QUEUE", True) is True:
                 await queue_upload_api_asset(
                     user,
@@ -473,12 +552,7 @@ def owner_show(request, slug):
         .order_by("-id")
     )
 
-    try:
-        page_number = int(request.GET.get("page", 1))
-    except ValueError:
-        page_number = 1
-    paginator = Paginator(asset_objs, settings.PAGINATION_PER_PAGE)
-    assets = paginator.get_page(page_number)
+    paginator, assets = paginate(request, asset_objs)
     context = {
         "user": request.user,
         "owner": owner,
@@ -530,14 +604,10 @@ def user_show(request, slug):
         .order_by("-id")
     )
 
-    try:
-        page_number = int(request.GET.get("page", 1))
-    except ValueError:
-        page_number = 1
-    paginator = Paginator(asset_objs, settings.PAGINATION_PER_PAGE)
-    assets = paginator.get_page(page_number)
+    paginator, assets = paginate(request, asset_objs)
 
-    if owners.count() > 1:
+    is_multi_owner = owners.count() > 1
+    if is_multi_owner:
         if owner.django_user:
             page_title = f"{owner.django_user.displayname} and others"
         else:
@@ -550,7 +620,7 @@ def user_show(request, slug):
         "assets": assets,
         "page_title": page_title,
         "paginator": paginator,
-        "is_multi_owner": owners.count() > 1,
+        "is_multi_owner": is_multi_owner,
         "user_is_moderator": request.user.groups.filter(name="Moderator").exists(),
         "content_type": get_str_content_type(owner),
     }
@@ -570,15 +640,9 @@ def my_likes(request):
     q = Q(asset__visibility__in=[PUBLIC, UNLISTED])
     q |= Q(asset__visibility__in=[PRIVATE, UNLISTED], asset__owner__django_user=user)
 
-    liked_assets = UserLike.objects.filter(user=user).filter(q)
-    asset_objs = [ul.asset for ul in liked_assets]
-
-    try:
-        page_number = int(request.GET.get("page", 1))
-    except ValueError:
-        page_number = 1
-    paginator = Paginator(asset_objs, settings.PAGINATION_PER_PAGE)
-    assets = paginator.get_page(page_number)
+    liked_assets = UserLike.objects.filter(user=user).filter(q).select_related("asset").order_by("pk")
+    paginator, assets = paginate(request, liked_assets, count_cache_seconds=0)
+    assets.object_list = [like.asset for like in assets]
 
     context = {
         "user": user,
@@ -599,37 +663,29 @@ def asset_view(request, asset_url):
     template = "main/asset_view.html"
     user = request.user
 
-    asset = get_object_or_404(Asset.objects.prefetch_related("resource_set", "format_set"), url=asset_url)
+    asset = get_object_or_404(Asset.objects.select_related("owner"), url=asset_url)
     check_user_can_view_asset(user, asset)
     asset.inc_views_and_rank()
     format_override = request.GET.get("forceformat", "")
 
     set_viewer_js_version(request)
 
-    embed_code = render_to_string(
-        "partials/oembed_code.html",
-        {
-            "host": f"{settings.DEPLOYMENT_SCHEME}{settings.DEPLOYMENT_HOST_WEB}",
-            "asset": asset,
-            "frame_width": 1920,
-            "frame_height": 1440,
-        },
-    )
+    # Everything which is the same for all users comes from the cached view
+    # model. Only add per-user flags here.
+    view_model = asset.get_view_model()
 
-    if user.is_anonymous:
-        user_owns_asset = False
-    else:
-        user_owns_asset = asset.owner in user.assetowner_set.all()
+    user_owns_asset = asset.is_owned_by_django_user(user)
+    user_is_moderator = not user.is_anonymous and user.groups.filter(name="Moderator").exists()
     context = {
         "user_owns_asset": user_owns_asset,
         "asset": asset,
         "format_override": format_override,
-        "downloadable_formats": bool(asset.get_all_downloadable_formats(user)),
+        "has_downloads": view_model["has_owner_downloads"] if user_owns_asset else view_model["has_downloads"],
         "page_title": asset.name,
-        "embed_code": embed_code.strip(),
+        "embed_code": view_model["embed_code"],
         "is_viewing_asset": True,
-        "user_is_moderator": request.user.groups.filter(name="Moderator").exists(),
-        "content_type": get_str_content_type(asset),
+        "user_is_moderator": user_is_moderator,
+        "content_type": get_str_content_type(asset) if user_is_moderator else None,
     }
     return render(
         request,
@@ -661,17 +717,19 @@ def asset_oembed(request, asset_url):
     template = "main/asset_embed.html"
 
     user = request.user
-    asset = get_object_or_404(Asset, url=asset_url)
+    asset = get_object_or_404(Asset.objects.select_related("owner"), url=asset_url)
     check_user_can_view_asset(user, asset)
     asset.inc_views_and_rank()  # TODO: do we count embedded views separately or at all?
     format_override = request.GET.get("forceformat", "")
 
     set_viewer_js_version(request)
 
+    view_model = asset.get_view_model()
+    user_owns_asset = asset.is_owned_by_django_user(user)
     context = {
         "asset": asset,
         "format_override": format_override,
-        "downloadable_formats": bool(asset.get_all_downloadable_formats(user)),
+        "has_downloads": view_model["has_owner_downloads"] if user_owns_asset else view_model["has_downloads"],
         "page_title": f"embed {asset.name}",
     }
     return render(
@@ -723,6 +781,25 @@ def asset_status(request, asset_url):
     context = {
         "asset": asset,
         "is_polling": True,
+        "upload_progress": get_upload_progress(asset.url),
+    }
+    return render(
+        request,
+        template,
+        context,
+    )
+
+
+@never_cache
+def asset_upload_progress(request, asset_url):
+    """Polled while an upload is in progress. Progress is read from the cache
+    and only shown to the user who uploaded. Once the upload has finished, or
+    if there is no progress to show, the fragment swaps in asset_status for
+    the whole card."""
+    template = "partials/asset_upload_progress.html"
+    context = {
+        "asset_url": asset_url,
+        "upload_progress": get_upload_progress_for_user(asset_url, request.user),
     }
     return render(
         request,
@@ -1141,16 +1218,13 @@ def search(request):
         Asset.objects.filter(q).exclude(license__isnull=True).exclude(license=ALL_RIGHTS_RESERVED).order_by("-rank")
     )
 
-    try:
-        page_number = int(request.GET.get("page", 1))
-    except ValueError:
-        page_number = 1
-    paginator = Paginator(asset_objs, settings.PAGINATION_PER_PAGE)
-    assets = paginator.get_page(page_number)
+    # Broad searches can match most of the gallery, so don't count every
+    # match.
+    paginator, assets = paginate(request, asset_objs, count_mode=COUNT_APPROXIMATE)
     context = {
         "assets": assets,
-        "page_number": page_number,
-        "result_count": asset_objs.count(),
+        "page_number": assets.number,
+        "result_count": paginator.count,
         "search_query": query,
         "page_title": f"Search for {query}",
         "paginator": paginator,